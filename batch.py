@@ -0,0 +1,103 @@
+from lex import *
+from pyemit import PythonGenerator
+from compiler import parseIR, generateCode
+import pyruntime
+import concurrent.futures
+import glob
+import os
+import subprocess
+import time
+
+# Batch mode compiles many files at once. Lexing, parsing and emitting happen in
+# a process pool, one file per task, and a file that fails to compile is
+# reported without stopping the others. The csc (or cc, for the C backend) runs
+# are kept for the end and run side by side as a single build step.
+
+
+# Expands glob patterns ourselves, since not every shell does it. A pattern
+# that matches nothing is kept as it is, so it's reported as missing just like
+# a path that doesn't exist.
+def expandFiles(patterns):
+    files = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        files.update(dict.fromkeys(matches or [pattern]))
+    return list(files)
+
+
+class BatchResult:
+    def __init__(self, path, output=None, error=None, elapsed=0.0):
+        self.path = path
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+
+
+# Runs in a worker process: compiles one file and reports what happened.
+def compileFile(path, backend, optimized, prompt=True):
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as inputFile:
+            input = inputFile.read()
+
+        if backend == "py":
+            pyruntime.compileModule(PythonGenerator().program(parseIR(input, optimized)), path)
+            output = None
+        else:
+            output = f"{os.path.splitext(path)[0]}.{backend}"
+            code = generateCode(input, backend, optimized, prompt)
+            with open(output, 'w') as outputFile:
+                outputFile.write(code)
+    except CompileError as error:
+        return BatchResult(path, error=str(error), elapsed=time.perf_counter() - start)
+    except Exception as error:
+        return BatchResult(path, error=f"{type(error).__name__}: {error}",
+                           elapsed=time.perf_counter() - start)
+    return BatchResult(path, output, elapsed=time.perf_counter() - start)
+
+
+def buildExecutable(result):
+    base, extension = os.path.splitext(result.output)
+    start = time.perf_counter()
+    if extension == ".c":
+        exe = base
+        build = subprocess.run([os.environ.get("CC", "cc"), "-O2", "-o", exe, result.output, "-lm"],
+                               capture_output=True, text=True)
+    else:
+        exe = f"{base}.exe"
+        build = subprocess.run(["csc", f"-out:{exe}", result.output],
+                               capture_output=True, text=True)
+    result.elapsed += time.perf_counter() - start
+    if build.returncode != 0:
+        language = "C" if extension == ".c" else "C#"
+        result.error = f"{language} Compile Error\n{(build.stdout + build.stderr).strip()}"
+    else:
+        result.output = exe
+
+
+def runBatch(patterns, backend="cs", optimized=False, jobs=None, build=True, prompt=True):
+    files = expandFiles(patterns)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(compileFile, files, [backend] * len(files),
+                                [optimized] * len(files), [prompt] * len(files)))
+
+    compiled = [result for result in results if result.error is None and result.output]
+    if build and backend in ("cs", "c") and compiled:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            list(pool.map(buildExecutable, compiled))
+    return results
+
+
+def printResults(results):
+    failures = 0
+    for result in results:
+        if result.error is None:
+            print("{color}ok{end}   {path} ({elapsed:.3f}s)".format(
+                color="\033[92m", end="\033[0m", path=result.path, elapsed=result.elapsed))
+        else:
+            failures += 1
+            print("{color}FAIL{end} {path}\n{message}".format(
+                color="\033[91m", end="\033[0m", path=result.path,
+                message="\n".join("     " + line for line in result.error.splitlines())))
+    print(f"{len(results) - failures} of {len(results)} compiled")
+    return failures
@@ -0,0 +1,465 @@
+from lex import *
+from emit import *
+from parse import *
+from pyemit import PythonGenerator
+from cemit import CGenerator
+from gencorpus import Generator, SHAPES
+from compiler import compileSource, BACKENDS
+import pyruntime
+import argparse
+import concurrent.futures
+import contextlib
+import gc
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks for the compiler, run with: python bench.py [file]
+#
+# With --suite it instead measures each phase of the compiler on generated
+# programs of every shape (see gencorpus.py) and compares the results with the
+# baseline in bench-baseline.json, exiting with an error if any phase got
+# slower or used more memory by more than --tolerance. Save a new baseline
+# with --save-baseline after a change that is meant to move the numbers, or
+# when running on a different machine.
+#
+# With --runtime it compares how long the compiled programs take to run with
+# each backend: py in-process, c built with cc -O2 and cs built with csc (when
+# csc is on the path).
+#
+# With --concat it times CONCAT_PROGRAM, which builds strings up in loops, in
+# C# with and without StringBuilderLowering (see emit.py).
+#
+# With --concurrent it compiles a batch of generated programs through
+# compiler.compileSource from more and more threads and processes at once,
+# checks every result is exactly what compiling them one at a time gave, and
+# reports the throughput.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench-baseline.json")
+
+
+def countTokens(lexer):
+    count = 0
+    while lexer.getToken().kind != TokenType.EOF:
+        count += 1
+    return count
+
+
+def timeLexer(lexerClass, source, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = countTokens(lexerClass(source))
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return count, best
+
+
+def benchLexer(source, repeat):
+    print("{color}Lexer throughput{end}".format(
+        color="\033[94m", end="\033[0m"))
+    results = {}
+    for lexerClass in (Lexer, RegexLexer):
+        count, elapsed = timeLexer(lexerClass, source, repeat)
+        results[lexerClass.__name__] = count / elapsed
+        print(f"{lexerClass.__name__:>12}: {count} tokens in {elapsed:.3f}s "
+              f"({count / elapsed:,.0f} tokens/sec)")
+    speedup = results["RegexLexer"] / results["Lexer"]
+    print(f"{'speedup':>12}: {speedup:.1f}x")
+    return results
+
+
+def peakMemory(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def tokenList(source):
+    lexer = RegexLexer(source)
+    tokens = [lexer.getToken()]
+    while tokens[-1].kind != TokenType.EOF:
+        tokens.append(lexer.getToken())
+    return tokens
+
+
+def benchTokenMemory(source):
+    print("{color}Token stream peak memory{end}".format(
+        color="\033[94m", end="\033[0m"))
+    tokens, listPeak = peakMemory(tokenList, source)
+    stream, streamPeak = peakMemory(TokenStream, source)
+    print(f"{'Token list':>12}: {len(tokens)} tokens, {listPeak / 2**20:.1f} MiB")
+    print(f"{'TokenStream':>12}: {len(stream)} tokens, {streamPeak / 2**20:.1f} MiB")
+    print(f"{'saving':>12}: {listPeak / streamPeak:.1f}x")
+    return listPeak, streamPeak
+
+
+def lexPhase(source):
+    return countTokens(RegexLexer(source))
+
+
+def directPhase(stream):
+    Parser(stream, Emitter(None)).program()
+
+
+def stackPhase(stream):
+    StackParser(stream, Emitter(None)).program()
+
+
+def parsePhase(stream):
+    return IRParser(stream).program()
+
+
+def emitPhase(program):
+    emitter = Emitter(None)
+    CSharpGenerator(emitter).program(program)
+    emitter.writeTo(io.StringIO())
+
+
+# Each phase is (name, setup, run): setup prepares run's input outside the
+# timing, so the phase is measured on its own.
+def phases(source):
+    return (
+        ("lex", lambda: source, lexPhase),
+        ("parse+emit", lambda: TokenStream(source), directPhase),
+        ("stack", lambda: TokenStream(source), stackPhase),
+        ("parse", lambda: TokenStream(source), parsePhase),
+        ("emit", lambda: IRParser(TokenStream(source)).program(), emitPhase),
+    )
+
+
+# The best time of repeat runs, with the garbage collector off, then the peak memory of one more, traced run.
+def measure(setup, function, repeat):
+    best = None
+    for _ in range(repeat):
+        input = setup()
+        # As timeit does, so a collection of setup's garbage isn't timed.
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function(input)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+    input = setup()
+    _, peak = peakMemory(function, input)
+    return best, peak
+
+
+def benchSuite(lines, repeat):
+    results = {}
+    for shape in SHAPES:
+        source = Generator().generate(lines, shape)
+        lineCount = source.count('\n')
+        print("{color}{shape}: {lines} lines{end}".format(
+            color="\033[94m", end="\033[0m", shape=shape, lines=lineCount))
+        results[shape] = {}
+        for name, setup, function in phases(source):
+            elapsed, peak = measure(setup, function, repeat)
+            results[shape][name] = {"linesPerSecond": lineCount / elapsed, "peakBytes": peak}
+            print(f"{name:>12}: {lineCount / elapsed:>12,.0f} lines/sec {peak / 2**20:>8.1f} MiB")
+    return results
+
+
+# Compares Parser, which parses each block's body with a recursive call, with
+# StackParser, which doesn't, on programs nested deeper and deeper.
+def benchNesting(lines, repeat):
+    print("{color}Parser and StackParser by nesting depth{end}".format(
+        color="\033[94m", end="\033[0m"))
+    print(f"{'depth':>8}{'Parser':>16}{'StackParser':>16}   lines/sec")
+    for depth in (4, 16, 64, 256, 1024, 4096):
+        source = Generator(depth=depth).generate(lines, "nested")
+        lineCount = source.count('\n')
+        rates = []
+        for phase in (directPhase, stackPhase):
+            try:
+                elapsed, _ = measure(lambda: TokenStream(source), phase, repeat)
+                rates.append(f"{lineCount / elapsed:,.0f}")
+            except RecursionError:
+                rates.append("too deep")
+        print(f"{depth:>8}{rates[0]:>16}{rates[1]:>16}")
+
+
+# Loops, a recursive FUNCTION and REAL arithmetic, so run time isn't just output.
+RUNTIME_PROGRAM = """FUNCTION Fib(n : INTEGER) RETURNS INTEGER
+   IF n < 2 THEN
+      RETURN n
+   ENDIF
+   RETURN Fib(n - 1) + Fib(n - 2)
+ENDFUNCTION
+DECLARE total : INTEGER
+DECLARE x : REAL
+CONSTANT HALF = 0.5
+total <- 0
+x <- 0
+FOR i <- 1 TO 1000
+   FOR j <- 1 TO 1000
+      total <- total + i * j / 7 - j
+      x <- x + HALF * j / i
+   NEXT j
+NEXT i
+OUTPUT total, " ", x, " ", Fib(25)
+"""
+
+
+# 100,000 appends to one string in a loop, and a few short strings built up in
+# an inner one.
+CONCAT_PROGRAM = """DECLARE s, row : STRING
+s <- ""
+row <- ""
+FOR i <- 0 TO 1000
+   row <- ""
+   FOR j <- 0 TO 10
+      row <- row && j
+   NEXT j
+   FOR k <- 0 TO 100
+      s <- s && i && ","
+   NEXT k
+NEXT i
+OUTPUT s, row
+"""
+
+
+# Builds source with a backend in directory and returns a function that runs it
+# once with its output thrown away, or None if the backend can't build here.
+def buildRuntime(backend, source, directory, builders=True):
+    program = IRParser(RegexLexer(source)).program()
+    if backend == "py":
+        code = pyruntime.compileModule(PythonGenerator().program(program))
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                pyruntime.runCode(code, False)
+        return run
+
+    exe = os.path.join(directory, "program.exe" if backend == "cs" else "program")
+    if backend == "c":
+        path = os.path.join(directory, "program.c")
+        with open(path, 'w') as outputFile:
+            outputFile.write(CGenerator(False).program(program))
+        build = [os.environ.get("CC", "cc"), "-O2", "-o", exe, path, "-lm"]
+    else:
+        if shutil.which("csc") is None:
+            return None
+        path = os.path.join(directory, "program.cs")
+        emitter = Emitter(path, prompt=False)
+        CSharpGenerator(emitter, builders=builders).program(program)
+        emitter.writeFile()
+        build = ["csc", f"-out:{exe}", path]
+    subprocess.run(build, stdout=subprocess.DEVNULL, check=True)
+    return lambda: subprocess.run([exe], stdout=subprocess.DEVNULL, check=True)
+
+
+def bestTime(run, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# Best run time of each backend, on RUNTIME_PROGRAM and a generated program.
+def benchRuntime(lines, repeat):
+    programs = {"compute": RUNTIME_PROGRAM, "mixed": Generator().generate(lines, "mixed")}
+    for name, source in programs.items():
+        print("{color}{name}: run time by backend{end}".format(
+            color="\033[94m", end="\033[0m", name=name))
+        baseline = None
+        for backend in ("py", "c", "cs"):
+            with tempfile.TemporaryDirectory() as directory:
+                run = buildRuntime(backend, source, directory)
+                if run is None:
+                    print(f"{backend:>12}: skipped, csc isn't on the path")
+                    continue
+                best = bestTime(run, repeat)
+            baseline = baseline or best
+            print(f"{backend:>12}: {best * 1000:>10.1f} ms {baseline / best:>8.2f}x")
+
+
+# Best run time of CONCAT_PROGRAM in C#, concatenating strings as written and
+# with StringBuilderLowering.
+def benchConcat(repeat):
+    print("{color}concat: C# run time by string building{end}".format(
+        color="\033[94m", end="\033[0m"))
+    if shutil.which("csc") is None:
+        print("skipped, csc isn't on the path")
+        return
+    baseline = None
+    for name, builders in (("concatenate", False), ("builder", True)):
+        with tempfile.TemporaryDirectory() as directory:
+            best = bestTime(buildRuntime("cs", CONCAT_PROGRAM, directory, builders), repeat)
+        baseline = baseline or best
+        print(f"{name:>12}: {best * 1000:>10.1f} ms {baseline / best:>8.2f}x")
+
+
+# Runs in a pool worker, so it returns something that can be compared and
+# pickled rather than the CompileResult.
+def compileTask(source, backend):
+    result = compileSource(source, backend, optimized=True)
+    return result.code, [diagnostic.toDict() for diagnostic in result.diagnostics]
+
+
+def compileAll(pool, sources, backend):
+    return list(pool.map(compileTask, sources, [backend] * len(sources)))
+
+
+# Programs that stop in the middle of a token. The lexer used to loop
+# forever on these rather than report them.
+UNTERMINATED_PROGRAMS = ('OUTPUT "abc', 'DECLARE a : ARRAY[1:3 OF INTEGER\n')
+
+
+def benchConcurrent(lines, repeat, jobs):
+    sources = [Generator(seed).generate(lines, SHAPES[seed % len(SHAPES)])
+               for seed in range(2 * len(SHAPES))]
+    # Programs that don't compile, so the diagnostics are checked too.
+    sources.append(sources[0] + "\nOUTPUT undeclared\n")
+    sources.extend(UNTERMINATED_PROGRAMS)
+    workerCounts = sorted({1, 2, 4, jobs or os.cpu_count() or 1})
+    print("{color}concurrent: {count} programs of {lines} lines through compileSource, "
+          "{cpus} CPUs{end}".format(color="\033[94m", end="\033[0m", count=len(sources),
+                                    lines=lines, cpus=os.cpu_count()))
+    mismatches = 0
+    for backend in BACKENDS:
+        expected = [compileTask(source, backend) for source in sources]
+        for source, (code, diagnostics) in zip(UNTERMINATED_PROGRAMS,
+                                               expected[-len(UNTERMINATED_PROGRAMS):]):
+            if code is not None or diagnostics[0]["line"] is None:
+                sys.exit("{color}{source!r} compiled without an error on a line{end}".format(
+                    color="\033[91m", end="\033[0m", source=source))
+        for poolName, poolClass in (("threads", concurrent.futures.ThreadPoolExecutor),
+                                    ("processes", concurrent.futures.ProcessPoolExecutor)):
+            single = None
+            for workers in workerCounts:
+                with poolClass(max_workers=workers) as pool:
+                    # Starts the workers, so that isn't timed.
+                    compileAll(pool, sources[:workers], backend)
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        results = compileAll(pool, sources, backend)
+                        best = min(best, time.perf_counter() - start)
+                        if results != expected:
+                            mismatches += 1
+                single = single or best
+                print(f"{backend:>3} {poolName:>10} x{workers:<3}: "
+                      f"{len(sources) / best:>8.1f} programs/sec {single / best:>6.2f}x")
+    if mismatches:
+        sys.exit("{color}{count} concurrent runs gave different results to compiling one at a time{end}".format(
+            color="\033[91m", end="\033[0m", count=mismatches))
+    print("{color}Every concurrent result matched{end}".format(color="\033[92m", end="\033[0m"))
+
+
+# Returns a message for every phase that is slower or bigger than baseline
+# allows.
+def regressions(results, baseline, tolerance):
+    messages = []
+    for shape, phaseResults in results.items():
+        for name, result in phaseResults.items():
+            expected = baseline.get(shape, {}).get(name)
+            if expected is None:
+                continue
+            if result["linesPerSecond"] < expected["linesPerSecond"] * (1 - tolerance):
+                messages.append(f"{shape} {name}: {result['linesPerSecond']:,.0f} lines/sec, "
+                                f"baseline {expected['linesPerSecond']:,.0f}")
+            if result["peakBytes"] > expected["peakBytes"] * (1 + tolerance):
+                messages.append(f"{shape} {name}: {result['peakBytes'] / 2**20:.1f} MiB, "
+                                f"baseline {expected['peakBytes'] / 2**20:.1f} MiB")
+    return messages
+
+
+def runSuite(args):
+    results = benchSuite(args.lines, args.repeat)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as outputFile:
+            json.dump(results, outputFile, indent=2)
+            outputFile.write("\n")
+        print("{color}Saved baseline to {path}{end}".format(
+            color="\033[92m", end="\033[0m", path=args.baseline))
+        return
+
+    if not os.path.exists(args.baseline):
+        print("{color}No baseline at {path}, save one with --save-baseline{end}".format(
+            color="\033[93m", end="\033[0m", path=args.baseline))
+        return
+    with open(args.baseline, 'r') as inputFile:
+        baseline = json.load(inputFile)
+    messages = regressions(results, baseline, args.tolerance)
+    for message in messages:
+        print("{color}regression{end} {message}".format(
+            color="\033[91m", end="\033[0m", message=message))
+    if messages:
+        sys.exit(1)
+    print("{color}No regressions against {path}{end}".format(
+        color="\033[92m", end="\033[0m", path=args.baseline))
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Compiler benchmarks")
+    argParser.add_argument("file", nargs="?", default="example.pseudo")
+    argParser.add_argument("--copies", type=int, default=1000,
+                           help="how many times to repeat the source")
+    argParser.add_argument("--repeat", type=int, default=5,
+                           help="runs per benchmark, the best one is reported")
+    argParser.add_argument("--suite", action="store_true",
+                           help="benchmark every phase on generated programs and check for regressions")
+    argParser.add_argument("--nesting", action="store_true",
+                           help="compare the recursive and the stack parser on deeper and deeper nesting")
+    argParser.add_argument("--runtime", action="store_true",
+                           help="compare how long programs take to run with each backend")
+    argParser.add_argument("--concat", action="store_true",
+                           help="compare C# run time of strings built in loops with and without StringBuilders")
+    argParser.add_argument("--concurrent", action="store_true",
+                           help="compile programs from several threads and processes at once, check the results and report throughput")
+    argParser.add_argument("-j", "--jobs", type=int,
+                           help="most workers for --concurrent (default: one per CPU)")
+    argParser.add_argument("--lines", type=int, default=10000,
+                           help="lines per generated program in the suite, --nesting and --runtime (a tenth of that with --concurrent)")
+    argParser.add_argument("--baseline", default=BASELINE,
+                           help="baseline results to compare the suite with")
+    argParser.add_argument("--save-baseline", action="store_true",
+                           help="save the suite's results as the new baseline")
+    argParser.add_argument("--tolerance", type=float, default=0.3,
+                           help="fraction a phase may be slower or bigger than the baseline")
+    args = argParser.parse_args()
+
+    if args.suite:
+        runSuite(args)
+        return
+    if args.nesting:
+        benchNesting(args.lines, args.repeat)
+        return
+    if args.runtime:
+        benchRuntime(args.lines, args.repeat)
+        return
+    if args.concat:
+        benchConcat(args.repeat)
+        return
+    if args.concurrent:
+        benchConcurrent(args.lines // 10, args.repeat, args.jobs)
+        return
+
+    with open(args.file, 'r') as inputFile:
+        source = (inputFile.read() + '\n') * args.copies
+
+    benchLexer(source, args.repeat)
+    benchTokenMemory(source)
+
+
+if __name__ == "__main__":
+    main()
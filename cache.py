@@ -0,0 +1,163 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+
+# BuildCache keeps generated code and compiled executables in a directory, one
+# entry per hash of everything that affects them: the source text, the compiler
+# itself and the backend options. Entries are evicted least recently used first
+# once the cache grows past maxSize bytes.
+
+DEFAULT_MAX_SIZE = 256 * 2**20
+
+# Modules whose code decides what gets generated.
+COMPILER_MODULES = ("lex.py", "parse.py", "symbols.py", "ir.py", "optimize.py",
+                    "emit.py", "pyemit.py", "pyruntime.py", "cemit.py")
+
+
+def defaultDirectory():
+    if "PSEUDO_CACHE_DIR" in os.environ:
+        return os.environ["PSEUDO_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pseudocompyler")
+
+
+_compilerVersion = None
+
+
+def compilerVersion():
+    global _compilerVersion
+    if _compilerVersion is None:
+        digest = hashlib.sha256(sys.version.encode())
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in COMPILER_MODULES:
+            with open(os.path.join(directory, module), 'rb') as moduleFile:
+                digest.update(moduleFile.read())
+        _compilerVersion = digest.hexdigest()
+    return _compilerVersion
+
+
+class BuildCache:
+    def __init__(self, directory=None, maxSize=DEFAULT_MAX_SIZE):
+        self.directory = directory or defaultDirectory()
+        self.maxSize = maxSize
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, source, *options):
+        digest = hashlib.sha256()
+        for part in (compilerVersion(), *map(str, options), source):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    # Returns the directory of the entry for key, or None on a miss.
+    def lookup(self, key):
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            return None
+        # The directory's modification time records when it was last used.
+        os.utime(path)
+        return path
+
+    # Copies files ({name in the entry: path}) into a new entry for key and
+    # returns its directory.
+    def store(self, key, files):
+        path = os.path.join(self.directory, key)
+        temp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        for name, filePath in files.items():
+            shutil.copy(filePath, os.path.join(temp, name))
+        try:
+            os.rename(temp, path)
+        except OSError:
+            # Someone else stored the same entry first.
+            shutil.rmtree(temp, ignore_errors=True)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, fileName))
+                       for fileName in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.maxSize:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+# FragmentCache keeps the generated code of single routines, for RoutineParser
+# to reuse when a program is compiled again with only some of its routines
+# changed. Each fragment is a file named by its key, in .fragments inside the
+# build cache's directory, where BuildCache leaves it alone. Hits and misses
+# are counted so they can be reported.
+class FragmentCache:
+    def __init__(self, directory=None, maxSize=DEFAULT_MAX_SIZE // 4):
+        self.directory = os.path.join(directory or defaultDirectory(), ".fragments")
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, *parts):
+        digest = hashlib.sha256(compilerVersion().encode())
+        for part in parts:
+            digest.update(b'\0')
+            digest.update(part if isinstance(part, bytes) else part.encode())
+        return digest.hexdigest()
+
+    # Returns the (code, statement count) stored for key, or None on a miss.
+    def lookup(self, key):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as fragmentFile:
+                statementCount, code = fragmentFile.read().split('\n', 1)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return code, int(statementCount)
+
+    def store(self, key, code, statementCount):
+        handle, temp = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        with os.fdopen(handle, 'w', encoding='utf-8', newline='') as fragmentFile:
+            fragmentFile.write(f"{statementCount}\n{code}")
+        os.replace(temp, os.path.join(self.directory, key))
+
+    # Least recently used fragments go first once there are more than maxSize
+    # bytes of them.
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.startswith('.'):
+                    continue
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+                total += info.st_size
+        if total <= self.maxSize:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,756 @@
+import math
+from ir import *
+from lex import TokenType, CompileError
+from pyemit import unescape
+
+# CGenerator lowers a program in intermediate representation to a single C
+# file that prints exactly what the C# from CSharpGenerator prints, so it can
+# be built into a native binary with the system C compiler (cc -O2). Like
+# PythonGenerator it keeps every value's C# type: INTEGER is int32_t with
+# wraparound, REAL is float, CHAR is a code point written out as UTF-8 and
+# STRING is a NUL-terminated UTF-8 string. The helpers the code calls into are
+# in C_RUNTIME. Strings are never freed; the programs are short-lived.
+
+
+C_TYPES = {"INTEGER": "int32_t", "REAL": "float", "double": "double", "STRING": "_String",
+           "BOOLEAN": "bool", "CHAR": "int32_t"}
+C_DEFAULTS = {"INTEGER": "0", "REAL": "0.0f", "double": "0.0", "STRING": "\"\"",
+              "BOOLEAN": "false", "CHAR": "0"}
+
+C_ARITHMETIC = {"+": "_add", "&": "_add", "-": "_sub", "*": "_mul", "/": "_idiv"}
+C_COMPARISONS = {"=": "==", "<>": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+C_READERS = {"INTEGER": "_readInt()", "REAL": "_readFloat()", "NUMBER": "_readFloat()",
+             "BOOLEAN": "_readBool()", "CHAR": "_readChar()"}
+C_WRITERS = {"INTEGER": "_writeInt", "REAL": "_writeFloat", "double": "_writeDouble",
+             "BOOLEAN": "_writeBool", "CHAR": "_writeChar", "STRING": "_writeString"}
+C_TEXT = {"INTEGER": "_intText", "REAL": "_floatText", "double": "_doubleText",
+          "BOOLEAN": "_boolText", "CHAR": "_charText"}
+
+
+# A C string literal holding text as UTF-8, with everything but printable
+# ASCII written as octal escapes.
+def cString(text):
+    chunks = []
+    for byte in text.encode('utf-8', 'surrogatepass'):
+        if byte in b'"\\?':
+            chunks.append('\\' + chr(byte))
+        elif 32 <= byte < 127:
+            chunks.append(chr(byte))
+        else:
+            chunks.append(f"\\{byte:03o}")
+    return '"' + "".join(chunks) + '"'
+
+
+class CGenerator:
+    def __init__(self, prompt=True):
+        self.prompt = prompt
+        self.routines = {}  # name -> (params, return type)
+        self.types = {}     # variable types in the routine being generated
+        self.constants = {}  # values of its whole number constants
+        self.returnType = None
+        self.count = 0
+        self.lines = []
+        self.depth = 0
+
+    def program(self, program):
+        for statement in program.statements:
+            if isinstance(statement, (Procedure, Function)):
+                returnType = getattr(statement, "returnType", None)
+                self.routines[statement.name] = (statement.params, returnType)
+
+        prototypes = []
+        for statement in program.statements:
+            if isinstance(statement, (Procedure, Function)):
+                prototypes.append(self.signature(statement) + ";")
+                self.routine(statement)
+
+        self.types = {}
+        self.constants = {}
+        self.returnType = None
+        self.line("int main(void)\n{")
+        self.depth = 1
+        self.line("static char buffer[1 << 16];")
+        self.line("setvbuf(stdout, buffer, _IOFBF, sizeof buffer);")
+        self.line(f"_prompt = {'true' if self.prompt else 'false'};")
+        self.block(statement for statement in program.statements
+                   if not isinstance(statement, (Procedure, Function)))
+        self.line("return 0;")
+        self.depth = 0
+        self.line("}")
+        return C_RUNTIME + "\n".join(prototypes) + "\n\n" + "\n".join(self.lines) + "\n"
+
+    def line(self, code):
+        self.lines.append("\t" * self.depth + code)
+
+    def signature(self, node):
+        returnType = getattr(node, "returnType", None)
+        params = ", ".join(f"{self.cType(self.normalType(dataType))} u_{paramName}"
+                           for paramName, dataType in node.params)
+        result = "void" if returnType is None else self.cType(self.normalType(returnType))
+        return f"static {result} u_{node.name}({params or 'void'})"
+
+    def routine(self, node):
+        self.types = {}
+        self.constants = {}
+        for paramName, dataType in node.params:
+            self.types[paramName] = self.normalType(dataType)
+        self.returnType = getattr(node, "returnType", None)
+        self.line(self.signature(node) + "\n{")
+        self.depth = 1
+        self.block(node.body)
+        # C# rejects a function that can end without returning, so this is
+        # never reached; it keeps cc from warning about it.
+        if self.returnType is not None:
+            self.line(f"return {self.default(self.normalType(self.returnType))};")
+        self.depth = 0
+        self.line("}\n")
+
+    def block(self, statements):
+        for statement in statements:
+            getattr(self, "statement" + type(statement).__name__)(statement)
+
+    # Emits a braced block and the line that closes it.
+    def body(self, statements, closing="}"):
+        self.depth += 1
+        self.block(statements)
+        self.depth -= 1
+        self.line(closing)
+
+    def newName(self, prefix):
+        self.count += 1
+        return f"_{prefix}{self.count}"
+
+    def normalType(self, dataType):
+        return "REAL" if dataType == "NUMBER" else dataType
+
+    def cType(self, dataType):
+        if isinstance(dataType, ArrayType):
+            return "_Array"
+        return C_TYPES[dataType]
+
+    def default(self, dataType):
+        if isinstance(dataType, ArrayType):
+            extents = self.extents(dataType)
+            if len(extents) == 1:
+                size = self.expression(extents[0])[0]
+            else:
+                size = max(0, math.prod(extents))
+            element = self.cType(self.normalType(dataType.elementType))
+            return f"_newArray({size}, sizeof({element}))"
+        return C_DEFAULTS[dataType]
+
+    # An array is a single block, with the rows of one with more dimensions
+    # one after another. The extents of those have to be known here, so the
+    # offset of an element can be worked out; an array with one dimension can
+    # be any size.
+    def extents(self, dataType):
+        extents = dataType.extents()
+        if len(extents) == 1:
+            return extents
+        values = [self.constantValue(extent) for extent in extents]
+        if None in values:
+            raise CompileError("C Backend Error",
+                               "Arrays with more than one dimension need constant bounds")
+        return values
+
+    # The value of a whole number expression of literals and constants, or
+    # None if it isn't one.
+    def constantValue(self, node):
+        if isinstance(node, Literal):
+            return node.value if type(node.value) is int else None
+        if isinstance(node, Name):
+            return self.constants.get(node.name)
+        if isinstance(node, Unary) and node.op == "-":
+            value = self.constantValue(node.operand)
+            return None if value is None else -value
+        if isinstance(node, Binary) and node.op in ("+", "-", "*"):
+            left, right = self.constantValue(node.left), self.constantValue(node.right)
+            if left is None or right is None:
+                return None
+            return left + right if node.op == "+" else left - right if node.op == "-" else left * right
+        return None
+
+    def variable(self, identifier):
+        return "u_" + identifier
+
+    def statementReturn(self, node):
+        self.line(f"return {self.expression(node.value)[0]};")
+
+    def statementCallStatement(self, node):
+        self.line(self.expression(node.call)[0] + ";")
+
+    def statementOutput(self, node):
+        for value in node.values:
+            value, valueType = self.expression(value)
+            self.line(f"{C_WRITERS[valueType]}({value});")
+        self.line("_writeLine();")
+
+    def statementInput(self, node):
+        if node.declare:
+            self.types[node.name] = "STRING"
+            self.line(f"_String {self.variable(node.name)};")
+        self.line(f"{self.variable(node.name)} = {C_READERS.get(node.dataType, '_readLine()')};")
+
+    def statementDeclare(self, node):
+        dataType = self.normalType(node.dataType)
+        for identifier in node.names:
+            self.types[identifier] = dataType
+            self.line(f"{self.cType(dataType)} {self.variable(identifier)} = {self.default(dataType)};")
+
+    def statementConstant(self, node):
+        dataType = self.normalType(node.dataType)
+        self.types[node.name] = dataType
+        if isinstance(node.value, Literal) and type(node.value.value) is int:
+            self.constants[node.name] = node.value.value
+        value = self.expression(node.value)[0]
+        self.line(f"const {self.cType(dataType)} {self.variable(node.name)} = {value};")
+
+    def statementAssign(self, node):
+        target = self.expression(node.target)[0]
+        self.line(f"{target} = {self.expression(node.value)[0]};")
+
+    def statementLet(self, node):
+        value, valueType = self.expression(node.value)
+        self.types[node.name] = valueType
+        self.line(f"{self.cType(valueType)} {self.variable(node.name)} = {value};")
+
+    def statementIf(self, node):
+        keyword = "if"
+        for branch in node.branches:
+            self.line(f"{keyword} ({self.expression(branch.condition)[0]}) {{")
+            self.depth += 1
+            self.block(branch.body)
+            self.depth -= 1
+            keyword = "} else if"
+        if node.elseBody is not None:
+            self.line("} else {")
+            self.depth += 1
+            self.block(node.elseBody)
+            self.depth -= 1
+        self.line("}")
+
+    # The subject is evaluated once into a temporary, then tested against each
+    # label in turn, as C# labels can be strings, which C's switch can't take.
+    def statementCase(self, node):
+        subject, subjectType = self.expression(node.subject)
+        temp = self.newName("case")
+        self.types[temp] = subjectType
+        self.line(f"{self.cType(subjectType)} {self.variable(temp)} = {subject};")
+        keyword = "if"
+        for branch in node.branches:
+            test = self.expression(Binary("=", Name(temp), branch.condition))[0]
+            self.line(f"{keyword} ({test}) {{")
+            self.depth += 1
+            self.block(branch.body)
+            self.depth -= 1
+            keyword = "} else if"
+        if node.otherwise is not None:
+            self.line("} else {" if node.branches else "{")
+            self.depth += 1
+            self.block(node.otherwise)
+            self.depth -= 1
+        if node.branches or node.otherwise is not None:
+            self.line("}")
+
+    def statementWhile(self, node):
+        self.line(f"while ({self.expression(node.condition)[0]}) {{")
+        self.body(node.body)
+
+    def statementRepeat(self, node):
+        self.line("do {")
+        self.body(node.body, f"}} while (!{self.expression(node.condition)[0]});")
+
+    def statementFor(self, node):
+        var = self.variable(node.var)
+        self.types[node.var] = "INTEGER"
+        init = f"int32_t {var}" if node.declare else var
+        start = self.expression(node.start)[0]
+        end = self.expression(node.end)[0]
+        self.line(f"for ({init} = {start}; {var} < {end}; {var} = _add({var}, 1)) {{")
+        self.body(node.body)
+
+    # An OpenMP loop, when the program is built with -fopenmp (without it the
+    # pragmas are ignored and it runs in order), that only starts threads for
+    # at least threshold iterations. With a reduction each thread adds up (or
+    # keeps the smallest or largest of) its own iterations in a variable of its
+    # own, and those are combined into the reduction's one thread at a time.
+    def statementParallelFor(self, node):
+        loop = node.loop
+        low, high, counter = self.newName("low"), self.newName("high"), self.newName("i")
+        for name in (low, high, counter):
+            self.types[name] = "INTEGER"
+        lowVar, highVar, counterVar = map(self.variable, (low, high, counter))
+        self.line(f"int32_t {lowVar} = {self.expression(loop.start)[0]}, "
+                  f"{highVar} = {self.expression(loop.end)[0]};")
+        threshold = f"if ((int64_t){highVar} - {lowVar} >= {node.threshold})"
+        names = {loop.var: counter}
+        if node.reduction is None:
+            self.line(f"#pragma omp parallel for {threshold}")
+        else:
+            op, name = node.reduction
+            local = self.newName("local")
+            names[name] = local
+            self.types[local] = self.types[name]
+            localVar, nameVar = self.variable(local), self.variable(name)
+            self.line(f"#pragma omp parallel {threshold}")
+            self.line("{")
+            self.depth += 1
+            initial = "0" if op == "+" else nameVar
+            self.line(f"{self.cType(self.types[name])} {localVar} = {initial};")
+            self.line("#pragma omp for")
+        self.line(f"for (int32_t {counterVar} = {lowVar}; {counterVar} < {highVar}; {counterVar}++) {{")
+        self.body(renamed(loop.body, names))
+        if node.reduction is not None:
+            self.line("#pragma omp critical")
+            if op == "+":
+                self.line(f"{nameVar} = _add({nameVar}, {localVar});")
+            else:
+                self.line(f"if ({localVar} {'>' if op == 'max' else '<'} {nameVar}) {nameVar} = {localVar};")
+            self.depth -= 1
+            self.line("}")
+        # The counter's value after the loop, for code that reads it.
+        if not loop.declare:
+            self.line(f"{self.variable(loop.var)} = {lowVar} > {highVar} ? {lowVar} : {highVar};")
+
+    def numeric(self, node, valueType):
+        return node, "INTEGER" if valueType == "CHAR" else valueType
+
+    # Returns the C for an expression along with its C# type. Every operation
+    # is bracketed, so precedence never has to be worked out.
+    def expression(self, node):
+        if isinstance(node, Literal):
+            if node.kind == TokenType.NUMBER:
+                if isinstance(node.value, float):
+                    return repr(node.value), "double"
+                return str(node.value), "INTEGER"
+            if node.kind == TokenType.STRING:
+                return cString(unescape(node.value)), "STRING"
+            if node.kind == TokenType.CHAR:
+                return str(ord(node.value)), "CHAR"
+            return ("true" if node.value else "false"), "BOOLEAN"
+
+        if isinstance(node, Name):
+            return self.variable(node.name), self.types.get(node.name, "INTEGER")
+
+        if isinstance(node, Index):
+            valueType = self.types.get(node.name)
+            if not isinstance(valueType, ArrayType):
+                raise CompileError("C Backend Error", f"{node.name} isn't an array")
+            elementType = self.normalType(valueType.elementType)
+            array = self.variable(node.name)
+            extents = self.extents(valueType)
+            if len(extents) == 1:
+                offset = f"_checkIndex({self.expression(node.indices[0])[0]}, {array}.length)"
+            else:
+                # Row-major: each index is checked against its own extent.
+                offset = f"_checkIndex({self.expression(node.indices[0])[0]}, {extents[0]})"
+                for index, extent in zip(node.indices[1:], extents[1:]):
+                    offset = f"({offset} * {extent} + _checkIndex({self.expression(index)[0]}, {extent}))"
+            value = f"(({self.cType(elementType)} *){array}.data)[{offset}]"
+            return value, elementType
+
+        if isinstance(node, Call):
+            args = ", ".join(self.expression(arg)[0] for arg in node.args)
+            returnType = self.routines.get(node.name, ([], None))[1]
+            return f"u_{node.name}({args})", self.normalType(returnType)
+
+        if isinstance(node, Unary):
+            operand, operandType = self.expression(node.operand)
+            if node.op == "NOT":
+                return f"(!{operand})", "BOOLEAN"
+            operand, operandType = self.numeric(operand, operandType)
+            if node.op == "+":
+                return operand, operandType
+            if operandType == "INTEGER":
+                return f"_neg({operand})", operandType
+            return f"(-{operand})", operandType
+
+        left, leftType = self.expression(node.left)
+        right, rightType = self.expression(node.right)
+        op = node.op
+
+        if op in ("AND", "OR"):
+            return f"({left} {'&&' if op == 'AND' else '||'} {right})", "BOOLEAN"
+
+        if op in C_COMPARISONS:
+            if leftType == rightType == "STRING":
+                return f"(_compare({left}, {right}) {C_COMPARISONS[op]} 0)", "BOOLEAN"
+            # C compares an int with a float as two floats, the same as C#.
+            return f"({left} {C_COMPARISONS[op]} {right})", "BOOLEAN"
+
+        if op in ("+", "&") and "STRING" in (leftType, rightType):
+            return f"_concat({self.text(left, leftType)}, {self.text(right, rightType)})", "STRING"
+
+        left, leftType = self.numeric(left, leftType)
+        right, rightType = self.numeric(right, rightType)
+        if "double" in (leftType, rightType):
+            resultType = "double"
+        elif "REAL" in (leftType, rightType):
+            resultType = "REAL"
+            left, right = f"(float){left}", f"(float){right}"
+        else:
+            return f"{C_ARITHMETIC[op]}({left}, {right})", "INTEGER"
+        return f"({left} {'+' if op == '&' else op} {right})", resultType
+
+    # The string C# gets when a value of this type is concatenated.
+    def text(self, node, valueType):
+        if valueType in C_TEXT:
+            return f"{C_TEXT[valueType]}({node})"
+        return node
+
+
+# Everything generated programs call into, ahead of the program itself. Runtime
+# errors print what the .NET runtime prints for the same exception and exit
+# with its status. Output goes through stdout's buffer, flushed on exit and
+# before a prompt.
+C_RUNTIME = r"""#include <math.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef const char *_String;
+typedef struct { int32_t length; void *data; } _Array;
+
+static bool _prompt = true;
+
+static void _fail(const char *exception, const char *message)
+{
+	fflush(stdout);
+	fprintf(stderr, "Unhandled exception. System.%s: %s\n", exception, message);
+	exit(134);
+}
+
+static void *_alloc(size_t size)
+{
+	void *memory = malloc(size);
+	if (memory == NULL)
+		_fail("OutOfMemoryException", "Insufficient memory to continue the execution of the program.");
+	return memory;
+}
+
+static inline int32_t _add(int32_t a, int32_t b) { return (int32_t)((uint32_t)a + (uint32_t)b); }
+static inline int32_t _sub(int32_t a, int32_t b) { return (int32_t)((uint32_t)a - (uint32_t)b); }
+static inline int32_t _mul(int32_t a, int32_t b) { return (int32_t)((uint32_t)a * (uint32_t)b); }
+static inline int32_t _neg(int32_t a) { return (int32_t)(0u - (uint32_t)a); }
+
+static inline int32_t _idiv(int32_t a, int32_t b)
+{
+	if (b == 0)
+		_fail("DivideByZeroException", "Attempted to divide by zero.");
+	return b == -1 ? _neg(a) : a / b;
+}
+
+static _Array _newArray(int32_t length, size_t size)
+{
+	_Array array = { length, _alloc((length > 0 ? length : 1) * size) };
+	memset(array.data, 0, (length > 0 ? length : 1) * size);
+	return array;
+}
+
+static inline int32_t _checkIndex(int32_t index, int32_t length)
+{
+	if ((uint32_t)index >= (uint32_t)length)
+		_fail("IndexOutOfRangeException", "Index was outside the bounds of the array.");
+	return index;
+}
+
+// Strings
+
+static int _encode(char *out, int32_t c)
+{
+	if (c < 0x80) { out[0] = c; return 1; }
+	if (c < 0x800) { out[0] = 0xC0 | c >> 6; out[1] = 0x80 | (c & 0x3F); return 2; }
+	if (c < 0x10000) {
+		out[0] = 0xE0 | c >> 12; out[1] = 0x80 | (c >> 6 & 0x3F); out[2] = 0x80 | (c & 0x3F);
+		return 3;
+	}
+	out[0] = 0xF0 | c >> 18; out[1] = 0x80 | (c >> 12 & 0x3F);
+	out[2] = 0x80 | (c >> 6 & 0x3F); out[3] = 0x80 | (c & 0x3F);
+	return 4;
+}
+
+static _String _copy(const char *text, size_t length)
+{
+	char *copy = _alloc(length + 1);
+	memcpy(copy, text, length);
+	copy[length] = 0;
+	return copy;
+}
+
+static _String _concat(_String a, _String b)
+{
+	size_t lengthA = a ? strlen(a) : 0, lengthB = b ? strlen(b) : 0;
+	char *result = _alloc(lengthA + lengthB + 1);
+	memcpy(result, a ? a : "", lengthA);
+	memcpy(result + lengthA, b ? b : "", lengthB + 1);
+	return result;
+}
+
+// Ordinal comparison; only equality is used, as C# has no string < or >.
+static int _compare(_String a, _String b)
+{
+	if (a == b)
+		return 0;
+	if (a == NULL || b == NULL)
+		return a == NULL ? -1 : 1;
+	return strcmp(a, b);
+}
+
+// Numbers are laid out the way .NET's default ToString() does: the shortest
+// digits that round-trip, in scientific notation outside -5 < exponent <
+// precision.
+static void _formatDigits(char *out, const char *digits, int exponent, bool negative, int precision)
+{
+	int length = strlen(digits);
+	if (negative)
+		*out++ = '-';
+	if (-5 < exponent && exponent < precision) {
+		if (exponent < 0) {
+			*out++ = '0';
+			*out++ = '.';
+			for (int i = 0; i < -exponent - 1; i++)
+				*out++ = '0';
+			strcpy(out, digits);
+		} else if (length <= exponent + 1) {
+			memcpy(out, digits, length);
+			out += length;
+			for (int i = 0; i < exponent + 1 - length; i++)
+				*out++ = '0';
+			*out = 0;
+		} else {
+			memcpy(out, digits, exponent + 1);
+			out += exponent + 1;
+			*out++ = '.';
+			strcpy(out, digits + exponent + 1);
+		}
+		return;
+	}
+	*out++ = digits[0];
+	if (length > 1) {
+		*out++ = '.';
+		memcpy(out, digits + 1, length - 1);
+		out += length - 1;
+	}
+	sprintf(out, "E%c%02d", exponent < 0 ? '-' : '+', abs(exponent));
+}
+
+// Takes the digits and exponent out of text printed with %.*e.
+static void _formatScientific(char *out, const char *text, int precision)
+{
+	char digits[32];
+	int length = 0;
+	bool negative = *text == '-';
+	for (text += negative; *text != 'e'; text++)
+		if (*text != '.')
+			digits[length++] = *text;
+	while (length > 1 && digits[length - 1] == '0')
+		length--;
+	digits[length] = 0;
+	_formatDigits(out, digits, atoi(text + 1), negative, precision);
+}
+
+static bool _formatSpecial(char *out, double value)
+{
+	if (isnan(value))
+		strcpy(out, "NaN");
+	else if (isinf(value))
+		strcpy(out, value > 0 ? "Infinity" : "-Infinity");
+	else if (value == 0)
+		strcpy(out, signbit(value) ? "-0" : "0");
+	else
+		return false;
+	return true;
+}
+
+static void _formatFloat(char *out, float value)
+{
+	char text[32];
+	if (_formatSpecial(out, value))
+		return;
+	for (int digits = 0; digits < 9; digits++) {
+		sprintf(text, "%.*e", digits, value);
+		if ((float)strtod(text, NULL) == value)
+			break;
+	}
+	_formatScientific(out, text, 9);
+}
+
+static void _formatDouble(char *out, double value)
+{
+	char text[32];
+	if (_formatSpecial(out, value))
+		return;
+	for (int digits = 0; digits < 17; digits++) {
+		sprintf(text, "%.*e", digits, value);
+		if (strtod(text, NULL) == value)
+			break;
+	}
+	_formatScientific(out, text, 17);
+}
+
+static _String _intText(int32_t value) { char text[16]; return _copy(text, sprintf(text, "%d", value)); }
+static _String _floatText(float value) { char text[32]; _formatFloat(text, value); return _copy(text, strlen(text)); }
+static _String _doubleText(double value) { char text[32]; _formatDouble(text, value); return _copy(text, strlen(text)); }
+static _String _boolText(bool value) { return value ? "True" : "False"; }
+static _String _charText(int32_t value) { char text[4]; return _copy(text, _encode(text, value)); }
+
+// Output
+
+static void _writeInt(int32_t value) { printf("%d", value); }
+static void _writeFloat(float value) { char text[32]; _formatFloat(text, value); fputs(text, stdout); }
+static void _writeDouble(double value) { char text[32]; _formatDouble(text, value); fputs(text, stdout); }
+static void _writeBool(bool value) { fputs(value ? "True" : "False", stdout); }
+static void _writeChar(int32_t value) { char text[4]; fwrite(text, 1, _encode(text, value), stdout); }
+static void _writeString(_String value) { if (value != NULL) fputs(value, stdout); }
+static void _writeLine(void) { putchar('\n'); }
+
+// Input, with the same line ends as StreamReader.ReadLine and parsed the way
+// int.Parse, float.Parse, bool.Parse and char.Parse do in the invariant
+// culture. The end of the input reads as NULL.
+
+static _String _readLine(void)
+{
+	if (_prompt) {
+		fputs("Input: ", stdout);
+		fflush(stdout);
+	}
+	size_t size = 256, length = 0;
+	char *line = _alloc(size);
+	int c;
+	while ((c = getchar()) != EOF && c != '\n') {
+		if (c == '\r') {
+			int next = getchar();
+			if (next != '\n' && next != EOF)
+				ungetc(next, stdin);
+			break;
+		}
+		if (length + 1 == size) {
+			line = realloc(line, size *= 2);
+			if (line == NULL)
+				_fail("OutOfMemoryException", "Insufficient memory to continue the execution of the program.");
+		}
+		line[length++] = c;
+	}
+	if (c == EOF && length == 0) {
+		free(line);
+		return NULL;
+	}
+	line[length] = 0;
+	return line;
+}
+
+#define _WHITESPACE " \t\n\v\f\r"
+#define _FORMAT_ERROR "The input string was not in a correct format."
+
+static _String _readValue(void)
+{
+	_String line = _readLine();
+	if (line == NULL)
+		_fail("ArgumentNullException", "Value cannot be null. (Parameter 's')");
+	return line;
+}
+
+// Copies line without the whitespace around it.
+static char *_trim(_String line, const char *whitespace)
+{
+	line += strspn(line, whitespace);
+	size_t length = strlen(line);
+	while (length > 0 && strchr(whitespace, line[length - 1]) != NULL)
+		length--;
+	return (char *)_copy(line, length);
+}
+
+static int32_t _readInt(void)
+{
+	char *text = _trim(_readValue(), _WHITESPACE);
+	const char *digits = text + (*text == '+' || *text == '-');
+	if (*digits == 0 || strspn(digits, "0123456789") != strlen(digits))
+		_fail("FormatException", _FORMAT_ERROR);
+	int64_t value = 0;
+	for (; *digits; digits++) {
+		value = value * 10 + (*digits - '0');
+		if (value > 2147483648LL)
+			_fail("OverflowException", "Value was either too large or too small for an Int32.");
+	}
+	if (*text == '-')
+		value = -value;
+	if (value > INT32_MAX)
+		_fail("OverflowException", "Value was either too large or too small for an Int32.");
+	return (int32_t)value;
+}
+
+static bool _isWord(const char *text, const char *word)
+{
+	if (*text == '+' || *text == '-')
+		text++;
+	return strcasecmp(text, word) == 0;
+}
+
+static float _readFloat(void)
+{
+	char *text = _trim(_readValue(), _WHITESPACE);
+	if (_isWord(text, "infinity") || _isWord(text, "nan"))
+		return (float)strtod(text, NULL);
+	// [+-]?([0-9][0-9,]*\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?, without the commas
+	char *number = _alloc(strlen(text) + 1), *out = number;
+	const char *in = text;
+	if (*in == '+' || *in == '-')
+		*out++ = *in++;
+	if (*in >= '0' && *in <= '9') {
+		for (; (*in >= '0' && *in <= '9') || *in == ','; in++)
+			if (*in != ',')
+				*out++ = *in;
+		if (*in == '.')
+			*out++ = *in++;
+		while (*in >= '0' && *in <= '9')
+			*out++ = *in++;
+	} else if (*in == '.' && in[1] >= '0' && in[1] <= '9') {
+		*out++ = *in++;
+		while (*in >= '0' && *in <= '9')
+			*out++ = *in++;
+	} else {
+		_fail("FormatException", _FORMAT_ERROR);
+	}
+	if ((*in == 'e' || *in == 'E') && ((in[1] >= '0' && in[1] <= '9') ||
+			((in[1] == '+' || in[1] == '-') && in[2] >= '0' && in[2] <= '9'))) {
+		*out++ = *in++;
+		if (*in == '+' || *in == '-')
+			*out++ = *in++;
+		while (*in >= '0' && *in <= '9')
+			*out++ = *in++;
+	}
+	if (*in != 0)
+		_fail("FormatException", _FORMAT_ERROR);
+	*out = 0;
+	return (float)strtod(number, NULL);
+}
+
+static bool _readBool(void)
+{
+	char *text = _trim(_readValue(), _WHITESPACE);
+	if (strcasecmp(text, "true") == 0)
+		return true;
+	if (strcasecmp(text, "false") != 0)
+		_fail("FormatException", "String was not recognized as a valid Boolean.");
+	return false;
+}
+
+static int32_t _readChar(void)
+{
+	const unsigned char *text = (const unsigned char *)_readValue();
+	int length = *text < 0x80 ? 1 : *text < 0xE0 ? 2 : *text < 0xF0 ? 3 : 4;
+	if (*text == 0 || strlen((const char *)text) != (size_t)length)
+		_fail("FormatException", "String must be exactly one character long.");
+	if (length == 1)
+		return text[0];
+	int32_t c = text[0] & (0x7F >> length);
+	for (int i = 1; i < length; i++)
+		c = c << 6 | (text[i] & 0x3F);
+	return c;
+}
+
+// The program
+
+"""
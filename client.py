@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Sends a file to a running compile server (see server.py) and prints what it
+# generated, or the error, exactly as main.py would show it.
+
+
+# Same as server.defaultSocket, kept here so the client doesn't load the compiler.
+def defaultSocket():
+    return os.environ.get("PSEUDO_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"pseudocompyler-{os.getuid()}.sock")
+
+
+def request(path, source, backend="cs", optimized=False, prompt=True):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        message = {"source": source, "backend": backend, "optimize": optimized,
+                   "prompt": prompt}
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        with connection.makefile('rb') as responseFile:
+            return json.loads(responseFile.readline())
+
+
+def main():
+    argParser = argparse.ArgumentParser(
+        description="Compile a file with a running compile server")
+    argParser.add_argument("file", help="pseudocode source file, - for standard input")
+    argParser.add_argument("-O", "--optimize", action="store_true",
+                           help="compile through the IR and run the optimization passes")
+    argParser.add_argument("--backend", choices=("cs", "py", "c"), default="cs",
+                           help="generate C#, Python or C")
+    argParser.add_argument("--no-prompt", action="store_true",
+                           help="generate code that doesn't print \"Input: \" before reading input")
+    argParser.add_argument("-o", "--output", help="write the generated code here instead of to standard output")
+    argParser.add_argument("--socket", default=defaultSocket(),
+                           help="path of the server's socket")
+    argParser.add_argument("-v", "--verbose", action="store_true",
+                           help="print how long the server took to compile")
+    args = argParser.parse_args()
+
+    if args.file == "-":
+        source = sys.stdin.read()
+    else:
+        with open(args.file, 'r') as inputFile:
+            source = inputFile.read()
+
+    try:
+        response = request(args.socket, source, args.backend, args.optimize,
+                           not args.no_prompt)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit("{color}Error\nNo compile server at {path}, start one with python server.py{end}".format(
+            color="\033[91m", end="\033[0m", path=args.socket))
+
+    if args.verbose:
+        print(f"compiled in {response['elapsed']}us", file=sys.stderr)
+    if not response["ok"]:
+        sys.exit("{color}{kind}\n{message}{end}".format(
+            color="\033[91m", end="\033[0m", **response["error"]))
+
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            outputFile.write(response["code"])
+    else:
+        sys.stdout.write(response["code"])
+
+
+if __name__ == "__main__":
+    main()
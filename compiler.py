@@ -0,0 +1,82 @@
+from lex import *
+from emit import *
+from parse import *
+from optimize import *
+from pyemit import PythonGenerator
+from cemit import CGenerator
+import ast
+import io
+
+# Compiling from other programs. compileSource takes pseudocode and gives back
+# the generated C#, Python or C source with what went wrong, all in memory:
+# nothing is read or written on disk and nothing exits the process.
+#
+#   result = compileSource(text, backend="c", optimized=True)
+#   if result.ok:
+#       print(result.code)
+#   for diagnostic in result.diagnostics:
+#       print(diagnostic)
+#
+# Every call builds its own lexer, parser and generator and the compiler keeps
+# no state between calls, so any number of threads can compile at once.
+
+BACKENDS = ("cs", "py", "c")
+
+
+class Diagnostic:
+    def __init__(self, kind, message, line=None):
+        self.kind = kind
+        self.message = message
+        self.line = line
+
+    def toDict(self):
+        return {"kind": self.kind, "message": self.message, "line": self.line}
+
+    def __str__(self):
+        where = f" (line {self.line})" if self.line is not None else ""
+        return f"{self.kind}{where}\n{self.message}"
+
+
+# code is None when compiling failed, and diagnostics then says why.
+class CompileResult:
+    def __init__(self, code=None, diagnostics=()):
+        self.code = code
+        self.diagnostics = list(diagnostics)
+
+    @property
+    def ok(self):
+        return self.code is not None
+
+
+def parseIR(source, optimized=False):
+    program = IRParser(RegexLexer(source)).program()
+    return optimize(program) if optimized else program
+
+
+# Like compileSource, but returns just the code and raises CompileError.
+def generateCode(source, backend="cs", optimized=False, prompt=True):
+    if backend == "py":
+        return ast.unparse(PythonGenerator().program(parseIR(source, optimized)))
+    if backend == "c":
+        return CGenerator(prompt).program(parseIR(source, optimized))
+    if backend != "cs":
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+    emitter = Emitter(None, prompt=prompt)
+    if optimized:
+        CSharpGenerator(emitter).program(parseIR(source, True))
+    else:
+        Parser(RegexLexer(source), emitter).program()
+    output = io.StringIO()
+    emitter.writeTo(output)
+    return output.getvalue()
+
+
+def compileSource(source, backend="cs", optimized=False, prompt=True):
+    try:
+        return CompileResult(generateCode(source, backend, optimized, prompt))
+    except CompileError as error:
+        return CompileResult(diagnostics=[Diagnostic(error.kind, error.message, error.line)])
+    except RecursionError:
+        return CompileResult(diagnostics=[Diagnostic(
+            "Parse Error", "Blocks are nested too deep to compile")])
@@ -0,0 +1,156 @@
+from lex import *
+from emit import *
+from parse import *
+from optimize import *
+from pyemit import PythonGenerator
+from cemit import CGenerator
+import pyruntime
+import argparse
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import tempfile
+
+# Checks that the in-process Python backend (or with --backend c, the native C
+# one) prints exactly what the C# backend prints, for example.pseudo and every
+# program in corpus/. The C# output of
+# each program is kept next to it as <name>.out, and its standard input, if it
+# reads any, as <name>.in. Run with --regenerate to rebuild the .out files
+# with csc after changing the corpus or the C# backend.
+#
+# --backend cs checks the C# itself, built with csc: what the default parser
+# emits (what main.py runs without -O), for the programs it can parse, and
+# what the IR emits with -O.
+#
+# A program that shouldn't compile has <name>.err in place of <name>.out, with
+# the error every backend has to give, as "<kind>: <message>".
+
+
+def readIfExists(path):
+    if not os.path.exists(path):
+        return ""
+    with open(path, 'r', newline='') as inputFile:
+        return inputFile.read()
+
+
+def runPython(source, stdin, optimized):
+    program = IRParser(RegexLexer(source)).program()
+    if optimized:
+        program = optimize(program)
+    module = PythonGenerator().program(program)
+
+    output = io.StringIO()
+    oldStdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(output):
+            pyruntime.run(module)
+    finally:
+        sys.stdin = oldStdin
+    return output.getvalue()
+
+
+def runC(source, stdin, optimized):
+    program = IRParser(RegexLexer(source)).program()
+    if optimized:
+        program = optimize(program)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.c")
+        exe = os.path.join(directory, "program")
+        with open(path, 'w') as outputFile:
+            outputFile.write(CGenerator().program(program))
+        subprocess.run([os.environ.get("CC", "cc"), "-O2", "-o", exe, path, "-lm"], check=True)
+        result = subprocess.run([exe], input=stdin, capture_output=True, text=True)
+    return result.stdout
+
+
+def runCSharp(source, stdin, csc, run, optimized=False, default=False):
+    emitter = Emitter(None)
+    if default:
+        Parser(RegexLexer(source), emitter).program()
+    else:
+        program = IRParser(RegexLexer(source)).program()
+        CSharpGenerator(emitter).program(optimize(program) if optimized else program)
+    with tempfile.TemporaryDirectory() as directory:
+        cs = os.path.join(directory, "program.cs")
+        exe = os.path.join(directory, "program.exe")
+        with open(cs, 'w') as outputFile:
+            emitter.writeTo(outputFile)
+        subprocess.run(csc.format(cs=cs, exe=exe), shell=True, check=True,
+                       stdout=subprocess.DEVNULL)
+        result = subprocess.run(run.format(exe=exe), shell=True, input=stdin,
+                                capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def color(code):
+    return f"\033[{code}m"
+
+
+def main():
+    argParser = argparse.ArgumentParser(
+        description="Compare the Python or C backend's output with the C# backend's")
+    argParser.add_argument("files", nargs="*",
+                           help="programs to check, defaults to example.pseudo and corpus/")
+    argParser.add_argument("--backend", choices=("py", "c", "cs"), default="py",
+                           help="the backend to check against the C# output")
+    argParser.add_argument("--regenerate", action="store_true",
+                           help="rebuild the expected .out files with csc")
+    argParser.add_argument("--csc", default="csc -out:{exe} {cs}",
+                           help="command that compiles {cs} to {exe}")
+    argParser.add_argument("--run", default="{exe}",
+                           help="command that runs {exe}")
+    args = argParser.parse_args()
+
+    files = args.files or ["example.pseudo"] + sorted(glob.glob("corpus/*.pseudo"))
+    failures = 0
+    for path in files:
+        base = os.path.splitext(path)[0]
+        source = readIfExists(path)
+        stdin = readIfExists(base + ".in")
+
+        expectedError = readIfExists(base + ".err").strip() or None
+        if args.regenerate and expectedError is None:
+            with open(base + ".out", 'w', newline='') as outputFile:
+                outputFile.write(runCSharp(source, stdin, args.csc, args.run))
+
+        expected = expectedError if expectedError is not None else readIfExists(base + ".out")
+        # (label, whether it's skipped if it can't be parsed, function)
+        if args.backend == "cs":
+            runs = [(f"{path} (default parser)", True,
+                     lambda: runCSharp(source, stdin, args.csc, args.run, default=True)),
+                    (f"{path} -O", False,
+                     lambda: runCSharp(source, stdin, args.csc, args.run, optimized=True))]
+        else:
+            run = runC if args.backend == "c" else runPython
+            runs = [(path, False, lambda: run(source, stdin, False)),
+                    (f"{path} -O", False, lambda: run(source, stdin, True))]
+        for label, skippable, function in runs:
+            try:
+                actual = function()
+            except CompileError as error:
+                if expectedError is not None:
+                    actual = f"{error.kind}: {error.message}"
+                elif skippable:
+                    # Most of the corpus uses more than the default parser knows.
+                    print(f"{color('93')}skip{color('0')} {label}: {error.message}")
+                    continue
+                else:
+                    raise
+            except subprocess.CalledProcessError as error:
+                actual = f"<{error.cmd} exited with {error.returncode}>"
+            if actual == expected:
+                print(f"{color('92')}pass{color('0')} {label}")
+            else:
+                failures += 1
+                print(f"{color('91')}FAIL{color('0')} {label}")
+                print(f"  expected: {expected!r}\n  actual:   {actual!r}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,677 @@
-# Emitter generates the code for different sections and outputs it.
+from ir import *
+from lex import TokenType
+import shutil
+import tempfile
+
+
+# Section collects the code for one part of the output as a list of chunks. Past
+# spillSize characters the chunks are moved to a temporary file, so memory stays
+# bounded however big the section gets.
+class Section:
+    def __init__(self, spillSize=None):
+        self.chunks = []
+        self.size = 0
+        self.spillSize = spillSize
+        self.spillFile = None
+
+    def append(self, code):
+        self.chunks.append(code)
+        self.size += len(code)
+        if self.spillSize is not None and self.size >= self.spillSize:
+            self.spill()
+
+    def spill(self):
+        if self.spillFile is None:
+            self.spillFile = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.spillFile.writelines(self.chunks)
+        self.chunks = []
+        self.size = 0
+
+    def writeTo(self, outputFile):
+        if self.spillFile is not None:
+            self.spillFile.seek(0)
+            shutil.copyfileobj(self.spillFile, outputFile)
+            self.spillFile.close()
+            self.spillFile = None
+        outputFile.writelines(self.chunks)
+        self.chunks = []
+        self.size = 0
+
+
+# Emitter generates the code for different sections and outputs it. The
+# runtime prelude (see RUNTIME_PRELUDE) is added to the Program class, with the
+# "Input: " prompt turned off when prompt is False.
 class Emitter:
-    def __init__(self, fullPath):
+    def __init__(self, fullPath, spillSize=None, prompt=True):
         self.fullPath = fullPath
-        self.header = ""
-        self.main = ""
-        self.methodCode = ""
+        self.prompt = prompt
+        self.header = Section()
+        self.main = Section(spillSize)
+        self.methodCode = Section(spillSize)
+        self.prelude = Section()    # classes added after the methods
         self.isMethod = False
 
     def emit(self, code):
         if (self.isMethod):
-            self.methodCode += code
+            self.methodCode.append(code)
         else:
-            self.main += code
+            self.main.append(code)
 
     def emitLine(self, code):
         self.emit(code + '\n')
 
     def headerLine(self, code):
-        self.header += code + '\n'
+        self.header.append(code + '\n')
+
+    # Writes the sections out in order, emptying them as it goes.
+    def writeTo(self, outputFile):
+        self.header.writeTo(outputFile)
+        self.main.writeTo(outputFile)
+        self.methodCode.writeTo(outputFile)
+        self.prelude.writeTo(outputFile)
+        outputFile.write(RUNTIME_PRELUDE.replace(
+            "Prompt = true", "Prompt = " + ("true" if self.prompt else "false")))
+        outputFile.write("\n}")
 
     def writeFile(self):
         with open(self.fullPath, 'w+') as outputFile:
-            outputFile.write(self.header + self.main +
-                             self.methodCode + "\n}")
+            self.writeTo(outputFile)
+
+
+# CSharpGenerator writes the C# for a program in intermediate representation
+# (see ir.py) through an Emitter, laid out the same way Parser does it.
+#
+# profile is the (path, source text) of the program to build it for --profile:
+# every statement is then preceded by a #line directive pointing back at the
+# pseudocode, so compiler errors and stack traces show pseudocode lines, and by
+# a call that counts it and times it (see PROFILE_PRELUDE).
+class CSharpGenerator:
+    def __init__(self, emitter, profile=None, builders=True):
+        self.emitter = emitter
+        self.profile = profile
+        self.profiledLines = set()
+        self.builders = builders    # lower strings built in loops, see StringBuilderLowering
+        self.count = 0              # for naming parallel loops' variables
+
+    def program(self, program):
+        if self.builders:
+            program = StringBuilderLowering().visit(program)
+        self.emitter.headerLine(
+            "using System;\nusing System.IO;\nusing System.Linq;\nusing System.Collections.Generic;\n")
+        self.emitter.headerLine(
+            "class Program\n{\n\tpublic static void Main(string[] args)\n\t{")
+        self.block(program.statements)
+        self.emitter.emitLine("\t}")
+        if self.profile is not None:
+            self.profilePrelude()
+
+    def block(self, statements):
+        for statement in statements:
+            if self.profile is not None and statement.line is not None and \
+                    not isinstance(statement, (Procedure, Function)):
+                self.profileLine(statement.line)
+            getattr(self, "statement" + type(statement).__name__)(statement)
+
+    def profileLine(self, line):
+        self.profiledLines.add(line)
+        path = self.profile[0].replace("\\", "\\\\").replace("\"", "\\\"")
+        self.emitter.emitLine(f"#line {line} \"{path}\"")
+        self.emitter.emitLine(f"_Profile.Line({line});")
+
+    # The source of each profiled line goes into the program for its report.
+    def profilePrelude(self):
+        sourceLines = self.profile[1].split('\n')
+        size = max(self.profiledLines, default=0) + 1
+        source = ", ".join(
+            '@"' + sourceLines[line - 1].strip().replace('"', '""') + '"'
+            if line in self.profiledLines else "null" for line in range(size))
+        self.emitter.prelude.append(PROFILE_PRELUDE.format(size=size, source=source))
+
+    def statementProcedure(self, node):
+        self.emitter.isMethod = True
+        self.emitter.emitLine(
+            f"public static void {node.name}({self.parameters(node.params)})\n\t{{")
+        self.block(node.body)
+        self.emitter.emitLine("\t}")
+        self.emitter.isMethod = False
+
+    def statementFunction(self, node):
+        self.emitter.isMethod = True
+        self.emitter.emitLine(
+            f"public static {self.dataType(node.returnType)} {node.name}({self.parameters(node.params)}) " + "{")
+        self.block(node.body)
+        self.emitter.emitLine("\t}")
+        self.emitter.isMethod = False
+
+    def statementReturn(self, node):
+        self.emitter.emitLine(f"return {self.expression(node.value)};")
+
+    def statementCallStatement(self, node):
+        self.emitter.emitLine(f"{self.expression(node.call)};")
+
+    def statementOutput(self, node):
+        values = node.values
+        for value in values[:-1]:
+            self.emitter.emitLine(f"_IO.Write({self.expression(value)});")
+        self.emitter.emitLine(f"_IO.WriteLine({self.expression(values[-1])});")
+
+    def statementIf(self, node):
+        keyword = "if"
+        for branch in node.branches:
+            self.emitter.emitLine(
+                f"{keyword} ({self.expression(branch.condition)}) " + "{")
+            self.block(branch.body)
+            keyword = "} else if"
+        if node.elseBody is not None:
+            self.emitter.emitLine("} else {")
+            self.block(node.elseBody)
+        self.emitter.emitLine("}")
+
+    def statementCase(self, node):
+        self.emitter.emitLine(f"switch ({self.expression(node.subject)}) " + "{")
+        for branch in node.branches:
+            self.emitter.emitLine(f"case {self.expression(branch.condition)}:")
+            self.block(branch.body)
+            self.emitter.emitLine("break;")
+        if node.otherwise is not None:
+            self.emitter.emitLine("default:")
+            self.block(node.otherwise)
+            self.emitter.emitLine("break;")
+        self.emitter.emitLine("}")
+
+    def statementWhile(self, node):
+        self.emitter.emitLine(f"while ({self.expression(node.condition)}) " + "{")
+        self.block(node.body)
+        self.emitter.emitLine("}")
+
+    def statementRepeat(self, node):
+        self.emitter.emitLine("do {")
+        self.block(node.body)
+        condition = self.expression(Unary("NOT", node.condition))
+        self.emitter.emitLine(f"}} while ({condition});")
+
+    def statementFor(self, node):
+        var = node.var
+        init = f"int {var}" if node.declare else var
+        self.emitter.emitLine(
+            f"for ({init} = {self.expression(node.start)}; {var} < {self.expression(node.end)}; {var}++) " + "{")
+        self.block(node.body)
+        self.emitter.emitLine("}")
+
+    # The iterations go to the thread pool when there are at least threshold of
+    # them. The counter is renamed, since a lambda's parameter can't share its
+    # name with a variable around it. With a reduction each thread adds up (or
+    # keeps the smallest or largest of) its own iterations in a variable of its
+    # own, and those are combined into the reduction's under a lock.
+    def statementParallelFor(self, node):
+        loop = node.loop
+        self.count += 1
+        low, high, counter = f"_low{self.count}", f"_high{self.count}", f"_i{self.count}"
+        self.emitter.emitLine(f"int {low} = {self.expression(loop.start)}, "
+                              f"{high} = {self.expression(loop.end)};")
+        self.emitter.emitLine(f"if ((long){high} - {low} >= {node.threshold}) " + "{")
+        if node.reduction is None:
+            self.emitter.emitLine(
+                f"System.Threading.Tasks.Parallel.For({low}, {high}, {counter} => " + "{")
+            self.block(renamed(loop.body, {loop.var: counter}))
+            self.emitter.emitLine("});")
+        else:
+            op, name = node.reduction
+            local, lock = f"_local{self.count}", f"_lock{self.count}"
+            self.emitter.emitLine(f"var {lock} = new object();")
+            self.emitter.emitLine(
+                f"System.Threading.Tasks.Parallel.For({low}, {high}, () => {'0' if op == '+' else name}, "
+                f"({counter}, _state, {local}) => " + "{")
+            self.block(renamed(loop.body, {loop.var: counter, name: local}))
+            self.emitter.emitLine(f"return {local};")
+            if op == "+":
+                combine = f"{name} += {local};"
+            else:
+                combine = f"if ({local} {'>' if op == 'max' else '<'} {name}) {name} = {local};"
+            self.emitter.emitLine(f"}}, {local} => {{ lock ({lock}) {{ {combine} }} }});")
+        self.emitter.emitLine("} else {")
+        self.emitter.emitLine(f"for (int {counter} = {low}; {counter} < {high}; {counter}++) " + "{")
+        self.block(renamed(loop.body, {loop.var: counter}))
+        self.emitter.emitLine("}")
+        self.emitter.emitLine("}")
+        # The counter's value after the loop, for code that reads it.
+        if not loop.declare:
+            self.emitter.emitLine(f"{loop.var} = Math.Max({low}, {high});")
+
+    def statementDeclare(self, node):
+        if isinstance(node.dataType, ArrayType):
+            allocation = self.newArray(node.dataType)
+            self.emitter.emitLine(f"{self.dataType(node.dataType)} " + ", ".join(
+                f"{name} = {allocation}" for name in node.names) + ";")
+            return
+        self.emitter.emitLine(
+            f"{self.dataType(node.dataType)} {','.join(node.names)};")
+
+    def statementConstant(self, node):
+        value = self.expression(node.value)
+        if node.dataType == "REAL" and isinstance(node.value, Literal):
+            value += "f"
+        self.emitter.emitLine(
+            f"const {self.dataType(node.dataType)} {node.name} = {value};")
+
+    def statementAssign(self, node):
+        self.emitter.emitLine(
+            f"{self.expression(node.target)} = {self.expression(node.value)};")
+
+    def statementLet(self, node):
+        self.emitter.emitLine(f"var {node.name} = {self.expression(node.value)};")
+
+    def statementNewBuilder(self, node):
+        self.emitter.emitLine(f"var {node.builder} = new System.Text.StringBuilder({node.name});")
+
+    def statementAppend(self, node):
+        appends = "".join(f".Append({self.expression(value)})" for value in node.values)
+        self.emitter.emitLine(f"{node.builder}{appends};")
+
+    def statementInput(self, node):
+        if node.declare:
+            self.emitter.emitLine(f"string {node.name};")
+        self.emitter.emitLine(f"{node.name} = {readInput(node.dataType)};")
+
+    def parameters(self, params):
+        return ", ".join(f"{self.dataType(dataType)} {name}" for name, dataType in params)
+
+    # An array with more than one dimension is a rectangular C# array, which
+    # is a single block of memory.
+    def dataType(self, dataType):
+        if isinstance(dataType, ArrayType):
+            return f"{self.dataType(dataType.elementType)}[{',' * (len(dataType.bounds) - 1)}]"
+        return CS_TYPES[dataType]
+
+    def newArray(self, dataType):
+        extents = ", ".join(self.expression(extent) for extent in dataType.extents())
+        return f"new {self.dataType(dataType.elementType)}[{extents}]"
+
+    # Returns the C# for an expression, in brackets if it binds looser than
+    # the surrounding precedence.
+    def expression(self, node, precedence=0):
+        if isinstance(node, Binary):
+            nodePrecedence = PRECEDENCE[node.op]
+            text = (f"{self.expression(node.left, nodePrecedence)} "
+                    f"{CS_OPERATORS.get(node.op, node.op)} "
+                    f"{self.expression(node.right, nodePrecedence + 1)}")
+        elif isinstance(node, Unary):
+            nodePrecedence = UNARY_PRECEDENCE
+            # Keep "- -x" from turning into the "--" operator.
+            operand = self.expression(node.operand, UNARY_PRECEDENCE + 1)
+            text = CS_OPERATORS.get(node.op, node.op) + operand
+        elif isinstance(node, Literal):
+            text = self.literal(node)
+            nodePrecedence = UNARY_PRECEDENCE if text.startswith('-') else PRIMARY_PRECEDENCE
+        elif isinstance(node, Index):
+            indices = ", ".join(self.expression(index) for index in node.indices)
+            text = f"{node.name}[{indices}]"
+            nodePrecedence = PRIMARY_PRECEDENCE
+        elif isinstance(node, Call):
+            args = ", ".join(self.expression(arg) for arg in node.args)
+            text = f"{node.name}({args})"
+            nodePrecedence = PRIMARY_PRECEDENCE
+        elif isinstance(node, BuilderText):
+            text = f"{node.builder}.ToString()"
+            nodePrecedence = PRIMARY_PRECEDENCE
+        else:
+            text = node.name
+            nodePrecedence = PRIMARY_PRECEDENCE
+
+        if nodePrecedence < precedence:
+            return f"({text})"
+        return text
+
+    def literal(self, node):
+        if node.kind == TokenType.STRING:
+            return f"\"{node.value}\""
+        elif node.kind == TokenType.CHAR:
+            return f"'{node.value}'"
+        elif node.kind == TokenType.NUMBER:
+            return repr(node.value)
+        return "true" if node.value else "false"
+
+
+# Building a string up with s <- s & x in a loop copies everything appended so
+# far on every trip round it. StringBuilderLowering finds the STRING variables
+# that a loop only ever appends to and gives each one a StringBuilder for the
+# length of the loop: the appends go to the builder, anything else in the loop
+# that reads the variable reads the builder's string, and the variable gets the
+# whole string back after the loop. The outermost loop a variable qualifies in
+# is lowered, so inner loops share its builder.
+class StringBuilderLowering(Transformer):
+    def __init__(self):
+        self.count = 0
+        self.strings = set()    # STRING variables of the routine being lowered
+        self.lowered = set()    # variables an enclosing loop already lowered
+        self.usages = {}        # loop -> (appended, excluded), see loopUsage
+
+    # Code where no loop appends to a STRING has nothing to lower, so it isn't
+    # gone through at all.
+    def visitProgram(self, node):
+        main = [statement for statement in node.statements
+                if not isinstance(statement, (Procedure, Function))]
+        self.strings = loweredStrings(main)
+        if self.strings:
+            return self.genericVisit(node)
+        node.statements = [self.visit(statement) if isinstance(statement, (Procedure, Function))
+                           else statement for statement in node.statements]
+        return node
+
+    def visitProcedure(self, node):
+        strings = self.strings
+        self.strings = loweredStrings(node.body, node.params)
+        if self.strings:
+            node.body = self.visitList(node.body)
+        self.strings = strings
+        return node
+
+    visitFunction = visitProcedure
+
+    # Loops are only found in the bodies of other statements, so expressions
+    # and simple statements are left alone.
+    def genericVisit(self, node):
+        if isinstance(node, COMPOUND_STATEMENTS):
+            return super().genericVisit(node)
+        return node
+
+    def visitWhile(self, node):
+        appended, excluded = self.loopUsage(node)
+        if not appended & self.strings:
+            # Then neither do the loops inside it.
+            return node
+        names = (appended - excluded - self.lowered) & self.strings
+        if names:
+            # Indexing a string reads it by name, not through a Name.
+            names -= {child.name for child in walk(node) if isinstance(child, Index)}
+        if not names:
+            return self.genericVisit(node)
+
+        names = sorted(names)
+        builders = {}
+        for name in names:
+            self.count += 1
+            builders[name] = f"_sb{self.count}"
+        lowered = self.lowered
+        self.lowered = lowered | set(names)
+        node = self.genericVisit(BuilderReplacer(builders).visit(node))
+        self.lowered = lowered
+        return ([NewBuilder(builders[name], name) for name in names] + [node] +
+                [Assign(Name(name), BuilderText(builders[name])) for name in names])
+
+    visitRepeat = visitWhile
+    visitFor = visitWhile
+
+    # Outside itself a parallel loop only changes arrays and an INTEGER or
+    # REAL, so it's left alone.
+    def visitParallelFor(self, node):
+        return node
+
+    # The variables the statements of loop append to, and the ones they use in
+    # a way a builder can't stand in for. A loop inside it is looked at once and
+    # remembered, so nested loops aren't gone through again for every loop
+    # around them.
+    def loopUsage(self, loop):
+        usage = self.usages.get(loop)
+        if usage is not None:
+            return usage
+        appended = set()
+        excluded = {loop.var} if isinstance(loop, For) else set()
+        for child in statementsIn(loop.body, skip=(While, Repeat, For)):
+            if isinstance(child, (While, Repeat, For)):
+                childAppended, childExcluded = self.loopUsage(child)
+                appended |= childAppended
+                excluded |= childExcluded
+            elif isinstance(child, Assign) and isinstance(child.target, Name):
+                name = child.target.name
+                if appendedValues(child, name) is None:
+                    excluded.add(name)
+                else:
+                    appended.add(name)
+            elif isinstance(child, Declare):
+                excluded.update(child.names)
+            elif isinstance(child, (Input, Let)):
+                excluded.add(child.name)
+        usage = self.usages[loop] = (appended, excluded)
+        return usage
+
+
+# Swaps the lowered variables in a loop for their builders, see
+# StringBuilderLowering.
+class BuilderReplacer(Transformer):
+    def __init__(self, builders):
+        self.builders = builders    # variable -> builder
+
+    def visitAssign(self, node):
+        builder = self.builders.get(node.target.name) if isinstance(node.target, Name) else None
+        if builder is None:
+            return self.genericVisit(node)
+        append = Append(builder, self.visitList(appendedValues(node, node.target.name)))
+        append.line = node.line
+        return append
+
+    def visitName(self, node):
+        builder = self.builders.get(node.name)
+        return node if builder is None else BuilderText(builder)
+
+
+# The values an assignment adds to the end of name, in order, if it's
+# name <- name & a & b (or +), otherwise None.
+def appendedValues(node, name):
+    values = []
+    value = node.value
+    while isinstance(value, Binary) and value.op in ("+", "&"):
+        values.append(value.right)
+        value = value.left
+    if not values or not isinstance(value, Name) or value.name != name:
+        return None
+    values.reverse()
+    return values
+
+
+# Variables declared as STRING in statements or read in by INPUT there, and
+# the STRING parameters, if a loop in statements appends to one of them, and
+# otherwise none. An outermost loop's body holds every loop inside it, so the
+# statements are gone through once, outside the loops and then in them.
+def loweredStrings(statements, params=()):
+    names = {name for name, dataType in params if dataType == "STRING"}
+    appended = set()
+    loops = []
+    for node in statementsIn(statements, skip=(While, Repeat, For)):
+        if isinstance(node, (While, Repeat, For)):
+            loops.append(node)
+        else:
+            addString(node, names)
+    for loop in loops:
+        for node in statementsIn(loop.body):
+            if isinstance(node, Assign) and isinstance(node.target, Name):
+                if appendedValues(node, node.target.name) is not None:
+                    appended.add(node.target.name)
+            else:
+                addString(node, names)
+    return names if names & appended else set()
+
+
+def addString(node, names):
+    if isinstance(node, Declare) and node.dataType == "STRING":
+        names.update(node.names)
+    elif isinstance(node, Input) and node.declare:
+        names.add(node.name)
+
+
+COMPOUND_STATEMENTS = (Program, Procedure, Function, If, Branch, Case, While, Repeat, For)
+
+
+# Yields every statement in statements and in the bodies of those, but not the
+# expressions in them. The bodies of statements of the types in skip are left
+# out, though the statements themselves aren't.
+def statementsIn(statements, skip=()):
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, COMPOUND_STATEMENTS) and not isinstance(node, skip):
+            for name in node.fields:
+                value = getattr(node, name)
+                # Lists of statements or Branches, not a routine's parameters.
+                if isinstance(value, list) and value and isinstance(value[0], Node):
+                    stack.extend(value)
+
+
+CS_TYPES = {"INTEGER": "int", "REAL": "float", "STRING": "string",
+            "BOOLEAN": "bool", "CHAR": "char", "NUMBER": "float"}
+
+# C# that reads a line of input as a value of dataType. Strings, and whatever
+# can't be parsed from a line, are read as they are.
+def readInput(dataType):
+    if dataType in INPUT_READERS:
+        return INPUT_READERS[dataType]
+    return "_IO.ReadLine()"
+
+
+INPUT_READERS = {"INTEGER": "_IO.ReadInt()", "REAL": "_IO.ReadFloat()", "NUMBER": "_IO.ReadFloat()",
+                 "BOOLEAN": "bool.Parse(_IO.ReadLine())", "CHAR": "char.Parse(_IO.ReadLine())"}
+
+# Counts and times statements for --profile. Line is called as each statement
+# starts, and charges the time since the previous call to the statement that
+# was running then, so a line's time is its own and not that of the lines it
+# calls into. The report goes to standard error when the program exits.
+PROFILE_PRELUDE = """
+#line default
+\tstatic class _Profile
+\t{{
+\t\tstatic readonly long[] hits = new long[{size}];
+\t\tstatic readonly long[] ticks = new long[{size}];
+\t\tstatic readonly string[] source = {{ {source} }};
+\t\tstatic int current;
+\t\tstatic long last = System.Diagnostics.Stopwatch.GetTimestamp();
+
+\t\tstatic _Profile()
+\t\t{{
+\t\t\tAppDomain.CurrentDomain.ProcessExit += (sender, e) => Report();
+\t\t\tAppDomain.CurrentDomain.UnhandledException += (sender, e) => Report();
+\t\t}}
+
+\t\tpublic static void Line(int line)
+\t\t{{
+\t\t\tlong now = System.Diagnostics.Stopwatch.GetTimestamp();
+\t\t\tticks[current] += now - last;
+\t\t\thits[line]++;
+\t\t\tcurrent = line;
+\t\t\tlast = now;
+\t\t}}
+
+\t\tstatic void Report()
+\t\t{{
+\t\t\tticks[current] += System.Diagnostics.Stopwatch.GetTimestamp() - last;
+\t\t\tlast = System.Diagnostics.Stopwatch.GetTimestamp();
+\t\t\tdouble total = 0;
+\t\t\tforeach (long lineTicks in ticks)
+\t\t\t\ttotal += lineTicks;
+\t\t\tConsole.Error.WriteLine("\\nLine         Hits    Time (ms)      %  Source");
+\t\t\tfor (int line = 1; line < source.Length; line++)
+\t\t\t{{
+\t\t\t\tif (source[line] == null)
+\t\t\t\t\tcontinue;
+\t\t\t\tdouble ms = ticks[line] * 1000.0 / System.Diagnostics.Stopwatch.Frequency;
+\t\t\t\tdouble percent = total > 0 ? ticks[line] * 100.0 / total : 0;
+\t\t\t\tConsole.Error.WriteLine($"{{line,4}} {{hits[line],12}} {{ms,12:F3}} {{percent,6:F1}}  {{source[line]}}");
+\t\t\t}}
+\t\t}}
+\t}}"""
+
+# Generated programs do their I/O through this class instead of Console. Output
+# goes through one buffered writer that is flushed when the program exits (or
+# before it waits for input), and each value is written with the overload for
+# its type rather than through an interpolated string. Lines of numbers are
+# read into a reused buffer. Only what the .NET Framework has is used, so the
+# csc that comes with Visual Studio can build it. The identifier can't clash
+# with one from pseudocode, which has no underscores.
+RUNTIME_PRELUDE = """
+	static class _IO
+	{
+		public static bool Prompt = true;
+		static readonly StreamWriter output = new StreamWriter(Console.OpenStandardOutput(), new System.Text.UTF8Encoding(false), 1 << 16);
+		static readonly StreamReader input = new StreamReader(Console.OpenStandardInput(), new System.Text.UTF8Encoding(false), false, 1 << 16);
+		static char[] line = new char[256];
+
+		static _IO()
+		{
+			AppDomain.CurrentDomain.ProcessExit += (sender, e) => output.Flush();
+			AppDomain.CurrentDomain.UnhandledException += (sender, e) => output.Flush();
+		}
+
+		public static void Write(string value) { output.Write(value); }
+		public static void Write(int value) { output.Write(value); }
+		public static void Write(float value) { output.Write(value); }
+		public static void Write(double value) { output.Write(value); }
+		public static void Write(bool value) { output.Write(value); }
+		public static void Write(char value) { output.Write(value); }
+		public static void Write(object value) { output.Write(value); }
+		public static void WriteLine(string value) { output.WriteLine(value); }
+		public static void WriteLine(int value) { output.WriteLine(value); }
+		public static void WriteLine(float value) { output.WriteLine(value); }
+		public static void WriteLine(double value) { output.WriteLine(value); }
+		public static void WriteLine(bool value) { output.WriteLine(value); }
+		public static void WriteLine(char value) { output.WriteLine(value); }
+		public static void WriteLine(object value) { output.WriteLine(value); }
+
+		static void ShowPrompt()
+		{
+			if (Prompt)
+			{
+				output.Write("Input: ");
+				output.Flush();
+			}
+		}
+
+		public static string ReadLine()
+		{
+			ShowPrompt();
+			return input.ReadLine();
+		}
+
+		// Reads the next line into line and returns its length, or -1 at the end
+		// of the input. Line ends are the same as StreamReader.ReadLine's.
+		static int ReadIntoLine()
+		{
+			ShowPrompt();
+			int length = 0;
+			int c;
+			while ((c = input.Read()) != -1 && c != '\\n')
+			{
+				if (c == '\\r')
+				{
+					if (input.Peek() == '\\n')
+						input.Read();
+					break;
+				}
+				if (length == line.Length)
+					Array.Resize(ref line, length * 2);
+				line[length++] = (char)c;
+			}
+			return c == -1 && length == 0 ? -1 : length;
+		}
+
+		public static int ReadInt()
+		{
+			int length = ReadIntoLine();
+			return length < 0 ? int.Parse((string)null) : int.Parse(new string(line, 0, length));
+		}
+
+		public static float ReadFloat()
+		{
+			int length = ReadIntoLine();
+			return length < 0 ? float.Parse((string)null) : float.Parse(new string(line, 0, length));
+		}
+	}"""
+
+
+CS_OPERATORS = {"&": "+", "=": "==", "<>": "!=",
+                "AND": "&&", "OR": "||", "NOT": "!"}
+
+# C# operator precedence, higher binds tighter.
+PRECEDENCE = {"OR": 1, "AND": 2, "=": 3, "<>": 3, "<": 4, "<=": 4, ">": 4, ">=": 4,
+              "+": 5, "-": 5, "&": 5, "*": 6, "/": 6}
+UNARY_PRECEDENCE = 7
+PRIMARY_PRECEDENCE = 8
@@ -0,0 +1,162 @@
+import argparse
+import random
+import sys
+
+# Generates valid pseudocode of any size for benchmarking the compiler, run
+# with: python gencorpus.py --lines 100000 [--shape mixed] [-o file.pseudo]
+#
+# Each shape stresses a different part of the compiler:
+#   nested     IF and WHILE blocks nested --depth deep
+#   functions  many small FUNCTIONs, each called once
+#   case       long CASE blocks over INTEGER and CHAR
+#   strings    long chains of string concatenation
+#   mixed      all of the above, picked at random
+# Programs always terminate, so they can be run as well as compiled.
+
+SHAPES = ("nested", "functions", "case", "strings", "mixed")
+VARIABLES = ("a", "b", "c", "d")
+LETTERS = "abcdefghijklmnopqrstuvwxyz+-*/"
+
+
+class Generator:
+    def __init__(self, seed=0, depth=8, width=16):
+        self.random = random.Random(seed)
+        self.depth = depth      # how deep nested shapes go
+        self.width = width      # labels in a CASE, pieces in a concatenation
+        self.lines = []
+        self.functions = 0
+
+    def emit(self, indent, line):
+        self.lines.append("   " * indent + line)
+
+    def generate(self, lines, shape="mixed"):
+        self.lines = []
+        self.functions = 0
+        self.emit(0, f"// Generated by gencorpus.py: {shape}, {lines} lines")
+        self.emit(0, f"DECLARE {', '.join(VARIABLES)} : INTEGER")
+        self.emit(0, f"DECLARE {', '.join(f'w{level}' for level in range(self.depth))} : INTEGER")
+        self.emit(0, "DECLARE s : STRING")
+        self.emit(0, "DECLARE letter : CHAR")
+        for name in VARIABLES:
+            self.emit(0, f"{name} <- {self.random.randint(1, 100)}")
+        self.emit(0, "letter <- 'a'")
+
+        blocks = {"nested": self.nested, "functions": self.function,
+                  "case": self.case, "strings": self.strings}
+        while len(self.lines) < lines:
+            if shape == "mixed":
+                self.random.choice(list(blocks.values()))()
+            else:
+                blocks[shape]()
+        return "\n".join(self.lines) + "\n"
+
+    def operand(self):
+        if self.random.random() < 0.3:
+            return str(self.random.randint(1, 9))
+        return self.random.choice(VARIABLES)
+
+    def arithmetic(self):
+        terms = [self.operand() for _ in range(self.random.randint(2, 4))]
+        expression = terms[0]
+        for term in terms[1:]:
+            expression += f" {self.random.choice('+-*')} {term}"
+        return expression
+
+    # Keeps the variables small, so they don't overflow INTEGER.
+    def assignment(self, indent):
+        name = self.random.choice(VARIABLES)
+        self.emit(indent, f"{name} <- {self.arithmetic()}")
+        self.emit(indent, f"IF {name} > 100 OR {name} < -100 THEN")
+        self.emit(indent + 1, f"{name} <- {self.random.randint(1, 100)}")
+        self.emit(indent, "ENDIF")
+
+    # Opens depth blocks, then closes them innermost first. It doesn't recurse,
+    # so depth can be more than Python's recursion limit.
+    def nested(self):
+        blocks = []
+        for level in range(self.depth):
+            if self.random.random() < 0.5:
+                self.emit(level, f"IF {self.operand()} < {self.operand()} THEN")
+                blocks.append("IF")
+            else:
+                # Each WHILE runs once, so deep nesting stays cheap to run.
+                self.emit(level, f"w{level} <- 0")
+                self.emit(level, f"WHILE w{level} < 1 DO")
+                blocks.append("WHILE")
+        self.assignment(self.depth)
+        for level in reversed(range(self.depth)):
+            if blocks[level] == "IF":
+                self.emit(level, "ELSE")
+                self.assignment(level + 1)
+                self.emit(level, "ENDIF")
+            else:
+                self.emit(level + 1, f"w{level} <- w{level} + 1")
+                self.emit(level, "ENDWHILE")
+        self.emit(0, f"OUTPUT {self.random.choice(VARIABLES)}")
+
+    def function(self):
+        self.functions += 1
+        name = f"F{self.functions}"
+        self.emit(0, f"FUNCTION {name}(x : INTEGER, y : INTEGER) RETURNS INTEGER")
+        self.emit(1, "DECLARE t : INTEGER")
+        self.emit(1, f"t <- x * {self.random.randint(2, 9)} + y")
+        self.emit(1, "IF t > 1000 THEN")
+        self.emit(2, "t <- t - 1000")
+        self.emit(1, "ENDIF")
+        self.emit(1, "RETURN t")
+        self.emit(0, "ENDFUNCTION")
+        target = self.random.choice(VARIABLES)
+        self.emit(0, f"{target} <- {name}({self.operand()}, {self.operand()}) - 500")
+        self.emit(0, f"OUTPUT {target}")
+
+    def case(self):
+        if self.random.random() < 0.5:
+            self.emit(0, f"CASE OF {self.random.choice(VARIABLES)}")
+            labels = self.random.sample(range(1000), self.width)
+            for label in labels:
+                self.emit(1, f"{label} : OUTPUT \"case {label}\"")
+        else:
+            self.emit(0, "letter <- " + repr(self.random.choice(LETTERS)))
+            self.emit(0, "CASE OF letter")
+            for label in self.random.sample(LETTERS, min(self.width, len(LETTERS))):
+                self.emit(1, f"'{label}' : OUTPUT \"letter {label}\"")
+        self.emit(1, "OTHERWISE OUTPUT \"other\"")
+        self.emit(0, "ENDCASE")
+
+    def strings(self):
+        self.emit(0, "s <- \"\"")
+        for _ in range(self.random.randint(1, 4)):
+            pieces = ["s"]
+            for _ in range(self.width):
+                if self.random.random() < 0.7:
+                    word = "".join(self.random.choice(LETTERS[:26]) for _ in range(5))
+                    pieces.append(f"\"{word}\"")
+                else:
+                    pieces.append(self.random.choice(VARIABLES))
+            self.emit(0, "s <- " + " && ".join(pieces))
+        self.emit(0, "OUTPUT s")
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Generate pseudocode for benchmarking")
+    argParser.add_argument("--lines", type=int, default=1000,
+                           help="roughly how many lines to generate")
+    argParser.add_argument("--shape", choices=SHAPES, default="mixed")
+    argParser.add_argument("--depth", type=int, default=8,
+                           help="how deep IF and WHILE blocks nest")
+    argParser.add_argument("--width", type=int, default=16,
+                           help="labels per CASE and pieces per concatenation")
+    argParser.add_argument("--seed", type=int, default=0)
+    argParser.add_argument("-o", "--output", help="file to write (default standard output)")
+    args = argParser.parse_args()
+
+    source = Generator(args.seed, args.depth, args.width).generate(args.lines, args.shape)
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            outputFile.write(source)
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == "__main__":
+    main()
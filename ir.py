@@ -0,0 +1,230 @@
+from lex import TokenType
+import copy
+
+# Intermediate representation of a program. IRParser in parse.py builds it, the
+# passes in optimize.py rewrite it and the generators turn it into code.
+
+
+class Node:
+    fields = ()
+    line = None     # source line of a statement, for --profile
+
+    def __init__(self, *args):
+        for name, value in zip(self.fields, args):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        values = ", ".join(repr(getattr(self, name)) for name in self.fields)
+        return f"{type(self).__name__}({values})"
+
+
+# Expressions. Operators are kept as written in pseudocode: + - * / & = <> < <=
+# > >= AND OR NOT, it's up to each generator to translate them.
+class Literal(Node):
+    fields = ("value", "kind")
+
+
+class Name(Node):
+    fields = ("name",)
+
+
+class Index(Node):
+    fields = ("name", "indices")
+
+
+class Call(Node):
+    fields = ("name", "args")
+
+
+class Unary(Node):
+    fields = ("op", "operand")
+
+
+class Binary(Node):
+    fields = ("op", "left", "right")
+
+
+# Statements.
+class Program(Node):
+    fields = ("statements",)
+
+
+# bounds has a (lower, upper) pair for each dimension: the lower bound is an
+# int, known when compiling, the upper one an expression. An Index's indices
+# count from 0, the lower bounds are already taken off them.
+class ArrayType(Node):
+    fields = ("bounds", "elementType")
+
+    # The number of elements along each dimension, as expressions.
+    def extents(self):
+        return [addOffset(upper, 1 - lower) for lower, upper in self.bounds]
+
+
+class Declare(Node):
+    fields = ("names", "dataType")
+
+
+class Constant(Node):
+    fields = ("name", "dataType", "value")
+
+
+class Assign(Node):
+    fields = ("target", "value")
+
+
+# Declares a compiler generated temporary and assigns to it.
+class Let(Node):
+    fields = ("name", "value")
+
+
+# dataType is the declared type of the variable read into.
+class Input(Node):
+    fields = ("name", "declare", "dataType")
+
+
+class Output(Node):
+    fields = ("values",)
+
+
+class Branch(Node):
+    fields = ("condition", "body")
+
+
+class If(Node):
+    fields = ("branches", "elseBody")
+
+
+class Case(Node):
+    fields = ("subject", "branches", "otherwise")
+
+
+class While(Node):
+    fields = ("condition", "body")
+
+
+class Repeat(Node):
+    fields = ("body", "condition")
+
+
+class For(Node):
+    fields = ("var", "start", "end", "body", "declare")
+
+
+class Procedure(Node):
+    fields = ("name", "params", "body")
+
+
+class Function(Node):
+    fields = ("name", "params", "returnType", "body")
+
+
+class Return(Node):
+    fields = ("value",)
+
+
+class CallStatement(Node):
+    fields = ("call",)
+
+
+# A FOR loop whose iterations can run at the same time, see ParallelLoops in
+# optimize.py. It runs in parallel when it has at least threshold iterations.
+# reduction is None, or (op, name) for the one variable outside the loop the
+# iterations change: "+" adds to it, "min" and "max" keep the smallest or
+# largest value in it. Generators that can't run loops in parallel just run
+# loop.
+class ParallelFor(Node):
+    fields = ("loop", "reduction", "threshold")
+
+
+# A STRING variable built up in a loop with a StringBuilder. Only the C#
+# generator lowers to these, see StringBuilderLowering in emit.py. NewBuilder
+# starts builder off with the variable's value, Append adds values to the end
+# of it and BuilderText is the string it holds so far.
+class NewBuilder(Node):
+    fields = ("builder", "name")
+
+
+class Append(Node):
+    fields = ("builder", "values")
+
+
+class BuilderText(Node):
+    fields = ("builder",)
+
+
+# Transformer walks the tree and rebuilds it from whatever the visit<NodeName>
+# methods return. A statement visitor can return a list to splice several
+# statements in its place, or None to remove it.
+class Transformer:
+    def visit(self, node):
+        method = getattr(self, "visit" + type(node).__name__, self.genericVisit)
+        return method(node)
+
+    def genericVisit(self, node):
+        for name in node.fields:
+            setattr(node, name, self.visitValue(getattr(node, name)))
+        return node
+
+    def visitValue(self, value):
+        if isinstance(value, Node):
+            return self.visit(value)
+        if isinstance(value, list):
+            return self.visitList(value)
+        return value
+
+    def visitList(self, values):
+        result = []
+        for value in values:
+            value = self.visitValue(value)
+            if isinstance(value, list):
+                result.extend(value)
+            elif value is not None:
+                result.append(value)
+        return result
+
+
+# Yields every node in the tree below and including node.
+def walk(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        if not isinstance(node, Node):
+            continue
+        yield node
+        for name in reversed(node.fields):
+            stack.append(getattr(node, name))
+
+
+# A copy of statements with the variables in names renamed (old -> new).
+def renamed(statements, names):
+    return Renamer(names).visitList(copy.deepcopy(statements))
+
+
+class Renamer(Transformer):
+    def __init__(self, names):
+        self.names = names
+
+    def visitName(self, node):
+        node.name = self.names.get(node.name, node.name)
+        return node
+
+
+# Returns node plus offset, with the offset folded into a whole number the
+# expression already adds or takes away, so a[i + 1] of an ARRAY[1:n] is just
+# a[i] once it counts from 0.
+def addOffset(node, offset):
+    if isinstance(node, Literal) and type(node.value) is int:
+        return Literal(node.value + offset, node.kind)
+    if isinstance(node, Unary) and node.op == "-" and \
+            isinstance(node.operand, Literal) and type(node.operand.value) is int:
+        return Literal(offset - node.operand.value, node.operand.kind)
+    if isinstance(node, Binary) and node.op in ("+", "-") and \
+            isinstance(node.right, Literal) and type(node.right.value) is int:
+        constant = node.right.value if node.op == "+" else -node.right.value
+        return addOffset(node.left, constant + offset)
+    if offset == 0:
+        return node
+    return Binary("+" if offset > 0 else "-", node, Literal(abs(offset), TokenType.NUMBER))
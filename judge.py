@@ -0,0 +1,197 @@
+from lex import *
+from pyemit import PythonGenerator
+from compiler import parseIR, generateCode
+import pyruntime
+import concurrent.futures
+import glob
+import marshal
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Judge mode compiles a program once and runs it against a directory of test
+# cases, several at a time. A case is <name>.out, the output expected, with
+# <name>.in as its standard input if there is one (the same layout as corpus/).
+# Each run is a process of its own with a time and a memory limit, and gets one
+# of the verdicts below. A run that goes over the memory limit fails to
+# allocate, and is told apart from other crashes by what it prints. Output is
+# compared line by line, ignoring whitespace at the ends of lines and blank
+# lines at the end.
+
+PASS = "pass"
+WRONG_ANSWER = "wrong answer"
+TIME_LIMIT = "time limit exceeded"
+MEMORY_LIMIT = "memory limit exceeded"
+RUNTIME_ERROR = "runtime error"
+
+# What each runtime prints when an allocation fails.
+OUT_OF_MEMORY = ("OutOfMemoryException", "Out of memory.", "MemoryError")
+
+
+class TestCase:
+    def __init__(self, name, input, expected):
+        self.name = name
+        self.input = input          # path of the standard input, or None
+        self.expected = expected    # path of the expected output
+
+
+class CaseResult:
+    def __init__(self, case, verdict, elapsed, detail=""):
+        self.case = case
+        self.verdict = verdict
+        self.elapsed = elapsed      # wall clock seconds
+        self.detail = detail
+
+
+def findCases(directory):
+    cases = []
+    for expected in sorted(glob.glob(os.path.join(glob.escape(directory), "*.out"))):
+        base = os.path.splitext(expected)[0]
+        input = f"{base}.in" if os.path.exists(f"{base}.in") else None
+        cases.append(TestCase(os.path.basename(base), input, expected))
+    return cases
+
+
+# Builds the program in directory and returns the command that runs it. Input
+# prompts are left out, since nobody is there to read them.
+def buildProgram(source, path, backend, optimized, directory):
+    if backend == "py":
+        code = pyruntime.compileModule(PythonGenerator().program(parseIR(source, optimized)), path)
+        program = os.path.join(directory, "program.pyc")
+        with open(program, 'wb') as codeFile:
+            marshal.dump(code, codeFile)
+        return [sys.executable, pyruntime.__file__, program]
+
+    program = os.path.join(directory, f"program.{backend}")
+    with open(program, 'w') as outputFile:
+        outputFile.write(generateCode(source, backend, optimized, prompt=False))
+    if backend == "c":
+        exe = os.path.join(directory, "program")
+        build = subprocess.run([os.environ.get("CC", "cc"), "-O2", "-o", exe, program, "-lm"],
+                               capture_output=True, text=True)
+    else:
+        exe = os.path.join(directory, "program.exe")
+        build = subprocess.run(["csc", f"-out:{exe}", program], capture_output=True, text=True)
+    if build.returncode != 0:
+        language = "C" if backend == "c" else "C#"
+        raise CompileError(f"{language} Compile Error", (build.stdout + build.stderr).strip())
+    return [exe]
+
+
+# The .NET runtime reserves far more address space than it uses, so C#
+# programs get a limit on their heap instead of on their address space. Only
+# .NET Core reads DOTNET_GCHeapHardLimit: under the .NET Framework or Mono a C#
+# program's memory isn't limited.
+class Limits:
+    def __init__(self, backend, seconds, memory):
+        self.seconds = seconds
+        self.env = None
+        self.addressSpace = None
+        if backend == "cs":
+            self.env = dict(os.environ, DOTNET_GCHeapHardLimit=f"{memory:x}")
+        else:
+            self.addressSpace = memory
+
+    # The command with the address space limit set by a shell that then
+    # replaces itself with the program, so the limit is in place before the
+    # program starts. (preexec_fn would do the same, but isn't safe to use
+    # from the pool's threads.)
+    def wrap(self, command):
+        if self.addressSpace is None:
+            return command
+        return ["/bin/sh", "-c", f'ulimit -v {self.addressSpace // 1024} && exec "$@"', "sh"] + command
+
+
+# Runs in a pool thread. Output goes to temporary files rather than pipes, so
+# a program that never stops writing can't block on a full one.
+def runCase(command, case, limits):
+    with open(case.input or os.devnull, 'rb') as stdin, \
+            tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(limits.wrap(command), stdin=stdin, stdout=stdout,
+                                   stderr=stderr, env=limits.env)
+        try:
+            process.wait(limits.seconds)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            return CaseResult(case, TIME_LIMIT, time.perf_counter() - start)
+        elapsed = time.perf_counter() - start
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            errors = stderr.read().decode(errors="replace")
+            if any(text in errors for text in OUT_OF_MEMORY):
+                return CaseResult(case, MEMORY_LIMIT, elapsed)
+            # The error itself, not the indented stack trace around it.
+            lines = [line for line in errors.splitlines() if line and not line[0].isspace()]
+            return CaseResult(case, RUNTIME_ERROR, elapsed,
+                              lines[-1] if lines else f"exit code {process.returncode}")
+        stdout.seek(0)
+        output = stdout.read().decode(errors="replace")
+
+    with open(case.expected, 'r') as expectedFile:
+        difference = firstDifference(expectedFile.read(), output)
+    if difference is not None:
+        return CaseResult(case, WRONG_ANSWER, elapsed, difference)
+    return CaseResult(case, PASS, elapsed)
+
+
+def outputLines(text):
+    lines = [line.rstrip() for line in text.splitlines()]
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+# Describes the first line that differs, or returns None if none do.
+def firstDifference(expected, actual):
+    expectedLines = outputLines(expected)
+    actualLines = outputLines(actual)
+    for number in range(max(len(expectedLines), len(actualLines))):
+        want = expectedLines[number] if number < len(expectedLines) else "<end of output>"
+        got = actualLines[number] if number < len(actualLines) else "<end of output>"
+        if want != got:
+            return f"line {number + 1}: expected {want!r}, got {got!r}"
+    return None
+
+
+def runCases(source, path, directory, backend="cs", optimized=False, jobs=None,
+             seconds=2.0, memory=256 * 2**20):
+    cases = findCases(directory)
+    limits = Limits(backend, seconds, memory)
+    with tempfile.TemporaryDirectory() as buildDirectory:
+        command = buildProgram(source, path, backend, optimized, buildDirectory)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            return list(pool.map(runCase, [command] * len(cases), cases, [limits] * len(cases)))
+
+
+# The smallest value at least fraction of values are no bigger than.
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def printCaseResults(results, elapsed):
+    failures = 0
+    for result in results:
+        if result.verdict == PASS:
+            print("{color}pass{end} {name} ({elapsed:.1f} ms)".format(
+                color="\033[92m", end="\033[0m", name=result.case.name,
+                elapsed=result.elapsed * 1000))
+        else:
+            failures += 1
+            print("{color}FAIL{end} {name} ({elapsed:.1f} ms): {verdict}{detail}".format(
+                color="\033[91m", end="\033[0m", name=result.case.name,
+                elapsed=result.elapsed * 1000,
+                verdict=result.verdict, detail=f"\n     {result.detail}" if result.detail else ""))
+    print(f"{len(results) - failures} of {len(results)} passed in {elapsed:.2f}s")
+    if results:
+        latencies = [result.elapsed * 1000 for result in results]
+        print("latency: " + "  ".join(
+            f"{name} {percentile(latencies, fraction):.1f} ms"
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))))
+    return failures
@@ -1,5 +1,6 @@
-import sys
+import re
 import enum
+import array
 # Lexer keeps track of current position in the source code and produces tokens to be parsed.
 
 
@@ -8,6 +9,8 @@ class Lexer:
         self.source = input + '\n'
         self.curChar = ''
         self.curPos = -1
+        self.lines = LineCounter()
+        self.tokenCount = 0     # tokens handed out by tokens()
         self.nextChar()
 
     def nextChar(self):
@@ -22,14 +25,29 @@ class Lexer:
             return '\0'
         return self.source[self.curPos+1]
 
-    def abort(self, message):
-        txt = "{color}Lexing Error\n{message}{end}"
-        sys.exit(txt.format(color="\033[91m", end="\033[0m", message=message))
+    # The error is reported on the line of pos, or of the current character.
+    def abort(self, message, pos=None):
+        pos = self.curPos if pos is None else pos
+        raise CompileError("Lexing Error", message, self.lines.position(self.source, pos)[0])
+
+    # Yields tokens as they're asked for. Like getToken it keeps giving EOF
+    # once the end is reached.
+    def tokens(self):
+        while True:
+            token = self.getToken()
+            self.tokenCount += 1
+            yield token
+            if token.kind == TokenType.EOF:
+                break
+        # The parser peeks one token past the end, which isn't counted.
+        while True:
+            yield self.getToken()
 
     def getToken(self):
         self.skipWhitespace()
         self.skipComment()
         token = None
+        start = self.curPos
 
         if self.curChar == '&' and self.peek() == '&':
             token = Token('+', TokenType.CONCAT)
@@ -87,6 +105,8 @@ class Lexer:
             startPos = self.curPos
 
             while self.curChar != '\"':
+                if self.curChar == '\0':
+                    self.abort("Unterminated string, expected \"", start)
                 self.nextChar()
 
             tokText = self.source[startPos: self.curPos]
@@ -121,12 +141,14 @@ class Lexer:
             keyword = Token.checkIfKeyword(tokText)
             if keyword == None:
                 if self.peek() == '[':
+                    # The index stays part of the identifier, the parser
+                    # takes it apart.
                     self.nextChar()
-                    tokText = self.source[startPos: self.curPos + 1]
-                    tempPos = self.curPos + 1
                     while self.curChar != ']':
+                        if self.curChar == '\0':
+                            self.abort(f"Missing ] after {tokText}[", start)
                         self.nextChar()
-                    tokText += f"{self.source[tempPos: self.curPos]} - 1]"
+                    tokText = self.source[startPos: self.curPos + 1]
                     token = Token(tokText, TokenType.IDENT)
                 else:
                     token = Token(tokText, TokenType.IDENT)
@@ -143,6 +165,8 @@ class Lexer:
                     tokText = "!"
                 elif keyword == TokenType.ARRAY:
                     while not self.curChar == ']':
+                        if self.curChar == '\0':
+                            self.abort("Missing ] after ARRAY[", start)
                         self.nextChar()
                     tokText = self.source[startPos: self.curPos + 1]
                 token = Token(tokText, keyword)
@@ -154,6 +178,7 @@ class Lexer:
         else:
             self.abort(f"Unknown token: {self.curChar}")
 
+        token.line, token.col = self.lines.position(self.source, start)
         self.nextChar()
         return token
 
@@ -168,7 +193,255 @@ class Lexer:
                 self.nextChar()
 
 
+# RegexLexer produces the same token stream as Lexer, but scans with one compiled
+# master regex instead of walking the source a character at a time. Anything the
+# regex doesn't cover (errors, non-ASCII, EOF) is handed to Lexer.getToken so the
+# behaviour and error messages stay identical.
+class RegexLexer(Lexer):
+    def getToken(self):
+        match = TOKEN_REGEX.match(self.source, self.curPos)
+        kind = match.lastgroup
+        end = match.end()
+
+        if kind == "WORD":
+            tokText = match.group(kind)
+            keyword = KEYWORDS.get(tokText)
+            if keyword is None:
+                if self.source.startswith('[', end):
+                    close = self.source.find(']', end)
+                    if close == -1:
+                        return self.fallback(match.start(kind))
+                    end = close + 1
+                    tokText = self.source[match.start(kind): end]
+                token = Token(tokText, TokenType.IDENT)
+            elif keyword == TokenType.ARRAY:
+                close = self.source.find(']', end - 1)
+                if close == -1:
+                    return self.fallback(match.start(kind))
+                end = close + 1
+                token = Token(self.source[match.start(kind): end], keyword)
+            else:
+                token = Token(KEYWORD_TEXT.get(keyword, tokText), keyword)
+        elif kind == "SYMBOL":
+            text, symbolKind = SYMBOLS[match.group(kind)]
+            token = Token(text, symbolKind)
+        elif kind == "NUMBER":
+            token = Token(match.group(kind), TokenType.NUMBER)
+        elif kind == "STRING":
+            token = Token(match.group(kind)[1:-1], TokenType.STRING)
+        elif kind == "CHAR":
+            token = Token(match.group(kind)[1], TokenType.CHAR)
+        else:
+            return self.fallback(end)
+
+        token.line, token.col = self.lines.position(self.source, match.start(kind))
+        self.curPos = end
+        return token
+
+    # Same as getToken, but returns the token kind and its (start, end) offsets
+    # into the source instead of building the token text.
+    def getSpan(self):
+        match = TOKEN_REGEX.match(self.source, self.curPos)
+        group = match.lastgroup
+        if group is None:
+            start = match.end()
+            token = self.fallback(start)
+            return token.kind, start, self.curPos
+
+        start = match.start(group)
+        end = match.end()
+        self.curPos = end
+
+        if group == "WORD":
+            kind = KEYWORDS.get(match.group(group), TokenType.IDENT)
+            if kind == TokenType.IDENT and self.source.startswith('[', end):
+                close = self.source.find(']', end)
+            elif kind == TokenType.ARRAY:
+                close = self.source.find(']', end - 1)
+            else:
+                return kind, start, end
+            if close == -1:
+                token = self.fallback(start)
+                return token.kind, start, self.curPos
+            self.curPos = close + 1
+            return kind, start, close + 1
+        elif group == "SYMBOL":
+            return SYMBOLS[match.group(group)][1], start, end
+        elif group == "NUMBER":
+            return TokenType.NUMBER, start, end
+        elif group == "STRING":
+            return TokenType.STRING, start + 1, end - 1
+        else:
+            return TokenType.CHAR, start + 1, end - 1
+
+    # Let the character-by-character lexer deal with whatever is at pos.
+    def fallback(self, pos):
+        self.curPos = pos - 1
+        self.nextChar()
+        return Lexer.getToken(self)
+
+
+# StreamLexer reads its source from a text file a chunk at a time rather than
+# taking it as one string. self.source only holds a window of the file: the
+# tokens are matched in it the same way RegexLexer does, and the text before the
+# current token is dropped whenever more is read, so memory stays flat however
+# long the file is. A token is only matched once the window holds the rest of
+# its line; anything longer (a string or brackets running over a line) goes
+# through the character-by-character fallback, which reads more as it goes.
+class StreamLexer(RegexLexer):
+    def __init__(self, inputFile, chunkSize=64 * 1024):
+        self.inputFile = inputFile
+        self.chunkSize = chunkSize
+        self.atEnd = False
+        self.lastNewline = -1
+        self.source = ''
+        self.curChar = ''
+        self.curPos = -1
+        self.lines = LineCounter()
+        self.tokenCount = 0
+        self.nextChar()
+
+    # Appends the next chunk to the window, first dropping everything before
+    # keepFrom. The lexers add a newline after the source, so do that at the end.
+    def readMore(self, keepFrom=0):
+        chunk = self.inputFile.read(self.chunkSize)
+        if not chunk:
+            self.atEnd = True
+            chunk = '\n'
+        self.lines.shift(self.source, keepFrom)
+        self.source = self.source[keepFrom:] + chunk
+        self.curPos -= keepFrom
+        self.lastNewline = self.source.rfind('\n')
+
+    def nextChar(self):
+        if self.curPos + 1 >= len(self.source) and not self.atEnd:
+            self.readMore()
+        Lexer.nextChar(self)
+
+    def peek(self):
+        if self.curPos + 1 >= len(self.source) and not self.atEnd:
+            self.readMore()
+        return Lexer.peek(self)
+
+    def getToken(self):
+        while self.curPos > self.lastNewline and not self.atEnd:
+            self.readMore(max(self.curPos, 0))
+        return RegexLexer.getToken(self)
+
+
+# TokenStream lexes the whole source up front into a compact form: token kinds
+# as small ints and token text as (start, end) offsets into the source, kept in
+# arrays. The text of a token is only built when it's asked for. It has the same
+# getToken method as the lexers, so it can be handed to Parser in their place.
+class TokenStream:
+    def __init__(self, input):
+        lexer = RegexLexer(input)
+        self.source = lexer.source
+        self.kinds = array.array('h')
+        self.starts = array.array('L')
+        self.ends = array.array('L')
+        self.curIndex = 0
+        self.lines = LineCounter()
+
+        kind = None
+        while kind != TokenType.EOF:
+            kind, start, end = lexer.getSpan()
+            self.kinds.append(kind.value)
+            self.starts.append(start)
+            self.ends.append(end)
+        self.tokenCount = len(self.kinds)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, index):
+        return TOKEN_KINDS[self.kinds[index]]
+
+    def text(self, index):
+        return spanText(self.source, self.kind(index), self.starts[index], self.ends[index])
+
+    def getToken(self):
+        index = self.curIndex
+        # Stay on EOF once we get there, like the lexers do.
+        if index < len(self.kinds) - 1:
+            self.curIndex += 1
+        kind = self.kind(index)
+        start = self.starts[index]
+        # String and char spans leave out the opening quote.
+        if kind == TokenType.STRING or kind == TokenType.CHAR:
+            start -= 1
+        token = Token(self.text(index), kind)
+        token.line, token.col = self.lines.position(self.source, start)
+        return token
+
+    def tokens(self):
+        while True:
+            yield self.getToken()
+
+
+# Tokens first to last of stream as a TokenStream of their own, ending with a
+# NEWLINE and EOF, so a part of a program can be sent to a worker process and
+# parsed there without lexing it again.
+class TokenSlice(TokenStream):
+    def __init__(self, stream, first, last):
+        base = stream.starts[first]
+        end = stream.ends[last] - base
+        self.source = stream.source[base:stream.ends[last]] + '\n'
+        self.kinds = stream.kinds[first:last + 1]
+        self.kinds.extend((TokenType.NEWLINE.value, TokenType.EOF.value))
+        self.starts = array.array('L', [start - base for start in stream.starts[first:last + 1]])
+        self.starts.extend((end, end + 1))
+        self.ends = array.array('L', [tokenEnd - base for tokenEnd in stream.ends[first:last + 1]])
+        self.ends.extend((end + 1, end + 1))
+        self.curIndex = 0
+        self.lines = LineCounter()
+        self.tokenCount = len(self.kinds)
+
+
+# Turns offsets into the source into a (line, column) pair, both counting from
+# 1. Offsets have to come in increasing order, so every character is only
+# looked at once however many tokens there are.
+class LineCounter:
+    def __init__(self):
+        self.line = 1
+        self.lineStart = 0
+        self.pos = 0
+
+    def position(self, source, offset):
+        newlines = source.count('\n', self.pos, offset)
+        if newlines:
+            self.line += newlines
+            self.lineStart = source.rfind('\n', self.pos, offset) + 1
+        self.pos = offset
+        return self.line, offset - self.lineStart + 1
+
+    # The first count characters of source are about to be dropped (see
+    # StreamLexer), so count the lines in them first.
+    def shift(self, source, count):
+        if count > self.pos:
+            self.position(source, count)
+        self.pos -= count
+        self.lineStart -= count
+
+
+# Raised by Lexer.abort and Parser.abort. kind is the heading the message is
+# shown under, e.g. "Parse Error", and line the source line it was found on,
+# when that's known.
+class CompileError(Exception):
+    def __init__(self, kind, message, line=None):
+        super().__init__(f"{kind}\n{message}")
+        self.kind = kind
+        self.message = message
+        self.line = line
+
+    # So it can be raised in a worker process and caught in another.
+    def __reduce__(self):
+        return (CompileError, (self.kind, self.message, self.line))
+
+
 class Token:
+    __slots__ = ("text", "kind", "line", "col")
+
     def __init__(self, tokenText, tokenKind):
         self.text = tokenText
         self.kind = tokenKind
@@ -178,14 +451,15 @@ class Token:
 
     @staticmethod
     def checkIfKeyword(tokenText):
-        for kind in TokenType:
-            # Keyword enum values between 100 and 200
-            if kind.name == tokenText and kind.value >= 100 and kind.value < 200:
-                return kind
-        return None
+        return KEYWORDS.get(tokenText)
 
 
 class TokenType(enum.Enum):
+    # Members are only ever equal to themselves, so hash them by identity.
+    # Enum's own __hash__ is written in Python, and the parsers look token
+    # kinds up in dicts for every token.
+    __hash__ = object.__hash__
+
     EOF = -1
     NEWLINE = 0
     NUMBER = 1
@@ -245,3 +519,67 @@ class TokenType(enum.Enum):
     CONCAT = 212
     COLON = 213
     COMMA = 214
+
+
+# Lookup tables used by Token.checkIfKeyword and RegexLexer.
+# Keyword enum values between 100 and 200
+KEYWORDS = {kind.name: kind for kind in TokenType if 100 <= kind.value < 200}
+
+TOKEN_KINDS = {kind.value: kind for kind in TokenType}
+
+KEYWORD_TEXT = {
+    TokenType.FALSE: "false",
+    TokenType.TRUE: "true",
+    TokenType.AND: "&&",
+    TokenType.OR: "||",
+    TokenType.NOT: "!",
+}
+
+SYMBOLS = {
+    "&&": ("+", TokenType.CONCAT),
+    "(": ("(", TokenType.BRACKOPEN),
+    ")": (")", TokenType.BRACKCLOSE),
+    ",": (",", TokenType.COMMA),
+    "+": ("+", TokenType.PLUS),
+    "-": ("-", TokenType.MINUS),
+    "*": ("*", TokenType.ASTERISK),
+    "/": ("/", TokenType.SLASH),
+    "=": ("==", TokenType.EQEQ),
+    ">=": (">=", TokenType.GTEQ),
+    ">": (">", TokenType.GT),
+    "<-": ("=", TokenType.EQ),
+    "<>": ("!=", TokenType.NOTEQ),
+    "<=": ("<=", TokenType.LTEQ),
+    "<": ("<", TokenType.LT),
+    "!=": ("!=", TokenType.NOTEQ),
+    ":": (":", TokenType.COLON),
+    "\n": ("\n", TokenType.NEWLINE),
+}
+
+# Text of the tokens that don't take it from the source.
+FIXED_TEXT = {kind: text for text, kind in SYMBOLS.values()}
+FIXED_TEXT.update({kind: KEYWORD_TEXT.get(kind, name)
+                   for name, kind in KEYWORDS.items() if kind != TokenType.ARRAY})
+FIXED_TEXT[TokenType.EOF] = ""
+
+
+# Builds the text of a token from its span, the way the lexers would.
+def spanText(source, kind, start, end):
+    text = FIXED_TEXT.get(kind)
+    if text is not None:
+        return text
+    return source[start: end]
+
+
+# Leading whitespace and a comment are skipped the same way Lexer does it. A
+# number with a dangling '.' or non-ASCII digits is left to the fallback.
+TOKEN_REGEX = re.compile(r"""
+    [ \t\r]*(?://[^\n]*)?
+    (?:
+        (?P<WORD>[A-Za-z][^\W_]*)
+      | (?P<NUMBER>[0-9]+(?:\.[0-9]+)?(?![.0-9]|[^\x00-\x7f]))
+      | (?P<SYMBOL>&&|<-|<>|<=|>=|!=|[-()+*/=<>:,\n])
+      | (?P<STRING>"[^"]*")
+      | (?P<CHAR>'(?s:.)')
+    )?
+""", re.VERBOSE)
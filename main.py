@@ -1,36 +1,325 @@
 from lex import *
 from emit import *
 from parse import *
+from optimize import *
+from pyemit import PythonGenerator
+from cemit import CGenerator
+from cache import BuildCache, FragmentCache, DEFAULT_MAX_SIZE
+from batch import runBatch, printResults
+from watch import watch
+from judge import runCases, printCaseResults
+from stats import Stats
+import pyruntime
+import argparse
+import glob
+import marshal
+import shutil
+import tempfile
+import time
 import sys
 import os
 
+# With --stream the generated code goes to a temporary file past this size.
+STREAM_SPILL_SIZE = 2**20
+
+
+def printRunning():
+    print("{color}Success{end}".format(
+        color="\033[92m", end="\033[0m"))
+    print("{color}Running...\n{end}".format(
+        color="\033[93m", end="\033[0m"))
+
+
+def printCached():
+    print("{color}Using cached build{end}".format(
+        color="\033[94m", end="\033[0m"))
+
+
+# input is the source text, or with --stream the open source file. With --stats
+# the source is lexed up front so lexing can be timed on its own; otherwise the
+# parser pulls tokens from the lexer as it goes.
+def makeLexer(input, stats):
+    if not isinstance(input, str):
+        return StreamLexer(input)
+    if stats.memory:
+        return stats.time("lex", TokenStream, input)
+    return RegexLexer(input)
+
+
+def parseProgram(lexer, args, stats):
+    parser = IRParser(lexer)
+    program = stats.time("parse", parser.program)
+    countTokens(lexer, parser, stats)
+    if args.optimize:
+        program = stats.time("optimize", optimize, program)
+    if args.parallel_loops:
+        program = stats.time("parallelize", ParallelLoops(args.parallel_threshold).visit, program)
+    return program
+
+
+# What --parallel-loops changes about the build, for the cache key.
+def parallelOption(args):
+    return args.parallel_threshold if args.parallel_loops else None
+
+
+def countTokens(lexer, parser, stats):
+    stats.count("tokens", lexer.tokenCount)
+    stats.count("statements", parser.statementCount)
+
+
+def countFragments(fragments, stats):
+    stats.count("fragmentHits", fragments.hits)
+    stats.count("fragmentMisses", fragments.misses)
+    print("{color}Reused {hits} of {total} routines from the fragment cache{end}".format(
+        color="\033[94m", end="\033[0m", hits=fragments.hits,
+        total=fragments.hits + fragments.misses))
+
+
+def runPython(input, args, cache, stats):
+    if cache is not None:
+        # The code's tracebacks name the file.
+        key = cache.key(input, "py", args.optimize, args.file)
+        entry = stats.time("cache", cache.lookup, key)
+        if entry is not None:
+            with open(os.path.join(entry, "program.pyc"), 'rb') as codeFile:
+                code = marshal.load(codeFile)
+            printCached()
+            printRunning()
+            stats.time("run", pyruntime.runCode, code, not args.no_prompt)
+            return
+
+    program = parseProgram(makeLexer(input, stats), args, stats)
+    module = stats.time("emit", PythonGenerator().program, program)
+    code = stats.time("compile", pyruntime.compileModule, module, args.file)
+
+    if cache is not None:
+        with tempfile.TemporaryDirectory() as temp:
+            codePath = os.path.join(temp, "program.pyc")
+            with open(codePath, 'wb') as codeFile:
+                marshal.dump(code, codeFile)
+            cache.store(key, {"program.pyc": codePath})
+
+    printRunning()
+    stats.time("run", pyruntime.runCode, code, not args.no_prompt)
+
+
+def runCSharp(input, filename, args, cache, stats):
+    if cache is not None:
+        # The profiler's #line directives name the file.
+        key = cache.key(input, "cs", args.optimize, args.no_prompt,
+                        args.file if args.profile else None, parallelOption(args))
+        entry = stats.time("cache", cache.lookup, key)
+        if entry is not None:
+            shutil.copy(os.path.join(entry, "program.cs"), f"{filename}.cs")
+            printCached()
+            printRunning()
+            stats.timeProcess("run", os.system, f"\"{os.path.join(entry, 'program.exe')}\"")
+            return
+
+    lexer = makeLexer(input, stats)
+    emitter = Emitter(f"{filename}.cs", STREAM_SPILL_SIZE if args.stream else None,
+                      not args.no_prompt)
+    if args.optimize or args.profile or args.parallel_loops:
+        program = parseProgram(lexer, args, stats)
+        profile = (args.file, input) if args.profile else None
+        stats.time("emit", CSharpGenerator(emitter, profile).program, program)
+    elif args.parallel or args.incremental:
+        # Routines are found by scanning all the tokens first.
+        if not isinstance(lexer, TokenStream):
+            lexer = stats.time("lex", TokenStream, input)
+        fragments = FragmentCache(args.cache_dir) if args.incremental else None
+        if args.parallel:
+            parser = ParallelParser(lexer, emitter, args.jobs, fragments)
+        else:
+            parser = RoutineParser(lexer, emitter, fragments)
+        stats.time("parse+emit", parser.program)
+        countTokens(lexer, parser, stats)
+        if fragments is not None:
+            countFragments(fragments, stats)
+    else:
+        parser = (StackParser if args.deep else Parser)(lexer, emitter)
+        stats.time("parse+emit", parser.program)
+        countTokens(lexer, parser, stats)
+    stats.time("write", emitter.writeFile)
+    stats.count("outputBytes", os.path.getsize(f"{filename}.cs"))
+
+    printRunning()
+    if cache is None:
+        if stats.timeProcess("csc", os.system, f"csc -out:{filename}.exe {filename}.cs") == 0:
+            stats.timeProcess("run", os.system, f"{filename}.exe")
+        return
+
+    with tempfile.TemporaryDirectory() as temp:
+        exe = os.path.join(temp, "program.exe")
+        if stats.timeProcess("csc", os.system, f"csc -out:\"{exe}\" {filename}.cs") != 0:
+            return
+        entry = cache.store(key, {"program.cs": f"{filename}.cs", "program.exe": exe})
+    stats.timeProcess("run", os.system, f"\"{os.path.join(entry, 'program.exe')}\"")
+
+
+# The C compiler is $CC, or cc if it isn't set. Parallel loops need OpenMP.
+def buildC(filename, exe, openmp=False):
+    return f"{os.environ.get('CC', 'cc')} -O2{' -fopenmp' if openmp else ''} -o \"{exe}\" \"{filename}.c\" -lm"
+
+
+def runC(input, filename, args, cache, stats):
+    if cache is not None:
+        key = cache.key(input, "c", args.optimize, args.no_prompt, os.environ.get("CC", "cc"),
+                        parallelOption(args))
+        entry = stats.time("cache", cache.lookup, key)
+        if entry is not None:
+            shutil.copy(os.path.join(entry, "program.c"), f"{filename}.c")
+            printCached()
+            printRunning()
+            stats.timeProcess("run", os.system, f"\"{os.path.join(entry, 'program')}\"")
+            return
+
+    program = parseProgram(makeLexer(input, stats), args, stats)
+    source = stats.time("emit", CGenerator(not args.no_prompt).program, program)
+    with open(f"{filename}.c", 'w') as outputFile:
+        stats.time("write", outputFile.write, source)
+    stats.count("outputBytes", os.path.getsize(f"{filename}.c"))
+
+    printRunning()
+    if cache is None:
+        if stats.timeProcess("cc", os.system, buildC(filename, filename, args.parallel_loops)) == 0:
+            stats.timeProcess("run", os.system, f"\"{os.path.abspath(filename)}\"")
+        return
+
+    with tempfile.TemporaryDirectory() as temp:
+        exe = os.path.join(temp, "program")
+        if stats.timeProcess("cc", os.system, buildC(filename, exe, args.parallel_loops)) != 0:
+            return
+        entry = cache.store(key, {"program.c": f"{filename}.c", "program": exe})
+    stats.timeProcess("run", os.system, f"\"{os.path.join(entry, 'program')}\"")
+
 
 def main():
     print("\033[95mThe Pseudo-Pseudocode Compiler 😎\033[0m")
 
-    if len(sys.argv) < 2:
+    argParser = argparse.ArgumentParser(
+        description="Compiles pseudocode to C# and runs it")
+    argParser.add_argument("files", nargs="*",
+                           help="pseudocode source file, or several files or glob patterns for a batch")
+    argParser.add_argument("-O", "--optimize", action="store_true",
+                           help="compile through the IR and run the optimization passes")
+    argParser.add_argument("--backend", choices=("cs", "py", "c"), default="cs",
+                           help="cs writes C# and runs it with csc, py runs the program in-process, c builds a native binary with cc -O2")
+    argParser.add_argument("--profile", action="store_true",
+                           help="count and time every statement and print a report by source line when the program exits")
+    argParser.add_argument("--stats", nargs="?", const="text", metavar="{text,json}",
+                           help="print the time and peak memory of each compiler phase to standard error, as a table or JSON")
+    argParser.add_argument("--no-prompt", action="store_true",
+                           help="don't print \"Input: \" before reading input, for running with piped input")
+    argParser.add_argument("--no-cache", action="store_true",
+                           help="always compile, without reading or writing the build cache")
+    argParser.add_argument("--cache-dir",
+                           help="where to keep the build cache (default ~/.cache/pseudocompyler)")
+    argParser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE // 2**20,
+                           help="build cache size limit in MiB")
+    argParser.add_argument("--stream", action="store_true",
+                           help="read the source a chunk at a time so huge files don't have to fit in memory (skips the cache)")
+    argParser.add_argument("--parallel-loops", action="store_true",
+                           help="run FOR loops whose iterations don't depend on each other on every core (C# and C backends, C with OpenMP)")
+    argParser.add_argument("--parallel-threshold", type=int, default=PARALLEL_THRESHOLD,
+                           help="fewest iterations a --parallel-loops loop runs in parallel for")
+    argParser.add_argument("--deep", action="store_true",
+                           help="parse blocks without recursion, for programs nested too deep for the default parser (C# backend, without -O or --profile)")
+    argParser.add_argument("--parallel", action="store_true",
+                           help="parse and emit top-level routines in -j worker processes, for files with many of them (C# backend, without -O or --profile)")
+    argParser.add_argument("--incremental", action="store_true",
+                           help="reuse the C# of routines that haven't changed since they were last compiled (C# backend, without -O or --profile)")
+    argParser.add_argument("--batch", action="store_true",
+                           help="compile every file in parallel and report errors per file, without running")
+    argParser.add_argument("--cases", metavar="DIR",
+                           help="compile once and run against every <name>.in and <name>.out pair in DIR, without prompting")
+    argParser.add_argument("--time-limit", type=float, default=2.0,
+                           help="seconds each --cases run may take")
+    argParser.add_argument("--memory-limit", type=int, default=256,
+                           help="MiB each --cases run may use")
+    argParser.add_argument("-j", "--jobs", type=int,
+                           help="worker processes for --batch and --parallel, runs at once for --cases (default: one per CPU)")
+    argParser.add_argument("--watch", action="store_true",
+                           help="stay running and recompile and rerun a file whenever it is saved")
+    argParser.add_argument("--interval", type=float, default=0.25,
+                           help="seconds between checks for changes in --watch mode")
+    args = argParser.parse_args()
+    # "--stats file.pseudo" takes the file as the format, so give it back.
+    if args.stats not in (None, "text", "json"):
+        args.files.insert(0, args.stats)
+        args.stats = "text"
+
+    if not args.files:
         sys.exit("{color}Error\nCompiler needs source file as argument.{end}".format(
             color="\033[91m", end="\033[0m"))
-    with open(' '.join(sys.argv[1:]), 'r') as inputFile:
-        input = inputFile.read()
 
-    print("{color}Compiling...{end}".format(
-        color="\033[94m", end="\033[0m"))
+    if args.parallel_loops and (args.watch or args.batch or len(args.files) > 1 or
+                                glob.has_magic(args.files[0]) or args.cases or args.profile):
+        sys.exit("{color}Error\n--parallel-loops only works on a single file run once, without --profile.{end}".format(
+            color="\033[91m", end="\033[0m"))
 
-    lexer = Lexer(input)
-    filename = sys.argv[1].split('.')[0]
-    emitter = Emitter(f"{filename}.cs")
-    parser = Parser(lexer, emitter)
+    if args.watch:
+        watch(args.files, args.backend, args.optimize, args.interval, not args.no_prompt,
+              args.cache_dir, args.no_cache)
 
-    parser.program()
-    emitter.writeFile()
+    if args.batch or len(args.files) > 1 or glob.has_magic(args.files[0]):
+        print("{color}Compiling...{end}".format(
+            color="\033[94m", end="\033[0m"))
+        results = runBatch(args.files, args.backend, args.optimize, args.jobs,
+                           prompt=not args.no_prompt)
+        sys.exit(1 if printResults(results) else 0)
 
-    print("{color}Success{end}".format(
-        color="\033[92m", end="\033[0m"))
-    print("{color}Running...\n{end}".format(
-        color="\033[93m", end="\033[0m"))
+    if args.cases:
+        with open(args.files[0], 'r') as inputFile:
+            input = inputFile.read()
+        print("{color}Compiling...{end}".format(
+            color="\033[94m", end="\033[0m"))
+        start = time.perf_counter()
+        try:
+            results = runCases(input, args.files[0], args.cases, args.backend, args.optimize,
+                               args.jobs, args.time_limit, args.memory_limit * 2**20)
+        except CompileError as error:
+            sys.exit("{color}{error}{end}".format(
+                color="\033[91m", end="\033[0m", error=error))
+        sys.exit(1 if printCaseResults(results, time.perf_counter() - start) else 0)
+
+    if args.profile and (args.backend != "cs" or args.stream):
+        sys.exit("{color}Error\n--profile needs the C# backend and the whole source.{end}".format(
+            color="\033[91m", end="\033[0m"))
+    if (args.parallel or args.incremental) and args.stream:
+        sys.exit("{color}Error\n--parallel and --incremental need the whole source.{end}".format(
+            color="\033[91m", end="\033[0m"))
+
+    args.file = args.files[0]
+    stats = Stats(memory=args.stats is not None)
+    with open(args.file, 'r') as inputFile:
+        input = inputFile if args.stream else stats.time("read", inputFile.read)
+
+        print("{color}Compiling...{end}".format(
+            color="\033[94m", end="\033[0m"))
+
+        cache = None
+        if not args.no_cache and not args.stream:
+            cache = BuildCache(args.cache_dir, args.cache_size * 2**20)
+
+        try:
+            if args.backend == "py":
+                runPython(input, args, cache, stats)
+            elif args.backend == "c":
+                runC(input, os.path.splitext(args.file)[0], args, cache, stats)
+            else:
+                runCSharp(input, os.path.splitext(args.file)[0], args, cache, stats)
+        except CompileError as error:
+            sys.exit("{color}{error}{end}".format(
+                color="\033[91m", end="\033[0m", error=error))
+        except RecursionError:
+            sys.exit("{color}Blocks are nested too deep, compile with --deep (C# backend, without -O or --profile){end}".format(
+                color="\033[91m", end="\033[0m"))
 
-    os.system(f"csc -out:{filename}.exe {filename}.cs && {filename}.exe")
+    if args.stats is not None:
+        sys.stdout.flush()
+        stats.write(args.stats)
 
 
-main()
+if __name__ == "__main__":
+    main()
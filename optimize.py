@@ -0,0 +1,469 @@
+from ir import *
+from lex import TokenType
+
+# Optimization passes over the intermediate representation. Every pass must keep
+# the meaning of the C# that Parser would have generated for the same program,
+# so folding follows C# rules: 32-bit ints, truncating division, doubles for
+# literals with a decimal point.
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+
+
+# C# type of a literal, or None when folding it isn't safe.
+def literalType(node):
+    if not isinstance(node, Literal):
+        return None
+    if node.kind == TokenType.NUMBER:
+        if isinstance(node.value, float):
+            return "double"
+        return "int" if INT_MIN <= node.value <= INT_MAX else None
+    if node.kind in (TokenType.STRING, TokenType.CHAR):
+        # Escapes are left for C# to interpret, so don't glue them together.
+        return None if '\\' in node.value else node.kind.name.lower()
+    return "bool"
+
+
+def makeLiteral(value):
+    if isinstance(value, bool):
+        return Literal(value, TokenType.TRUE if value else TokenType.FALSE)
+    if isinstance(value, str):
+        return Literal(value, TokenType.STRING)
+    if isinstance(value, int) and not INT_MIN <= value <= INT_MAX:
+        return None
+    if isinstance(value, float) and (value != value or value in (float("inf"), float("-inf"))):
+        return None
+    return Literal(value, TokenType.NUMBER)
+
+
+def constantBool(node):
+    if literalType(node) == "bool":
+        return node.value
+    return None
+
+
+def foldArithmetic(op, left, right, isInt):
+    if op in ("+", "&"):
+        return left + right
+    elif op == "-":
+        return left - right
+    elif op == "*":
+        return left * right
+    elif right == 0:
+        return None
+    elif isInt:
+        # C# truncates towards zero.
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    return left / right
+
+
+COMPARISONS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+# Returns the folded literal for op applied to two literals, or None.
+def foldBinary(op, left, right):
+    leftType, rightType = literalType(left), literalType(right)
+    if leftType is None or rightType is None:
+        return None
+    numeric = ("int", "double")
+
+    if op in ("+", "&") and "string" in (leftType, rightType):
+        if leftType in ("string", "char", "int") and rightType in ("string", "char", "int"):
+            return makeLiteral(str(left.value) + str(right.value))
+        return None
+
+    if op in ("+", "&", "-", "*", "/"):
+        if leftType in numeric and rightType in numeric:
+            isInt = leftType == rightType == "int"
+            value = foldArithmetic(op, left.value, right.value, isInt)
+            if value is None:
+                return None
+            return makeLiteral(value if isInt else float(value))
+        return None
+
+    if op in COMPARISONS:
+        if leftType in numeric and rightType in numeric:
+            return makeLiteral(COMPARISONS[op](left.value, right.value))
+        if leftType == rightType == "char":
+            return makeLiteral(COMPARISONS[op](ord(left.value), ord(right.value)))
+        if leftType == rightType and leftType in ("string", "bool") and op in ("=", "<>"):
+            return makeLiteral(COMPARISONS[op](left.value, right.value))
+        return None
+
+    if leftType == rightType == "bool":
+        if op == "AND":
+            return makeLiteral(left.value and right.value)
+        return makeLiteral(left.value or right.value)
+    return None
+
+
+# Folds operators whose operands are all literals.
+class ConstantFolder(Transformer):
+    def visitUnary(self, node):
+        node = self.genericVisit(node)
+        operandType = literalType(node.operand)
+        if node.op == "NOT" and operandType == "bool":
+            return makeLiteral(not node.operand.value)
+        if node.op in ("-", "+") and operandType in ("int", "double"):
+            value = node.operand.value
+            return makeLiteral(-value if node.op == "-" else value) or node
+        return node
+
+    def visitBinary(self, node):
+        node = self.genericVisit(node)
+        folded = foldBinary(node.op, node.left, node.right)
+        if folded is not None:
+            return folded
+
+        # AND/OR with a constant on the left short-circuit in C# too, so the
+        # right hand side can go when it wouldn't be evaluated.
+        left = constantBool(node.left)
+        if node.op == "AND" and left is not None:
+            return node.right if left else node.left
+        if node.op == "OR" and left is not None:
+            return node.left if left else node.right
+        return node
+
+
+# Removes IF, CASE and WHILE code that can never run.
+class DeadBranchEliminator(Transformer):
+    def visitIf(self, node):
+        node = self.genericVisit(node)
+        branches = []
+        elseBody = node.elseBody
+        for branch in node.branches:
+            condition = constantBool(branch.condition)
+            if condition is False:
+                continue
+            if condition is True:
+                elseBody = branch.body
+                break
+            branches.append(branch)
+
+        if branches:
+            return If(branches, elseBody)
+        return elseBody or []
+
+    def visitCase(self, node):
+        node = self.genericVisit(node)
+        if literalType(node.subject) is None:
+            return node
+        for branch in node.branches:
+            matches = foldBinary("=", node.subject, branch.condition)
+            if matches is None:
+                return node
+            if matches.value:
+                return branch.body
+        return node.otherwise or []
+
+    def visitWhile(self, node):
+        node = self.genericVisit(node)
+        if constantBool(node.condition) is False:
+            return None
+        return node
+
+
+# Names of all the variables that get a new value somewhere inside node.
+def assignedNames(node):
+    names = set()
+    for child in walk(node):
+        if isinstance(child, Assign):
+            target = child.target
+            names.add(target.name)
+        elif isinstance(child, (Input, Let)):
+            names.add(child.name)
+        elif isinstance(child, For):
+            names.add(child.var)
+        elif isinstance(child, Declare):
+            names.update(child.names)
+        elif isinstance(child, Constant):
+            names.add(child.name)
+    return names
+
+
+# Whether an expression gives the same value on every trip round a loop that
+# assigns to the given names, and can be evaluated early without side effects
+# or exceptions. Calls, array reads and division by a variable don't qualify.
+def isInvariant(node, assigned):
+    usesVariable = False
+    for child in walk(node):
+        if isinstance(child, (Call, Index)):
+            return False
+        if isinstance(child, Name):
+            if child.name in assigned:
+                return False
+            usesVariable = True
+        if isinstance(child, Binary) and child.op == "/":
+            divisor = child.right
+            if not isinstance(divisor, Literal) or divisor.value == 0:
+                return False
+    return usesVariable
+
+
+# Replaces loop invariant expressions with temporaries, see
+# LoopInvariantHoister.
+class InvariantReplacer(Transformer):
+    def __init__(self, hoister, assigned):
+        self.hoister = hoister
+        self.assigned = assigned
+        self.lets = {}
+
+    def visitBinary(self, node):
+        return self.replace(node)
+
+    def visitUnary(self, node):
+        return self.replace(node)
+
+    def replace(self, node):
+        if not isInvariant(node, self.assigned):
+            return self.genericVisit(node)
+        key = repr(node)
+        if key not in self.lets:
+            self.lets[key] = Let(self.hoister.newName(), node)
+        return Name(self.lets[key].name)
+
+
+# Moves expressions that don't change inside a WHILE, REPEAT or FOR loop into
+# temporaries assigned just before it. Outer loops are handled first so an
+# expression ends up outside every loop it's invariant in.
+class LoopInvariantHoister(Transformer):
+    def __init__(self):
+        self.count = 0
+
+    def newName(self):
+        self.count += 1
+        return f"_inv{self.count}"
+
+    def hoist(self, node, fields):
+        replacer = InvariantReplacer(self, assignedNames(node))
+        for name in fields:
+            setattr(node, name, replacer.visitValue(getattr(node, name)))
+        node = self.genericVisit(node)
+        return list(replacer.lets.values()) + [node]
+
+    def visitWhile(self, node):
+        return self.hoist(node, ("condition", "body"))
+
+    def visitRepeat(self, node):
+        return self.hoist(node, ("body", "condition"))
+
+    def visitFor(self, node):
+        return self.hoist(node, ("end", "body"))
+
+
+PASSES = [ConstantFolder, DeadBranchEliminator, LoopInvariantHoister]
+
+
+def optimize(program, passes=PASSES):
+    for optimizationPass in passes:
+        program = optimizationPass().visit(program)
+    return program
+
+
+# Loops with fewer iterations than this run one at a time, as handing them out
+# to threads would cost more than it saves.
+PARALLEL_THRESHOLD = 10000
+
+
+# Turns FOR loops whose iterations don't depend on each other into ParallelFor.
+# Only the outermost such loop is, the loops inside it stay sequential. This
+# isn't one of PASSES: it's only run when asked for, as a parallel loop stops
+# at the first error in any iteration rather than in the first one.
+class ParallelLoops(Transformer):
+    def __init__(self, threshold=PARALLEL_THRESHOLD):
+        self.threshold = threshold
+        self.types = {}         # declared types of the variables in scope
+        self.aliasable = set()  # arrays that might be another name for another one
+
+    def visitProgram(self, node):
+        statements = [statement for statement in node.statements
+                      if not isinstance(statement, (Procedure, Function))]
+        self.types = declaredTypes(statements)
+        self.aliasable = aliasableArrays(statements, self.types)
+        return self.genericVisit(node)
+
+    def visitProcedure(self, node):
+        types, aliasable = self.types, self.aliasable
+        self.types = {**types, **declaredTypes(node.body, node.params)}
+        self.aliasable = aliasableArrays(node.body, self.types) | {
+            name for name, dataType in node.params if isinstance(dataType, ArrayType)}
+        node.body = self.visitList(node.body)
+        self.types, self.aliasable = types, aliasable
+        return node
+
+    visitFunction = visitProcedure
+
+    def visitFor(self, node):
+        parallel = parallelLoop(node, self.types, self.aliasable, self.threshold)
+        return self.genericVisit(node) if parallel is None else parallel
+
+
+# The type each variable or constant is declared with in statements, along
+# with the parameters'.
+def declaredTypes(statements, params=()):
+    types = dict(params)
+    for node in walk(statements):
+        if isinstance(node, Declare):
+            types.update(dict.fromkeys(node.names, node.dataType))
+        elif isinstance(node, Constant):
+            types[node.name] = node.dataType
+    return types
+
+
+# Arrays assigned whole to or from another variable, after which both names
+# are the same array.
+def aliasableArrays(statements, types):
+    names = set()
+    for node in walk(statements):
+        if isinstance(node, Assign) and isinstance(node.target, Name) and \
+                isinstance(types.get(node.target.name), ArrayType):
+            names.add(node.target.name)
+            names.update(child.name for child in walk(node.value) if isinstance(child, Name))
+    return names
+
+
+# Works out whether the iterations of a FOR loop can run at the same time. They
+# can't read input, write output, call routines or return, and outside the
+# loop they can only change:
+#   - the elements of an array the counter picks out, the same one in every
+#     read and write of the array, so each iteration has its own (or, with more
+#     dimensions, its own row),
+#   - one variable the iterations combine their results in (see reduction).
+# Everything else they assign to has to be declared inside the loop. Returns
+# the loop as a ParallelFor, or None if it has to stay sequential.
+def parallelLoop(loop, types, aliasable, threshold):
+    local = set()       # declared inside the loop, so each iteration has its own
+    assigned = set()    # variables given a value
+    arrays = set()      # arrays given an element
+    counters = {loop.var: 0}    # the counter, and offsets of it hoisted out of indices
+    for node in walk(loop.body):
+        if isinstance(node, (Input, Output, Return, Call, CallStatement, Constant)):
+            return None
+        if isinstance(node, Declare):
+            local.update(node.names)
+        elif isinstance(node, Let):
+            local.add(node.name)
+            offset = counterOffset(node.value, {loop.var: 0})
+            if offset is not None:
+                counters[node.name] = offset
+        elif isinstance(node, For):
+            (local if node.declare else assigned).add(node.var)
+        elif isinstance(node, Assign):
+            (assigned if isinstance(node.target, Name) else arrays).add(node.target.name)
+    assigned -= local
+    arrays -= local
+    if loop.var in assigned or len(assigned) > 1:
+        return None
+
+    # The counter has to be read the same way, with the loop's bounds worked
+    # out once, for the iterations to be shared out.
+    for node in walk([loop.start, loop.end]):
+        if isinstance(node, Index) and node.name in arrays or \
+                isinstance(node, Name) and node.name in assigned:
+            return None
+
+    firstIndices = {}   # array given elements -> its first index, less the counter
+    used = set()
+    for node in walk(loop.body):
+        if isinstance(node, Index) and node.name not in local:
+            used.add(node.name)
+            if node.name in arrays:
+                offset = counterOffset(node.indices[0], counters)
+                if offset is None or firstIndices.setdefault(node.name, offset) != offset:
+                    return None
+        elif isinstance(node, Name) and node.name in arrays:
+            return None
+    if arrays and len(used & aliasable) > 1:
+        return None
+
+    reduction = None
+    if assigned:
+        reduction = findReduction(loop.body, assigned.pop(), types)
+        if reduction is None:
+            return None
+    return ParallelFor(loop, reduction, threshold)
+
+
+# How far index is from the counter, when it's the counter (or a name for an
+# offset of it) plus or minus a whole number. counters maps those names to
+# their offsets. None if index is anything else.
+def counterOffset(index, counters):
+    offset = 0
+    if isinstance(index, Binary) and index.op in ("+", "-") and \
+            isinstance(index.right, Literal) and type(index.right.value) is int:
+        offset = index.right.value if index.op == "+" else -index.right.value
+        index = index.left
+    if isinstance(index, Name) and index.name in counters:
+        return counters[index.name] + offset
+    return None
+
+
+# A variable the iterations of a loop combine their results in: every
+# assignment to it is name <- name + x or name <- name - x (a sum), or else
+# each is the only statement of an IF with no ELSE that compares name with the
+# value assigned (a minimum or maximum). It isn't read anywhere else in the
+# loop. Only INTEGERs can be summed, as adding REALs up in a different order
+# rounds differently. Returns ("+", name), ("min", name), ("max", name) or
+# None.
+def findReduction(body, name, types):
+    extremes = {}   # assignment -> "min" or "max", for those inside such an IF
+    ops = set()
+    uses = updates = 0
+    for node in walk(body):
+        if isinstance(node, Name) and node.name == name:
+            uses += 1
+        elif isinstance(node, If):
+            op = extremeUpdate(node, name)
+            if op is not None:
+                extremes[node.branches[0].body[0]] = op
+        elif isinstance(node, Assign) and isinstance(node.target, Name) and node.target.name == name:
+            op = extremes.get(node) or ("+" if isSum(node.value, name) else None)
+            if op is None:
+                return None
+            ops.add(op)
+            updates += 1
+    # The target and one read for each update, so name isn't in x.
+    if len(ops) != 1 or uses != 2 * updates:
+        return None
+    op = ops.pop()
+    if types.get(name) not in (("INTEGER",) if op == "+" else ("INTEGER", "REAL")):
+        return None
+    return (op, name)
+
+
+def isSum(value, name):
+    if not isinstance(value, Binary):
+        return False
+    if value.op in ("+", "-") and isinstance(value.left, Name) and value.left.name == name:
+        return True
+    return value.op == "+" and isinstance(value.right, Name) and value.right.name == name
+
+
+# "max" for IF x > name THEN name <- x ENDIF, "min" for IF x < name ..., or
+# None if node isn't one of those. Either way round and <= and >= work too.
+def extremeUpdate(node, name):
+    if len(node.branches) != 1 or node.elseBody:
+        return None
+    condition, body = node.branches[0].condition, node.branches[0].body
+    if len(body) != 1 or not isinstance(body[0], Assign) or \
+            not isinstance(body[0].target, Name) or body[0].target.name != name or \
+            not isinstance(condition, Binary) or condition.op not in ("<", "<=", ">", ">="):
+        return None
+    value = repr(body[0].value)
+    if isinstance(condition.right, Name) and condition.right.name == name and \
+            repr(condition.left) == value:
+        larger = condition.op in (">", ">=")
+    elif isinstance(condition.left, Name) and condition.left.name == name and \
+            repr(condition.right) == value:
+        larger = condition.op in ("<", "<=")
+    else:
+        return None
+    return "max" if larger else "min"
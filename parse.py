@@ -1,6 +1,10 @@
-import sys
 import re
+import concurrent.futures
+import itertools
 from lex import *
+from ir import *
+from symbols import SymbolTable
+from emit import readInput, Emitter, CSharpGenerator
 
 # Parse translates tokens into C#, checks grammar and emits the code
 
@@ -8,9 +12,12 @@ from lex import *
 class Parser:
     def __init__(self, lexer, emitter):
         self.lexer = lexer
+        self.tokens = lexer.tokens()
         self.emitter = emitter
+        self.csharp = CSharpGenerator(emitter)  # Writes out the IR of indices and bounds
 
-        self.symbols = set()  # All the declared variables
+        self.symbols = SymbolTable()  # All the declared names and their types
+        self.statementCount = 0
 
         self.curToken = None
         self.peekToken = None
@@ -32,14 +39,10 @@ class Parser:
 
     def nextToken(self):
         self.curToken = self.peekToken
-        self.peekToken = self.lexer.getToken()
-
-    def isComparisonOperator(self):
-        return self.checkToken(TokenType.GT) or self.checkToken(TokenType.GTEQ) or self.checkToken(TokenType.LT) or self.checkToken(TokenType.LTEQ) or self.checkToken(TokenType.EQEQ) or self.checkToken(TokenType.NOTEQ) or self.checkToken(TokenType.AND) or self.checkToken(TokenType.OR) or self.checkToken(TokenType.NOT)
+        self.peekToken = next(self.tokens)
 
     def abort(self, message):
-        txt = "{color}Parse Error\n{message}{end}"
-        sys.exit(txt.format(color="\033[91m", end="\033[0m", message=message))
+        raise CompileError("Parse Error", message, getattr(self.curToken, "line", None))
 
     def program(self):
         self.emitter.headerLine(
@@ -50,342 +53,456 @@ class Parser:
         while self.checkToken(TokenType.NEWLINE):
             self.nextToken()
 
-        while not self.checkToken(TokenType.EOF):
-            self.statement()
+        self.statements()
 
         self.emitter.emitLine("\t}")
 
-    def statement(self):
-        if self.checkToken(TokenType.PROCEDURE):
-            self.nextToken()
-            self.emitter.isMethod = True
-            name = self.curToken.text
-            if name not in self.symbols:
-                self.symbols.add(name)
-            else:
-                self.abort(f"Procedure name ({name}) already exists")
-            self.emitter.emit(f"public static void {name}(")
-            self.match(TokenType.IDENT)
-            self.match(TokenType.BRACKOPEN)
-
-            while not self.checkToken(TokenType.BRACKCLOSE):
-                parName = self.curToken.text
-                if parName not in self.symbols:
-                    self.symbols.add(parName)
-                self.match(TokenType.IDENT)
-
-                self.match(TokenType.COLON)
-                dataType = self.typeConversion(self.curToken.text)
-                self.emitter.emit(f"{dataType} {parName}")
-                self.nextToken()
-                if self.checkToken(TokenType.COMMA):
-                    self.emitter.emit(", ")
-                    self.nextToken()
-
-            self.emitter.emitLine(")\n\t{")
-            self.match(TokenType.BRACKCLOSE)
+    def statements(self):
+        while not self.checkToken(TokenType.EOF):
+            self.statement()
 
-        elif self.checkToken(TokenType.FUNCTION):
-            self.nextToken()
-            self.emitter.isMethod = True
-            name = self.curToken.text
-            if name not in self.symbols:
-                self.symbols.add(name)
-            else:
-                self.abort(f"Function name ({name}) already exists")
-            self.match(TokenType.IDENT)
-            self.match(TokenType.BRACKOPEN)
+    def statement(self):
+        self.statementCount += 1
+        block = self.block()
+        if block is not None:
+            # The block yields each time it wants a statement of its body.
+            for _ in block:
+                self.statement()
+        else:
+            self.simpleStatement()
 
-            parString = ""
-            while not self.checkToken(TokenType.BRACKCLOSE):
-                parName = self.curToken.text
-                if parName not in self.symbols:
-                    self.symbols.add(parName)
-                self.match(TokenType.IDENT)
+        # Must be a new line
+        self.nl()
 
-                self.match(TokenType.COLON)
-                dataType = self.typeConversion(self.curToken.text)
-                parString += f"{dataType} {parName}"
-                self.nextToken()
-                if self.checkToken(TokenType.COMMA):
-                    parString += ", "
-                    self.nextToken()
+    # Starts parsing a statement with a body, or returns None if this isn't one.
+    def block(self):
+        handler = self.BLOCKS.get(self.curToken.kind)
+        return handler(self) if handler is not None else None
 
-            self.match(TokenType.BRACKCLOSE)
-            self.match(TokenType.RETURNS)
-            returnsType = self.typeConversion(self.curToken.text)
+    def simpleStatement(self):
+        handler = self.STATEMENTS.get(self.curToken.kind)
+        if handler is None:
+            self.abort(
+                f"Invalid statement at '{self.curToken.text}' ({self.curToken.kind.name})")
+        handler(self)
 
-            self.emitter.emitLine(
-                f"public static {returnsType} {name}({parString}) " + "{")
-            self.nextToken()
+    # "IF" comparison "THEN" code "ENDIF"
+    def ifBlock(self):
+        self.nextToken()
+        self.emitter.emit("if (")
+        self.comparison()
 
-        elif self.checkToken(TokenType.ENDPROCEDURE) or self.checkToken(TokenType.ENDFUNCTION):
+        while not self.checkToken(TokenType.THEN):
             self.nextToken()
-            self.emitter.emitLine("\t}")
-            self.emitter.isMethod = False
 
-        elif self.checkToken(TokenType.RETURN):
-            self.nextToken()
-            self.emitter.emit("return ")
-            self.primary()
-            self.emitter.emitLine(";")
+        self.match(TokenType.THEN)
+        self.nl()
+        self.emitter.emitLine(") {")
 
-        elif self.checkToken(TokenType.CALL):
-            self.nextToken()
-            while not self.checkToken(TokenType.NEWLINE):
-                self.emitter.emit(self.curToken.text)
-                self.nextToken()
+        while not self.checkToken(TokenType.ENDIF):
+            yield
 
-            self.emitter.emitLine(";")
+        self.match(TokenType.ENDIF)
+        self.emitter.emitLine("}")
 
-        elif self.checkToken(TokenType.OUTPUT):
-            self.nextToken()
+    def caseBlock(self):
+        self.nextToken()
+        self.match(TokenType.OF)
+        self.emitter.emitLine(f"switch ({self.variableText(self.curToken.text)}) " + "{")
+        self.match(TokenType.IDENT)
+        self.nl()
 
-            if self.checkToken(TokenType.STRING):
-                self.emitter.emitLine(
-                    f"Console.WriteLine(\"{self.curToken.text}\");")
+        while not self.checkToken(TokenType.ENDCASE):
+            if self.checkToken(TokenType.OTHERWISE):
+                self.emitter.emit("default")
                 self.nextToken()
             else:
-                # Not a simple string and there are expressions
-                self.emitter.emit("Console.WriteLine($\"{")
-                self.expression()
-                if self.checkToken(TokenType.BRACKCLOSE):
-                    self.emitter.emit(")")
-                    self.match(TokenType.BRACKCLOSE)
-                self.emitter.emitLine("}\");")
+                self.emitter.emit("case ")
+                self.primary()
+                self.match(TokenType.COLON)
 
-        # "IF" comparison "THEN" code "ENDIF"
-        elif self.checkToken(TokenType.IF):
-            self.nextToken()
-            self.emitter.emit("if (")
-            self.comparison()
+            self.emitter.emitLine(":")
+            yield
 
-            while not self.checkToken(TokenType.THEN):
-                self.nextToken()
+            self.emitter.emitLine("break;")
 
-            self.match(TokenType.THEN)
-            self.nl()
-            self.emitter.emitLine(") {")
+        self.emitter.emitLine("}")
+        self.match(TokenType.ENDCASE)
 
-            while not self.checkToken(TokenType.ENDIF):
-                self.statement()
+    # "WHILE" comparison "REPEAT" code "ENDWHILE"
+    def whileBlock(self):
+        self.nextToken()
+        self.emitter.emit("while (")
+        self.comparison()
 
-            self.match(TokenType.ENDIF)
-            self.emitter.emitLine("}")
+        self.match(TokenType.DO)
+        self.nl()
+        self.emitter.emitLine(") {")
 
-        elif self.checkToken(TokenType.ELSE):
-            self.nextToken()
-            if self.checkToken(TokenType.IF):
-                self.nextToken()
-                self.emitter.emit("} else if (")
-                self.comparison()
+        while not self.checkToken(TokenType.ENDWHILE):
+            yield
 
-                while not self.checkToken(TokenType.THEN):
-                    self.nextToken()
+        self.match(TokenType.ENDWHILE)
+        self.emitter.emitLine("}")
 
-                self.match(TokenType.THEN)
-                self.emitter.emitLine(") {")
-            else:
-                self.emitter.emitLine("} else {")
+    def repeatBlock(self):
+        self.nextToken()
+        self.emitter.emitLine("do {")
 
-        elif self.checkToken(TokenType.CASE):
-            self.nextToken()
-            self.match(TokenType.OF)
-            self.emitter.emitLine(f"switch ({self.curToken.text}) " + "{")
-            self.match(TokenType.IDENT)
-            self.nl()
-
-            while not self.checkToken(TokenType.ENDCASE):
-                if self.checkToken(TokenType.OTHERWISE):
-                    self.emitter.emit("default")
-                    self.nextToken()
-                else:
-                    self.emitter.emit("case ")
-                    self.primary()
-                    self.match(TokenType.COLON)
-
-                self.emitter.emitLine(":")
-                self.statement()
+        self.nl()
+        while not self.checkToken(TokenType.UNTIL):
+            yield
+
+        self.match(TokenType.UNTIL)
+        self.emitter.emit("} while (!(")
+        self.comparison()
+        self.emitter.emitLine("));")
 
-                self.emitter.emitLine("break;")
+    def forBlock(self):
+        self.nextToken()
+        ident = self.curToken.text
+        # Declared like IRParser does, so the body can use it, in an index too,
+        # and like there forgotten after the loop, where the C# doesn't have it.
+        declare = ident not in self.symbols
+        if declare:
+            self.symbols.declare(ident, "variable", "INTEGER")
+        self.emitter.emit(f"for (int {ident} = ")
+        self.match(TokenType.IDENT)
+        self.match(TokenType.EQ)
+        self.emitter.emit(f"{self.curToken.text};")
+        self.match(TokenType.NUMBER)
+        self.match(TokenType.TO)
+        self.emitter.emitLine(
+            f"{ident} < {self.curToken.text}; {ident}++) " + "{")
+        self.match(TokenType.NUMBER)
+        self.nl()
 
-            self.emitter.emitLine("}")
-            self.match(TokenType.ENDCASE)
+        while not self.checkToken(TokenType.ENDFOR) and not self.checkToken(TokenType.NEXT):
+            yield
 
-        # "WHILE" comparison "REPEAT" code "ENDWHILE"
-        elif self.checkToken(TokenType.WHILE):
+        self.nextToken()
+        if self.checkToken(TokenType.IDENT):
             self.nextToken()
-            self.emitter.emit("while (")
-            self.comparison()
 
-            self.match(TokenType.DO)
-            self.nl()
-            self.emitter.emitLine(") {")
+        self.emitter.emitLine("}")
+        if declare:
+            self.symbols.forget(ident)
 
-            while not self.checkToken(TokenType.ENDWHILE):
-                self.statement()
+    def procedureStatement(self):
+        self.nextToken()
+        self.emitter.isMethod = True
+        name = self.curToken.text
+        if name not in self.symbols:
+            self.symbols.declareGlobal(name, "procedure")
+        else:
+            self.abort(f"Procedure name ({name}) already exists")
+        self.symbols.enter()
+        self.emitter.emit(f"public static void {name}(")
+        self.match(TokenType.IDENT)
+        self.match(TokenType.BRACKOPEN)
+
+        while not self.checkToken(TokenType.BRACKCLOSE):
+            parName = self.curToken.text
+            self.match(TokenType.IDENT)
 
-            self.match(TokenType.ENDWHILE)
-            self.emitter.emitLine("}")
+            self.match(TokenType.COLON)
+            dataType = self.dataType()
+            if not self.symbols.declaredHere(parName):
+                self.symbols.declare(parName, "parameter", dataType)
+            self.emitter.emit(f"{self.csharp.dataType(dataType)} {parName}")
+            if self.checkToken(TokenType.COMMA):
+                self.emitter.emit(", ")
+                self.nextToken()
 
-        elif self.checkToken(TokenType.REPEAT):
-            self.nextToken()
-            self.emitter.emitLine("do {")
+        self.emitter.emitLine(")\n\t{")
+        self.match(TokenType.BRACKCLOSE)
 
-            self.nl()
-            while not self.checkToken(TokenType.UNTIL):
-                self.statement()
+    def functionStatement(self):
+        self.nextToken()
+        self.emitter.isMethod = True
+        name = self.curToken.text
+        if name not in self.symbols:
+            function = self.symbols.declareGlobal(name, "function")
+        else:
+            self.abort(f"Function name ({name}) already exists")
+        self.symbols.enter()
+        self.match(TokenType.IDENT)
+        self.match(TokenType.BRACKOPEN)
+
+        parString = ""
+        while not self.checkToken(TokenType.BRACKCLOSE):
+            parName = self.curToken.text
+            self.match(TokenType.IDENT)
 
-            self.match(TokenType.UNTIL)
-            self.emitter.emit("} while (!")
-            self.comparison()
-            self.emitter.emitLine(");")
+            self.match(TokenType.COLON)
+            dataType = self.dataType()
+            if not self.symbols.declaredHere(parName):
+                self.symbols.declare(parName, "parameter", dataType)
+            parString += f"{self.csharp.dataType(dataType)} {parName}"
+            if self.checkToken(TokenType.COMMA):
+                parString += ", "
+                self.nextToken()
 
-        elif self.checkToken(TokenType.FOR):
-            self.nextToken()
-            ident = self.curToken.text
-            self.emitter.emit(f"for (int {ident} = ")
-            self.match(TokenType.IDENT)
-            self.match(TokenType.EQ)
-            self.emitter.emit(f"{self.curToken.text};")
-            self.match(TokenType.NUMBER)
-            self.match(TokenType.TO)
-            self.emitter.emitLine(
-                f"{ident} < {self.curToken.text}; {ident}++) " + "{")
-            self.match(TokenType.NUMBER)
-            self.nl()
+        self.match(TokenType.BRACKCLOSE)
+        self.match(TokenType.RETURNS)
+        function.dataType = self.dataType()
+        returnsType = self.csharp.dataType(function.dataType)
 
-            while not self.checkToken(TokenType.ENDFOR) and not self.checkToken(TokenType.NEXT):
-                self.statement()
+        self.emitter.emitLine(
+            f"public static {returnsType} {name}({parString}) " + "{")
 
-            self.nextToken()
-            if self.checkToken(TokenType.IDENT):
-                self.nextToken()
+    def endRoutineStatement(self):
+        self.nextToken()
+        self.emitter.emitLine("\t}")
+        self.emitter.isMethod = False
+        if not self.symbols.isGlobal():
+            self.symbols.leave()
+
+    def returnStatement(self):
+        self.nextToken()
+        self.emitter.emit("return ")
+        self.primary()
+        self.emitter.emitLine(";")
 
-            self.emitter.emitLine("}")
+    def callStatement(self):
+        self.nextToken()
+        while not self.checkToken(TokenType.NEWLINE):
+            self.emitToken()
 
-        # DECLARE ident: TYPE
-        elif self.checkToken(TokenType.DECLARE):
-            identString = ""
-            while not self.checkToken(TokenType.COLON):
-                self.nextToken()
-                ident = self.curToken.text
-                if ident in self.symbols:
-                    self.abort(f"{ident} is already delcared")
-                self.symbols.add(ident)
-                self.match(TokenType.IDENT)
-                identString += ident
-                if self.checkToken(TokenType.COMMA):
-                    identString += ','
+        self.emitter.emitLine(";")
 
-            self.match(TokenType.COLON)
+    def outputStatement(self):
+        self.nextToken()
+
+        if self.checkToken(TokenType.STRING):
             self.emitter.emitLine(
-                f"{self.typeConversion(self.curToken.text)} {identString};")
-            self.match(TokenType.IDENT)
+                f"_IO.WriteLine(\"{self.curToken.text}\");")
+            self.nextToken()
+        else:
+            # Not a simple string and there are expressions
+            self.emitter.emit("_IO.WriteLine(")
+            self.expression()
+            if self.checkToken(TokenType.BRACKCLOSE):
+                self.emitter.emit(")")
+                self.match(TokenType.BRACKCLOSE)
+            self.emitter.emitLine(");")
 
-        elif self.checkToken(TokenType.IDENT):
-            ident = self.curToken.text
-            if ident.split('[')[0] not in self.symbols:
-                self.abort(f"Identifier {self.curToken.text} not defined")
+    def elseStatement(self):
+        self.nextToken()
+        if self.checkToken(TokenType.IF):
             self.nextToken()
+            self.emitter.emit("} else if (")
+            self.comparison()
 
-            if self.checkToken(TokenType.BRACKOPEN):
-                self.emitter.emit(ident)
-                while not self.checkToken(TokenType.NEWLINE):
-                    self.emitter.emit(self.curToken.text)
-                    self.nextToken()
-            elif self.checkToken(TokenType.EQ):
-                self.match(TokenType.EQ)
-                self.emitter.emit(f"{ident} = ")
-                while not self.checkToken(TokenType.NEWLINE):
-                    self.expression()
+            while not self.checkToken(TokenType.THEN):
+                self.nextToken()
 
-            self.emitter.emitLine(";")
+            self.match(TokenType.THEN)
+            self.emitter.emitLine(") {")
+        else:
+            self.emitter.emitLine("} else {")
 
-        elif self.checkToken(TokenType.CONSTANT):
+    # DECLARE ident: TYPE
+    def declareStatement(self):
+        identString = ""
+        names = []
+        while not self.checkToken(TokenType.COLON):
             self.nextToken()
-            const = self.curToken.text
-            if const in self.symbols:
-                self.abort(f"Constant {self.curToken.text} is already defined")
+            ident = self.curToken.text
+            if self.symbols.declaredHere(ident):
+                self.abort(f"{ident} is already delcared")
+            names.append(self.symbols.declare(ident, "variable"))
+            self.match(TokenType.IDENT)
+            identString += ident
+            if self.checkToken(TokenType.COMMA):
+                identString += ','
+
+        self.match(TokenType.COLON)
+        if self.checkToken(TokenType.ARRAY):
+            # Arrays are allocated where they're declared.
+            dataType = self.dataType()
+            allocation = self.csharp.newArray(dataType)
+            for symbol in names:
+                symbol.dataType = dataType
+            self.emitter.emitLine(f"{self.csharp.dataType(dataType)} " + ", ".join(
+                f"{symbol.name} = {allocation}" for symbol in names) + ";")
+            return
+
+        for symbol in names:
+            symbol.dataType = self.curToken.text
+        self.emitter.emitLine(
+            f"{self.typeConversion(self.curToken.text)} {identString};")
+        self.match(TokenType.IDENT)
+
+    def assignStatement(self):
+        ident = self.curToken.text
+        if baseName(ident) not in self.symbols:
+            self.abort(f"Identifier {self.curToken.text} not defined")
+        self.nextToken()
 
-            self.symbols.add(const)
+        if self.checkToken(TokenType.BRACKOPEN):
+            self.emitter.emit(ident)
+            while not self.checkToken(TokenType.NEWLINE):
+                self.emitToken()
+        elif self.checkToken(TokenType.EQ):
+            self.match(TokenType.EQ)
+            self.emitter.emit(f"{self.variableText(ident)} = ")
+            while not self.checkToken(TokenType.NEWLINE):
+                self.expression()
 
-            self.match(TokenType.IDENT)
-            self.match(TokenType.EQEQ)
-            dataType = self.typeConversion(self.curToken.kind.name)
-            self.emitter.emit(f"const {dataType} {const} = ")
-            self.expression()
-            self.emitter.emitLine(";")
+        self.emitter.emitLine(";")
 
-        # "INPUT" ident
-        elif self.checkToken(TokenType.INPUT):
+    def constantStatement(self):
+        self.nextToken()
+        const = self.curToken.text
+        if self.symbols.declaredHere(const):
+            self.abort(f"Constant {self.curToken.text} is already defined")
+
+        self.match(TokenType.IDENT)
+        self.match(TokenType.EQEQ)
+        constType = constantType(self.curToken)
+        self.symbols.declare(const, "constant", constType)
+        dataType = self.typeConversion(constType)
+        self.emitter.emit(f"const {dataType} {const} = ")
+        if constType == "REAL" and self.checkPeek(TokenType.NEWLINE):
+            self.emitter.emit(f"{self.curToken.text}f")
             self.nextToken()
+        else:
+            self.expression()
+        self.emitter.emitLine(";")
 
-            # If variable doesn't already exist, declare it.
-            if self.curToken.text not in self.symbols:
-                self.symbols.add(self.curToken.text)
-                self.emitter.emitLine(f"string {self.curToken.text};")
+    # "INPUT" ident
+    def inputStatement(self):
+        self.nextToken()
 
-            self.emitter.emitLine("Console.Write(\"Input: \");")
-            self.emitter.emitLine(
-                f"{self.curToken.text} = Console.ReadLine();")
-            self.match(TokenType.IDENT)
-        else:
-            self.abort(
-                f"Invalid statement at '{self.curToken.text}' ({self.curToken.kind.name})")
+        # If variable doesn't already exist, declare it.
+        symbol = self.symbols.lookup(self.curToken.text)
+        if symbol is None:
+            symbol = self.symbols.declare(self.curToken.text, "variable", "STRING")
+            self.emitter.emitLine(f"string {self.curToken.text};")
 
-        # Must be a new line
-        self.nl()
+        self.emitter.emitLine(
+            f"{self.curToken.text} = {readInput(symbol.dataType)};")
+        self.match(TokenType.IDENT)
 
+    # Parser writes expressions out token by token, so precedence doesn't
+    # matter here, only which tokens may come next. Each level's loop used to
+    # call the next one down; since they only ever add operators, one loop over
+    # all of a level's operators accepts exactly the same expressions.
     def comparison(self):
-        self.expression()
-        while self.isComparisonOperator():
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-            self.expression()
+        self.operands(COMPARISON_OPERATORS)
 
     def expression(self):
-        self.term()
-        # For + - expressions
-        while self.checkToken(TokenType.PLUS) or self.checkToken(TokenType.MINUS) or self.checkToken(TokenType.BRACKOPEN):
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-            self.term()
+        self.operands(EXPRESSION_OPERATORS)
 
-    def term(self):
+    def operands(self, operators):
         self.unary()
-        # for * / expressions
-        while self.checkToken(TokenType.ASTERISK) or self.checkToken(TokenType.SLASH):
+        while self.curToken.kind in operators:
             self.emitter.emit(self.curToken.text)
             self.nextToken()
             self.unary()
 
     def unary(self):
-        if self.checkToken(TokenType.PLUS) or self.checkToken(TokenType.MINUS) or self.checkToken(TokenType.CONCAT):
+        if self.curToken.kind in PREFIX_OPERATORS:
             self.emitter.emit(self.curToken.text)
             self.nextToken()
         self.primary()
 
     def primary(self):
-        if self.checkToken(TokenType.NUMBER) or self.checkToken(TokenType.TRUE) or self.checkToken(TokenType.FALSE) or self.checkToken(TokenType.BRACKCLOSE) or self.checkToken(TokenType.COMMA):
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-        elif self.checkToken(TokenType.STRING):
-            self.emitter.emit(f"\"{self.curToken.text}\"")
-            self.nextToken()
-        elif self.checkToken(TokenType.CHAR):
-            self.emitter.emit(f"'{self.curToken.text}'")
+        token = self.curToken
+        form = OPERANDS.get(token.kind)
+        if form is not None:
+            self.emitter.emit(form.format(token.text))
             self.nextToken()
-        elif self.checkToken(TokenType.IDENT):
-            if self.curToken.text.split('[')[0] not in self.symbols and not self.checkPeek(TokenType.BRACKOPEN):
+        elif token.kind == TokenType.IDENT:
+            if baseName(token.text) not in self.symbols and not self.checkPeek(TokenType.BRACKOPEN):
                 self.abort(
-                    f"Referencing variable before assignment: {self.curToken.text}")
+                    f"Referencing variable before assignment: {token.text}")
 
-            self.emitter.emit(self.curToken.text)
+            self.emitter.emit(self.variableText(token.text))
             self.nextToken()
         else:
             self.abort(
-                f"Unexpected token at '{self.curToken.text}' ({self.curToken.kind.name})")
+                f"Unexpected token at '{token.text}' ({token.kind.name})")
+
+    # Writes the current token out as it is, but for the index of an indexed
+    # variable.
+    def emitToken(self):
+        if self.checkToken(TokenType.IDENT):
+            self.emitter.emit(self.variableText(self.curToken.text))
+        else:
+            self.emitter.emit(self.curToken.text)
+        self.nextToken()
+
+    # The C# for a variable, with its index counted from 0.
+    def variableText(self, text):
+        if '[' not in text:
+            return text
+        return self.csharp.expression(self.index(text))
+
+    # An indexed variable, "a[i]" or "a[i, j]", as an Index. The lexer hands it
+    # over as a single IDENT, so the indices are taken back out of it and
+    # parsed on their own. The lower bounds the array was declared with are
+    # taken off them here, folded into any whole number they add or take away.
+    def index(self, text):
+        bracket = text.index('[')
+        name = text[:bracket]
+        indexParser = IRParser(RegexLexer(text[bracket + 1: -1]), self.symbols)
+        indices = [indexParser.expression()]
+        while indexParser.checkToken(TokenType.COMMA):
+            indexParser.nextToken()
+            indices.append(indexParser.expression())
+        indexParser.match(TokenType.NEWLINE)
+
+        dataType = self.symbols.lookup(name).dataType
+        if isinstance(dataType, ArrayType):
+            if len(indices) != len(dataType.bounds):
+                self.abort(f"{name} has {len(dataType.bounds)} dimensions, not {len(indices)}")
+            lowers = [lower for lower, _ in dataType.bounds]
+        else:
+            # A string's characters count from 1.
+            lowers = [1] * len(indices)
+        return Index(name, [addOffset(index, -lower) for index, lower in zip(indices, lowers)])
+
+    # A type name, or "ARRAY[" bounds "]" "OF" type name as an ArrayType.
+    def dataType(self):
+        if self.checkToken(TokenType.ARRAY):
+            bounds = self.arrayBounds(self.curToken.text)
+            self.nextToken()
+            self.match(TokenType.OF)
+            if self.checkToken(TokenType.ARRAY):
+                self.abort("Arrays can't hold arrays, give the array more dimensions instead")
+            return ArrayType(bounds, self.dataType())
+        dataType = self.curToken.text
+        if dataType not in IR_TYPES:
+            self.abort(f"Undefined Type: ({dataType})")
+        self.nextToken()
+        return dataType
+
+    # The (lower, upper) bounds of each dimension of "ARRAY[lower:upper, ...]".
+    # Lower bounds have to be whole numbers, upper bounds can be any expression
+    # and are worked out when the array is declared. ARRAY[n] is ARRAY[1:n].
+    def arrayBounds(self, text):
+        boundsParser = IRParser(RegexLexer(text[text.index('[') + 1: -1]), self.symbols)
+        bounds = []
+        while True:
+            lower = 1
+            upper = boundsParser.expression()
+            if boundsParser.checkToken(TokenType.COLON):
+                boundsParser.nextToken()
+                lower = wholeNumber(upper)
+                if lower is None:
+                    self.abort(f"Array lower bounds must be whole numbers: {text}")
+                upper = boundsParser.expression()
+            extent = addOffset(upper, 1 - lower)
+            if isinstance(extent, Literal) and extent.value < 0:
+                self.abort(f"Array upper bound is below its lower bound: {text}")
+            bounds.append((lower, upper))
+            if not boundsParser.checkToken(TokenType.COMMA):
+                break
+            boundsParser.nextToken()
+        boundsParser.match(TokenType.NEWLINE)
+        return bounds
 
     def nl(self):
         self.match(TokenType.NEWLINE)
@@ -397,9 +514,654 @@ class Parser:
                 "STRING": "string", "BOOLEAN": "bool", "CHAR": "char", "NUMBER": "float"}
         if dataType in data:
             return data[dataType]
-        elif "ARRAY" in dataType:
-            self.match(TokenType.ARRAY)
-            self.match(TokenType.OF)
-            return self.typeConversion(self.curToken.text) + "[]"
         else:
             self.abort(f"Undefined Type: ({dataType})")
+
+    # The statements with bodies start generators, see statement.
+    BLOCKS = {
+        TokenType.IF: ifBlock,
+        TokenType.CASE: caseBlock,
+        TokenType.WHILE: whileBlock,
+        TokenType.REPEAT: repeatBlock,
+        TokenType.FOR: forBlock,
+    }
+
+    STATEMENTS = {
+        TokenType.PROCEDURE: procedureStatement,
+        TokenType.FUNCTION: functionStatement,
+        TokenType.ENDPROCEDURE: endRoutineStatement,
+        TokenType.ENDFUNCTION: endRoutineStatement,
+        TokenType.RETURN: returnStatement,
+        TokenType.CALL: callStatement,
+        TokenType.OUTPUT: outputStatement,
+        TokenType.ELSE: elseStatement,
+        TokenType.DECLARE: declareStatement,
+        TokenType.IDENT: assignStatement,
+        TokenType.CONSTANT: constantStatement,
+        TokenType.INPUT: inputStatement,
+    }
+
+
+# StackParser emits exactly what Parser does, but keeps the blocks it is inside
+# on a stack of its own instead of parsing each body with a recursive call, so
+# blocks can nest as deep as memory allows rather than as deep as Python's
+# recursion limit.
+class StackParser(Parser):
+    def statements(self):
+        blocks = []     # The blocks being parsed, innermost last
+        while True:
+            if blocks:
+                try:
+                    next(blocks[-1])
+                except StopIteration:
+                    blocks.pop()
+                    self.nl()
+                    continue
+            elif self.checkToken(TokenType.EOF):
+                break
+
+            self.statementCount += 1
+            block = self.block()
+            if block is not None:
+                blocks.append(block)
+            else:
+                self.simpleStatement()
+                self.nl()
+
+
+# RoutineParser emits exactly what Parser does, but parses the bodies of
+# top-level PROCEDUREs and FUNCTIONs apart from the main program. The lexer has
+# to be a TokenStream, which is scanned up front for where each routine starts
+# and ends (see routineSpans). The main program is parsed as usual; when it
+# reaches a routine it only declares the routine's name, with the same checks
+# Parser does, and skips to its end. The routine's tokens (see TokenSlice) are
+# queued along with the global names declared so far, and parsed in tasks of
+# ROUTINE_TASK_TOKENS tokens by runTask. The code is put together in source
+# order, and if anything failed to compile, the error is the one Parser would
+# have hit first.
+#
+# With a FragmentCache (see cache.py), a routine whose tokens and the global
+# names it mentions are unchanged since it was last compiled isn't parsed
+# again, its code is taken from the cache.
+class RoutineParser(Parser):
+    def __init__(self, stream, emitter, fragments=None):
+        self.spans = routineSpans(stream)
+        self.fragments = fragments
+        # (fragment keys to store the code under, the routines' [(code,
+        # statement count)] or a future of them), in source order
+        self.results = []
+        self.task = []          # (tokens, new global symbols) for the next task
+        self.taskKeys = []
+        self.taskGlobals = None  # the global scope as the task's first routine sees it
+        self.taskTokens = 0
+        self.globalCount = 0    # global symbols already sent with the task
+        super().__init__(stream, emitter)
+
+    def program(self):
+        try:
+            Parser.program(self)
+            error = None
+        except CompileError as mainError:
+            error = mainError
+        try:
+            self.sendTask()
+            # The routines were all before anything that went wrong here.
+            for keys, routines in self.results:
+                if not isinstance(routines, list):
+                    routines = routines.result()
+                for key, (code, statementCount) in zip(keys, routines):
+                    if key is not None:
+                        self.fragments.store(key, code, statementCount)
+                    self.emitter.methodCode.append(code)
+                    self.statementCount += statementCount
+        finally:
+            self.finish()
+        if self.fragments is not None:
+            self.fragments.evict()
+        if error is not None:
+            raise error
+
+    def routineStatement(self):
+        first = self.lexer.curIndex - 2     # curToken's index, peekToken is next
+        last = self.spans.get(first)
+        if last is None:
+            return Parser.STATEMENTS[self.curToken.kind](self)
+
+        scope = self.symbols.scopes[0]
+        key = None
+        cached = None
+        if self.fragments is not None:
+            key = self.fragmentKey(first, last, scope)
+            cached = self.fragments.lookup(key)
+        if cached is not None:
+            # Keep the routines in order: the queued ones go first.
+            self.sendTask()
+            self.results.append(([None], [cached]))
+        else:
+            if not self.task:
+                self.taskGlobals = dict(scope)
+                self.globalCount = len(scope)
+            # Only the names declared since the last routine in the task.
+            added = list(itertools.islice(reversed(scope.items()), len(scope) - self.globalCount))
+            added.reverse()
+            self.globalCount = len(scope)
+            self.task.append((TokenSlice(self.lexer, first, last), added))
+            self.taskKeys.append(key)
+            self.taskTokens += last - first + 1
+            if self.taskTokens >= ROUTINE_TASK_TOKENS:
+                self.sendTask()
+
+        isFunction = self.checkToken(TokenType.FUNCTION)
+        name = self.peekToken.text
+        if name in self.symbols:
+            self.abort(f"{'Function' if isFunction else 'Procedure'} name ({name}) already exists")
+        symbol = self.symbols.declareGlobal(name, "function" if isFunction else "procedure")
+        if isFunction:
+            returns = first
+            while self.lexer.kind(returns) != TokenType.RETURNS and returns < last:
+                returns += 1
+            symbol.dataType = self.lexer.text(returns + 1)
+
+        # The routine's statements are counted along with its body.
+        self.statementCount -= 1
+        # Carry on from the NEWLINE after ENDPROCEDURE or ENDFUNCTION.
+        self.lexer.curIndex = last + 1
+        self.nextToken()
+        self.nextToken()
+
+    # A routine's code only depends on its tokens and on what the global names
+    # it mentions are, or that they aren't declared yet.
+    def fragmentKey(self, first, last, scope):
+        texts = [self.lexer.text(index) for index in range(first, last + 1)]
+        ident = TokenType.IDENT.value
+        names = {baseName(text) for index, text in enumerate(texts, first)
+                 if self.lexer.kinds[index] == ident}
+        signatures = sorted(f"{name}={scope.get(name)!r}" for name in names)
+        return self.fragments.key(self.lexer.kinds[first:last + 1].tobytes(),
+                                  "\0".join(texts), "\0".join(signatures))
+
+    def sendTask(self):
+        if not self.task:
+            return
+        task, keys = self.task, self.taskKeys
+        self.task, self.taskKeys = [], []
+        self.taskTokens = 0
+        self.results.append((keys, self.runTask(self.taskGlobals, task)))
+
+    def runTask(self, globalScope, task):
+        return parseRoutines(globalScope, task)
+
+    def finish(self):
+        pass
+
+    STATEMENTS = dict(Parser.STATEMENTS)
+    STATEMENTS[TokenType.PROCEDURE] = routineStatement
+    STATEMENTS[TokenType.FUNCTION] = routineStatement
+
+
+# ParallelParser is a RoutineParser that parses the routines in a pool of jobs
+# worker processes while the main program is parsed here.
+class ParallelParser(RoutineParser):
+    def __init__(self, stream, emitter, jobs=None, fragments=None):
+        self.jobs = jobs
+        self.pool = None
+        super().__init__(stream, emitter, fragments)
+
+    def runTask(self, globalScope, task):
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.jobs)
+        return self.pool.submit(parseRoutines, globalScope, task)
+
+    def finish(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+# Tokens of routines parsed in one task, so each task sent to a worker is
+# worth sending.
+ROUTINE_TASK_TOKENS = 20000
+
+
+# The top-level routines in stream, as {first: last} token indices: first is
+# the PROCEDURE or FUNCTION starting a line, last the ENDPROCEDURE or
+# ENDFUNCTION that ends it. Parser doesn't nest routines, so if one starts
+# inside another none are returned and Parser's handling is kept for all.
+def routineSpans(stream):
+    starts = {TokenType.PROCEDURE.value, TokenType.FUNCTION.value}
+    ends = {TokenType.ENDPROCEDURE.value, TokenType.ENDFUNCTION.value}
+    newline = TokenType.NEWLINE.value
+    spans = {}
+    first = None
+    previous = newline
+    for index, kind in enumerate(stream.kinds):
+        if previous == newline:
+            if kind in starts:
+                if first is not None:
+                    return {}
+                first = index
+            elif kind in ends and first is not None:
+                spans[first] = index
+                first = None
+        previous = kind
+    return spans
+
+
+# Parses routines in order, each seeing the global names declared before it,
+# and returns the code and statement count of each. ParallelParser runs it in
+# a worker process.
+def parseRoutines(globalScope, routines):
+    results = []
+    for tokens, added in routines:
+        globalScope.update(added)
+        emitter = Emitter(None)
+        parser = Parser(tokens, emitter)
+        parser.symbols.scopes[0] = globalScope
+        parser.statements()
+        results.append(("".join(emitter.methodCode.chunks), parser.statementCount))
+    return results
+
+
+# IRParser checks the same grammar as Parser, but builds the intermediate
+# representation from ir.py instead of emitting C# as it goes.
+class IRParser(Parser):
+    def __init__(self, lexer, symbols=None):
+        super().__init__(lexer, None)
+        if symbols is not None:
+            self.symbols = symbols
+        self.depth = 0  # statements being parsed that the current one is inside
+
+    def program(self):
+        while self.checkToken(TokenType.NEWLINE):
+            self.nextToken()
+
+        statements = []
+        while not self.checkToken(TokenType.EOF):
+            statements.append(self.statement())
+        return Program(statements)
+
+    # Parses statements until one of the given tokens comes up.
+    def block(self, *endKinds):
+        statements = []
+        while self.curToken.kind not in endKinds:
+            if self.checkToken(TokenType.EOF):
+                self.abort(
+                    f"Expected ({endKinds[0].name}), got ({self.curToken.kind.name})")
+            statements.append(self.statement())
+        return statements
+
+    def statement(self):
+        self.statementCount += 1
+        line = self.curToken.line
+        handler = self.STATEMENTS.get(self.curToken.kind)
+        if handler is None:
+            self.abort(
+                f"Invalid statement at '{self.curToken.text}' ({self.curToken.kind.name})")
+        # The backends only have routines at the top level of the program.
+        if self.depth and self.curToken.kind in (TokenType.PROCEDURE, TokenType.FUNCTION):
+            self.abort(f"{self.curToken.text} can't be inside another statement")
+        self.depth += 1
+        node = handler(self)
+        self.depth -= 1
+
+        # Must be a new line
+        self.nl()
+        node.line = line
+        return node
+
+    def procedureStatement(self):
+        self.nextToken()
+        name = self.routineName("Procedure")
+        self.symbols.enter()
+        params = self.parameters()
+        self.nl()
+        node = Procedure(name, params, self.block(TokenType.ENDPROCEDURE))
+        self.symbols.leave()
+        self.nextToken()
+        return node
+
+    def functionStatement(self):
+        self.nextToken()
+        name = self.routineName("Function")
+        self.symbols.enter()
+        params = self.parameters()
+        self.match(TokenType.RETURNS)
+        returnType = self.dataType()
+        self.symbols.lookup(name).dataType = returnType
+        self.nl()
+        node = Function(name, params, returnType,
+                        self.block(TokenType.ENDFUNCTION))
+        self.symbols.leave()
+        self.nextToken()
+        return node
+
+    def returnStatement(self):
+        self.nextToken()
+        return Return(self.expression())
+
+    def callStatement(self):
+        self.nextToken()
+        name = self.curToken.text
+        self.match(TokenType.IDENT)
+        return CallStatement(Call(name, self.arguments()))
+
+    def outputStatement(self):
+        self.nextToken()
+        values = [self.expression()]
+        while self.checkToken(TokenType.COMMA):
+            self.nextToken()
+            values.append(self.expression())
+        return Output(values)
+
+    # "IF" comparison "THEN" code {"ELSE" ["IF" comparison "THEN"] code} "ENDIF"
+    def ifStatement(self):
+        self.nextToken()
+        branches = [Branch(self.condition(), None)]
+        elseBody = None
+        while True:
+            body = self.block(TokenType.ELSE, TokenType.ENDIF)
+            if elseBody is None:
+                branches[-1].body = body
+            else:
+                elseBody.extend(body)
+            if self.checkToken(TokenType.ENDIF):
+                break
+            if elseBody is not None:
+                self.abort("Unexpected ELSE after ELSE")
+            self.nextToken()
+            if self.checkToken(TokenType.IF):
+                self.nextToken()
+                branches.append(Branch(self.condition(), None))
+            else:
+                self.nl()
+                elseBody = []
+        self.match(TokenType.ENDIF)
+        return If(branches, elseBody)
+
+    def caseStatement(self):
+        self.nextToken()
+        self.match(TokenType.OF)
+        subject = self.expression()
+        self.nl()
+
+        branches = []
+        otherwise = None
+        while not self.checkToken(TokenType.ENDCASE):
+            if self.checkToken(TokenType.OTHERWISE):
+                self.nextToken()
+                otherwise = [self.statement()]
+            else:
+                value = self.expression()
+                self.match(TokenType.COLON)
+                branches.append(Branch(value, [self.statement()]))
+        self.match(TokenType.ENDCASE)
+        return Case(subject, branches, otherwise)
+
+    # "WHILE" comparison "DO" code "ENDWHILE"
+    def whileStatement(self):
+        self.nextToken()
+        condition = self.expression()
+        self.match(TokenType.DO)
+        self.nl()
+        node = While(condition, self.block(TokenType.ENDWHILE))
+        self.nextToken()
+        return node
+
+    def repeatStatement(self):
+        self.nextToken()
+        self.nl()
+        body = self.block(TokenType.UNTIL)
+        self.nextToken()
+        return Repeat(body, self.expression())
+
+    def forStatement(self):
+        self.nextToken()
+        var = self.curToken.text
+        declare = var not in self.symbols
+        if declare:
+            self.symbols.declare(var, "variable", "INTEGER")
+        self.match(TokenType.IDENT)
+        self.match(TokenType.EQ)
+        start = self.expression()
+        self.match(TokenType.TO)
+        end = self.expression()
+        self.nl()
+
+        body = self.block(TokenType.ENDFOR, TokenType.NEXT)
+        self.nextToken()
+        if self.checkToken(TokenType.IDENT):
+            self.nextToken()
+        # A counter that was never DECLAREd only exists inside its loop, as it
+        # does in the generated code, so the next loop declares it again.
+        if declare:
+            self.symbols.forget(var)
+        return For(var, start, end, body, declare)
+
+    # DECLARE ident: TYPE
+    def declareStatement(self):
+        names = []
+        while not self.checkToken(TokenType.COLON):
+            self.nextToken()
+            ident = self.curToken.text
+            if self.symbols.declaredHere(ident):
+                self.abort(f"{ident} is already delcared")
+            self.symbols.declare(ident, "variable")
+            self.match(TokenType.IDENT)
+            names.append(ident)
+
+        self.match(TokenType.COLON)
+        dataType = self.dataType()
+        for ident in names:
+            self.symbols.lookup(ident).dataType = dataType
+        return Declare(names, dataType)
+
+    def assignStatement(self):
+        ident = self.curToken.text
+        if baseName(ident) not in self.symbols:
+            self.abort(f"Identifier {self.curToken.text} not defined")
+        if self.checkPeek(TokenType.BRACKOPEN):
+            self.nextToken()
+            return CallStatement(Call(ident, self.arguments()))
+        target = self.variable()
+        self.match(TokenType.EQ)
+        return Assign(target, self.expression())
+
+    def constantStatement(self):
+        self.nextToken()
+        const = self.curToken.text
+        if self.symbols.declaredHere(const):
+            self.abort(f"Constant {self.curToken.text} is already defined")
+
+        self.match(TokenType.IDENT)
+        self.match(TokenType.EQEQ)
+        if self.curToken.kind.name not in ("NUMBER", "STRING", "CHAR"):
+            self.abort(f"Undefined Type: ({self.curToken.kind.name})")
+        dataType = constantType(self.curToken)
+        self.symbols.declare(const, "constant", dataType)
+        return Constant(const, dataType, self.expression())
+
+    # "INPUT" ident
+    def inputStatement(self):
+        self.nextToken()
+        name = self.curToken.text
+        symbol = self.symbols.lookup(name)
+        declare = symbol is None
+        if declare:
+            symbol = self.symbols.declare(name, "variable", "STRING")
+        self.match(TokenType.IDENT)
+        return Input(name, declare, symbol.dataType)
+
+    # Condition of an IF, THEN can be on the next line.
+    def condition(self):
+        condition = self.expression()
+        while self.checkToken(TokenType.NEWLINE):
+            self.nextToken()
+        self.match(TokenType.THEN)
+        self.nl()
+        return condition
+
+    def routineName(self, routine):
+        name = self.curToken.text
+        if name in self.symbols:
+            self.abort(f"{routine} name ({name}) already exists")
+        self.symbols.declareGlobal(name, routine.lower())
+        self.match(TokenType.IDENT)
+        return name
+
+    def parameters(self):
+        self.match(TokenType.BRACKOPEN)
+        params = []
+        while not self.checkToken(TokenType.BRACKCLOSE):
+            parName = self.curToken.text
+            self.match(TokenType.IDENT)
+            self.match(TokenType.COLON)
+            dataType = self.dataType()
+            self.symbols.declare(parName, "parameter", dataType)
+            params.append((parName, dataType))
+            if self.checkToken(TokenType.COMMA):
+                self.nextToken()
+        self.match(TokenType.BRACKCLOSE)
+        return params
+
+    def arguments(self):
+        args = []
+        if not self.checkToken(TokenType.BRACKOPEN):
+            return args
+        self.nextToken()
+        while not self.checkToken(TokenType.BRACKCLOSE):
+            args.append(self.expression())
+            if not self.checkToken(TokenType.BRACKCLOSE):
+                self.match(TokenType.COMMA)
+        self.nextToken()
+        return args
+
+    # A plain or indexed variable, see Parser.index.
+    def variable(self):
+        text = self.curToken.text
+        self.match(TokenType.IDENT)
+        if '[' not in text:
+            return Name(text)
+        return self.index(text)
+
+    # Binary operators are parsed by precedence climbing: the right operand of
+    # an operator takes in every following operator that binds tighter, so
+    # each operand costs one call whatever the precedence levels. Binding
+    # powers follow C#, so the generated code means the same as what Parser
+    # emits.
+    def expression(self, power=0):
+        left = self.unary()
+        while True:
+            operator = BINARY_OPERATORS.get(self.curToken.kind)
+            if operator is None or operator[0] <= power:
+                return left
+            self.nextToken()
+            left = Binary(operator[1], left, self.expression(operator[0]))
+
+    def unary(self):
+        if self.curToken.kind in UNARY_OPERATORS:
+            op = UNARY_OPERATORS[self.curToken.kind]
+            self.nextToken()
+            return Unary(op, self.unary())
+        return self.primary()
+
+    def primary(self):
+        token = self.curToken
+        kind = token.kind
+        if kind == TokenType.IDENT:
+            if self.checkPeek(TokenType.BRACKOPEN):
+                self.nextToken()
+                return Call(token.text, self.arguments())
+            if baseName(token.text) not in self.symbols:
+                self.abort(
+                    f"Referencing variable before assignment: {token.text}")
+            return self.variable()
+        elif kind == TokenType.NUMBER:
+            self.nextToken()
+            value = float(token.text) if '.' in token.text else int(token.text)
+            return Literal(value, kind)
+        elif kind == TokenType.STRING or kind == TokenType.CHAR:
+            self.nextToken()
+            return Literal(token.text, kind)
+        elif kind == TokenType.TRUE or kind == TokenType.FALSE:
+            self.nextToken()
+            return Literal(kind == TokenType.TRUE, kind)
+        elif kind == TokenType.BRACKOPEN:
+            self.nextToken()
+            node = self.expression()
+            self.match(TokenType.BRACKCLOSE)
+            return node
+        else:
+            self.abort(
+                f"Unexpected token at '{token.text}' ({kind.name})")
+
+    STATEMENTS = {
+        TokenType.PROCEDURE: procedureStatement,
+        TokenType.FUNCTION: functionStatement,
+        TokenType.RETURN: returnStatement,
+        TokenType.CALL: callStatement,
+        TokenType.OUTPUT: outputStatement,
+        TokenType.IF: ifStatement,
+        TokenType.CASE: caseStatement,
+        TokenType.WHILE: whileStatement,
+        TokenType.REPEAT: repeatStatement,
+        TokenType.FOR: forStatement,
+        TokenType.DECLARE: declareStatement,
+        TokenType.IDENT: assignStatement,
+        TokenType.CONSTANT: constantStatement,
+        TokenType.INPUT: inputStatement,
+    }
+
+
+# The variable an IDENT refers to, leaving out the index of an indexed one.
+def baseName(text):
+    bracket = text.find('[')
+    return text if bracket == -1 else text[:bracket]
+
+
+# The value of a whole number literal, or of one with a minus in front, or None.
+def wholeNumber(node):
+    if isinstance(node, Unary) and node.op == "-":
+        value = wholeNumber(node.operand)
+        return None if value is None else -value
+    if isinstance(node, Literal) and type(node.value) is int:
+        return node.value
+    return None
+
+
+# The type of a constant, from the literal it's given.
+def constantType(token):
+    if token.kind == TokenType.NUMBER:
+        return "REAL" if '.' in token.text else "INTEGER"
+    return token.kind.name
+
+
+IR_TYPES = {"INTEGER", "REAL", "STRING", "BOOLEAN", "CHAR", "NUMBER"}
+
+# Binary operators and their binding power, the higher the tighter. All of
+# them are left associative.
+BINARY_OPERATORS = {
+    TokenType.OR: (1, "OR"),
+    TokenType.AND: (2, "AND"),
+    TokenType.EQEQ: (3, "="), TokenType.NOTEQ: (3, "<>"),
+    TokenType.LT: (4, "<"), TokenType.LTEQ: (4, "<="), TokenType.GT: (4, ">"), TokenType.GTEQ: (4, ">="),
+    TokenType.PLUS: (5, "+"), TokenType.MINUS: (5, "-"), TokenType.CONCAT: (5, "&"),
+    TokenType.ASTERISK: (6, "*"), TokenType.SLASH: (6, "/"),
+}
+
+UNARY_OPERATORS = {TokenType.MINUS: "-",
+                   TokenType.PLUS: "+", TokenType.NOT: "NOT"}
+
+# What Parser lets through between operands. Parentheses are written out as
+# they come, an opening one like an operator and a closing one like an operand.
+EXPRESSION_OPERATORS = {TokenType.PLUS, TokenType.MINUS, TokenType.BRACKOPEN,
+                        TokenType.ASTERISK, TokenType.SLASH}
+COMPARISON_OPERATORS = EXPRESSION_OPERATORS | {
+    TokenType.GT, TokenType.GTEQ, TokenType.LT, TokenType.LTEQ, TokenType.EQEQ,
+    TokenType.NOTEQ, TokenType.AND, TokenType.OR, TokenType.NOT}
+PREFIX_OPERATORS = {TokenType.PLUS, TokenType.MINUS, TokenType.CONCAT}
+
+# How Parser writes out each kind of single token operand.
+OPERANDS = {
+    TokenType.NUMBER: "{}", TokenType.TRUE: "{}", TokenType.FALSE: "{}",
+    TokenType.BRACKCLOSE: "{}", TokenType.COMMA: "{}",
+    TokenType.STRING: "\"{}\"", TokenType.CHAR: "'{}'",
+}
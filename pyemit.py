@@ -0,0 +1,370 @@
+import ast
+import re
+from ir import *
+from lex import TokenType
+from optimize import assignedNames
+from pyruntime import _f32
+
+# PythonGenerator lowers a program in intermediate representation to a Python
+# ast.Module that prints exactly what the C# from CSharpGenerator prints, so it
+# can be run in-process by pyruntime.run without going through csc. Values keep
+# their C# types: REAL is rounded to a 32-bit float after every operation, int
+# arithmetic wraps at 32 bits and numbers are formatted the way .NET does it.
+
+
+def name(identifier, store=False):
+    return ast.Name(id=identifier, ctx=ast.Store() if store else ast.Load())
+
+
+def call(function, *args):
+    return ast.Call(func=name(function), args=list(args), keywords=[])
+
+
+def constant(value):
+    return ast.Constant(value=value)
+
+
+def assign(target, value):
+    return ast.Assign(targets=[target], value=value)
+
+
+def wrapInt(node):
+    # (value + 2**31 & 2**32 - 1) - 2**31 keeps it in C#'s int range.
+    shifted = ast.BinOp(node, ast.Add(), constant(2147483648))
+    masked = ast.BinOp(shifted, ast.BitAnd(), constant(4294967295))
+    return ast.BinOp(masked, ast.Sub(), constant(2147483648))
+
+
+def function(functionName, params, body):
+    node = ast.FunctionDef(
+        name=functionName,
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=param) for param in params],
+                           vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None,
+                           defaults=[]),
+        body=body or [ast.Pass()], decorator_list=[], returns=None)
+    if "type_params" in ast.FunctionDef._fields:
+        node.type_params = []
+    return node
+
+
+CSHARP_ESCAPES = {"'": "'", '"': '"', "\\": "\\", "0": "\0", "a": "\a", "b": "\b",
+                  "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+CSHARP_ESCAPE_REGEX = re.compile(
+    r"\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|x[0-9a-fA-F]{1,4}|.)", re.DOTALL)
+
+
+# String literals are passed to C# as written, so their escapes are C#'s.
+def unescape(text):
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in "uUx" and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return CSHARP_ESCAPES.get(escape, escape)
+    return CSHARP_ESCAPE_REGEX.sub(replace, text)
+
+
+DEFAULTS = {"INTEGER": 0, "REAL": 0.0, "NUMBER": 0.0, "double": 0.0, "STRING": "",
+            "BOOLEAN": False, "CHAR": "\0"}
+
+ARITHMETIC = {"+": ast.Add, "&": ast.Add, "-": ast.Sub, "*": ast.Mult}
+COMPARISONS = {"=": ast.Eq, "<>": ast.NotEq, "<": ast.Lt, "<=": ast.LtE,
+               ">": ast.Gt, ">=": ast.GtE}
+INPUT_PARSERS = {"INTEGER": "_parseInt", "REAL": "_parseFloat", "NUMBER": "_parseFloat",
+                 "BOOLEAN": "_parseBool", "CHAR": "_parseChar"}
+FORMATTERS = {"INTEGER": "str", "REAL": "_formatFloat", "double": "_formatDouble",
+              "BOOLEAN": "_formatBool"}
+
+
+class PythonGenerator:
+    def __init__(self):
+        self.routines = {}  # name -> (params, return type)
+        self.types = {}     # variable types in the routine being generated
+        self.returnType = None
+        self.count = 0
+
+    def program(self, program):
+        for statement in program.statements:
+            if isinstance(statement, (Procedure, Function)):
+                returnType = getattr(statement, "returnType", None)
+                self.routines[statement.name] = (statement.params, returnType)
+
+        body = []
+        mainBody = []
+        mainTypes = {}
+        for statement in program.statements:
+            if isinstance(statement, (Procedure, Function)):
+                body.append(self.routine(statement))
+            else:
+                self.types = mainTypes
+                self.returnType = None
+                mainBody.extend(self.statement(statement))
+
+        body.append(function("_main", [], mainBody))
+        body.append(ast.Expr(call("_main")))
+        return ast.fix_missing_locations(ast.Module(body=body, type_ignores=[]))
+
+    def routine(self, node):
+        self.types = {}
+        for paramName, dataType in node.params:
+            self.types[paramName] = self.normalType(dataType)
+        self.returnType = getattr(node, "returnType", None)
+        return function("u_" + node.name, ["u_" + paramName for paramName, _ in node.params],
+                        self.block(node.body))
+
+    def block(self, statements):
+        result = []
+        for statement in statements:
+            result.extend(self.statement(statement))
+        return result
+
+    def statement(self, node):
+        return getattr(self, "statement" + type(node).__name__)(node)
+
+    def newName(self, prefix):
+        self.count += 1
+        return f"_{prefix}{self.count}"
+
+    def normalType(self, dataType):
+        return "REAL" if dataType == "NUMBER" else dataType
+
+    def variable(self, identifier, store=False):
+        return name("u_" + identifier, store)
+
+    def statementReturn(self, node):
+        value, valueType = self.expression(node.value)
+        if self.returnType is not None:
+            value = self.convert(value, valueType, self.normalType(self.returnType))
+        return [ast.Return(value=value)]
+
+    def statementCallStatement(self, node):
+        return [ast.Expr(self.expression(node.call)[0])]
+
+    def statementOutput(self, node):
+        text = None
+        for value in node.values:
+            part = self.text(*self.expression(value))
+            text = part if text is None else ast.BinOp(text, ast.Add(), part)
+        return [ast.Expr(call("print", text))]
+
+    def statementInput(self, node):
+        if node.declare:
+            self.types[node.name] = "STRING"
+        value = call("_input")
+        if node.dataType in INPUT_PARSERS:
+            value = call(INPUT_PARSERS[node.dataType], value)
+        return [assign(self.variable(node.name, True), value)]
+
+    def statementDeclare(self, node):
+        dataType = self.normalType(node.dataType)
+        result = []
+        for identifier in node.names:
+            self.types[identifier] = dataType
+            result.append(assign(self.variable(identifier, True), self.default(dataType)))
+        return result
+
+    def statementConstant(self, node):
+        dataType = self.normalType(node.dataType)
+        self.types[node.name] = dataType
+        value, valueType = self.expression(node.value)
+        return [assign(self.variable(node.name, True), self.convert(value, valueType, dataType))]
+
+    def statementAssign(self, node):
+        target, targetType = self.expression(node.target)
+        target.ctx = ast.Store()
+        value, valueType = self.expression(node.value)
+        return [assign(target, self.convert(value, valueType, targetType))]
+
+    def statementLet(self, node):
+        value, valueType = self.expression(node.value)
+        self.types[node.name] = valueType
+        return [assign(self.variable(node.name, True), value)]
+
+    def statementIf(self, node):
+        orelse = self.block(node.elseBody) if node.elseBody is not None else []
+        for branch in reversed(node.branches):
+            test = self.expression(branch.condition)[0]
+            orelse = [ast.If(test=test, body=self.block(branch.body) or [ast.Pass()],
+                             orelse=orelse)]
+        return orelse
+
+    def statementCase(self, node):
+        subject, subjectType = self.expression(node.subject)
+        temp = self.newName("case")
+        self.types[temp] = subjectType
+        orelse = self.block(node.otherwise) if node.otherwise is not None else []
+        for branch in reversed(node.branches):
+            test = self.expression(Binary("=", Name(temp), branch.condition))[0]
+            orelse = [ast.If(test=test, body=self.block(branch.body) or [ast.Pass()],
+                             orelse=orelse)]
+        return [assign(self.variable(temp, True), subject)] + orelse
+
+    def statementWhile(self, node):
+        return [ast.While(test=self.expression(node.condition)[0],
+                          body=self.block(node.body) or [ast.Pass()], orelse=[])]
+
+    def statementRepeat(self, node):
+        body = self.block(node.body)
+        body.append(ast.If(test=self.expression(node.condition)[0],
+                           body=[ast.Break()], orelse=[]))
+        return [ast.While(test=constant(True), body=body, orelse=[])]
+
+    def statementFor(self, node):
+        self.types[node.var] = "INTEGER"
+        start = self.convert(*self.expression(node.start), "INTEGER")
+        end = self.convert(*self.expression(node.end), "INTEGER")
+        body = self.block(node.body)
+
+        # range() is only the same as the C# for loop when the body can't
+        # change the counter or the end value, and the counter isn't used
+        # after the loop.
+        assigned = assignedNames(Program(node.body))
+        stableEnd = all(not isinstance(child, (Call, Index)) and
+                        not (isinstance(child, Name) and child.name in assigned | {node.var})
+                        for child in walk(node.end))
+        if node.declare and node.var not in assigned and stableEnd:
+            return [ast.For(target=self.variable(node.var, True),
+                            iter=call("range", start, end),
+                            body=body or [ast.Pass()], orelse=[])]
+
+        counter = self.variable(node.var)
+        test = ast.Compare(left=counter, ops=[ast.Lt()], comparators=[end])
+        step = assign(self.variable(node.var, True),
+                      wrapInt(ast.BinOp(self.variable(node.var), ast.Add(), constant(1))))
+        return [assign(self.variable(node.var, True), start),
+                ast.While(test=test, body=body + [step], orelse=[])]
+
+    # Python threads can't run at the same time, so parallel loops don't run
+    # in parallel.
+    def statementParallelFor(self, node):
+        return self.statementFor(node.loop)
+
+    # An array is a list, with a list for each row when it has more than one
+    # dimension.
+    def default(self, dataType):
+        if isinstance(dataType, ArrayType):
+            value = self.default(self.normalType(dataType.elementType))
+            for position, extent in enumerate(reversed(dataType.extents())):
+                size = self.convert(*self.expression(extent), "INTEGER")
+                if position == 0:
+                    value = ast.BinOp(ast.List(elts=[value], ctx=ast.Load()), ast.Mult(), size)
+                else:
+                    loop = ast.comprehension(target=ast.Name(id="_", ctx=ast.Store()),
+                                             iter=call("range", size), ifs=[], is_async=0)
+                    value = ast.ListComp(elt=value, generators=[loop])
+            return value
+        return constant(DEFAULTS[dataType])
+
+    # Applies the implicit conversion C# does when assigning to dataType.
+    def convert(self, node, fromType, toType):
+        if fromType == toType or isinstance(toType, ArrayType):
+            return node
+        if fromType == "CHAR" and toType in ("INTEGER", "REAL", "double"):
+            node = call("ord", node)
+        if toType == "REAL":
+            if isinstance(node, ast.Constant):
+                return constant(_f32(node.value))
+            return call("_f32", node)
+        return node
+
+    # The string C# gets when a value of this type is printed or concatenated.
+    def text(self, node, valueType):
+        if valueType in FORMATTERS:
+            return call(FORMATTERS[valueType], node)
+        return node
+
+    def numeric(self, node, valueType):
+        if valueType == "CHAR":
+            return call("ord", node), "INTEGER"
+        return node, valueType
+
+    # Returns the Python for an expression along with its C# type.
+    def expression(self, node):
+        if isinstance(node, Literal):
+            if node.kind == TokenType.NUMBER:
+                return constant(node.value), "double" if isinstance(node.value, float) else "INTEGER"
+            if node.kind == TokenType.STRING:
+                return constant(unescape(node.value)), "STRING"
+            if node.kind == TokenType.CHAR:
+                return constant(node.value), "CHAR"
+            return constant(node.value), "BOOLEAN"
+
+        if isinstance(node, Name):
+            return self.variable(node.name), self.types.get(node.name, "INTEGER")
+
+        if isinstance(node, Index):
+            value = self.variable(node.name)
+            valueType = self.types.get(node.name)
+            for index in node.indices:
+                # A whole number the optimizer folded the index into can't be negative.
+                folded = isinstance(index, Literal) and type(index.value) is int and index.value >= 0
+                index = self.convert(*self.expression(index), "INTEGER")
+                if not folded:
+                    index = call("_checkIndex", index)
+                value = ast.Subscript(value=value, slice=index, ctx=ast.Load())
+                if isinstance(valueType, ArrayType):
+                    valueType = self.normalType(valueType.elementType)
+            return value, valueType
+
+        if isinstance(node, Call):
+            params, returnType = self.routines.get(node.name, ([], None))
+            args = []
+            for position, arg in enumerate(node.args):
+                value, valueType = self.expression(arg)
+                if position < len(params):
+                    value = self.convert(value, valueType, self.normalType(params[position][1]))
+                args.append(value)
+            return call("u_" + node.name, *args), self.normalType(returnType)
+
+        if isinstance(node, Unary):
+            operand, operandType = self.expression(node.operand)
+            if node.op == "NOT":
+                return ast.UnaryOp(ast.Not(), operand), "BOOLEAN"
+            operand, operandType = self.numeric(operand, operandType)
+            if node.op == "+":
+                return operand, operandType
+            negated = ast.UnaryOp(ast.USub(), operand)
+            return (wrapInt(negated) if operandType == "INTEGER" else negated), operandType
+
+        left, leftType = self.expression(node.left)
+        right, rightType = self.expression(node.right)
+        op = node.op
+
+        if op in ("AND", "OR"):
+            boolOp = ast.And() if op == "AND" else ast.Or()
+            return ast.BoolOp(op=boolOp, values=[left, right]), "BOOLEAN"
+
+        if op in COMPARISONS:
+            if not (leftType == rightType == "CHAR"):
+                left, leftType = self.numeric(left, leftType)
+                right, rightType = self.numeric(right, rightType)
+            # C# compares an int with a float as two floats.
+            if "REAL" in (leftType, rightType) and "double" not in (leftType, rightType):
+                left = self.convert(left, leftType, "REAL")
+                right = self.convert(right, rightType, "REAL")
+            return ast.Compare(left=left, ops=[COMPARISONS[op]()], comparators=[right]), "BOOLEAN"
+
+        if op in ("+", "&") and "STRING" in (leftType, rightType):
+            return ast.BinOp(self.text(left, leftType), ast.Add(), self.text(right, rightType)), "STRING"
+
+        left, leftType = self.numeric(left, leftType)
+        right, rightType = self.numeric(right, rightType)
+        if "double" in (leftType, rightType):
+            resultType = "double"
+        elif "REAL" in (leftType, rightType):
+            resultType = "REAL"
+            left = self.convert(left, leftType, "REAL")
+            right = self.convert(right, rightType, "REAL")
+        else:
+            resultType = "INTEGER"
+
+        if op == "/":
+            if resultType == "INTEGER":
+                return call("_idiv", left, right), resultType
+            result = call("_fdiv", left, right)
+        else:
+            result = ast.BinOp(left, ARITHMETIC[op](), right)
+            if resultType == "INTEGER":
+                return wrapInt(result), resultType
+        if resultType == "REAL":
+            result = call("_f32", result)
+        return result, resultType
@@ -0,0 +1,187 @@
+import marshal
+import re
+import struct
+import sys
+from decimal import Decimal
+
+# Helpers the code generated by PythonGenerator calls into. They reproduce the
+# C# behaviour the other backend gets for free: 32-bit float rounding,
+# truncating integer division and .NET's invariant culture number formatting.
+
+_float32 = struct.Struct('f')
+
+
+def _f32(value):
+    return _float32.unpack(_float32.pack(value))[0]
+
+
+def _idiv(left, right):
+    quotient = abs(left) // abs(right)
+    if (left < 0) != (right < 0):
+        quotient = -quotient
+    return (quotient + 2147483648 & 4294967295) - 2147483648
+
+
+# A negative index would count from the end of the list, where C# throws.
+# Indices past the end already raise IndexError.
+def _checkIndex(index):
+    if index < 0:
+        raise IndexError("Index was outside the bounds of the array.")
+    return index
+
+
+def _fdiv(left, right):
+    if right == 0:
+        if left == 0 or left != left:
+            return float("nan")
+        negative = (left < 0) != (str(right)[0] == '-')
+        return float("-inf") if negative else float("inf")
+    return left / right
+
+
+# Shortest digits that round-trip, laid out the way .NET's default ToString()
+# does: scientific notation outside -5 < exponent < precision.
+def _formatDigits(digits, exponent, negative, precision):
+    text = "-" if negative else ""
+    if -5 < exponent < precision:
+        if exponent < 0:
+            return text + "0." + "0" * (-exponent - 1) + digits
+        if len(digits) <= exponent + 1:
+            return text + digits + "0" * (exponent + 1 - len(digits))
+        return text + digits[:exponent + 1] + "." + digits[exponent + 1:]
+    mantissa = digits[0] + ("." + digits[1:] if len(digits) > 1 else "")
+    sign = "-" if exponent < 0 else "+"
+    return f"{text}{mantissa}E{sign}{abs(exponent):02d}"
+
+
+def _formatSpecial(value):
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    return None
+
+
+def _formatDouble(value):
+    special = _formatSpecial(value)
+    if special is not None:
+        return special
+    if value == 0:
+        return "-0" if str(value)[0] == '-' else "0"
+    return _formatDecimal(repr(value), 17)
+
+
+def _formatFloat(value):
+    special = _formatSpecial(value)
+    if special is not None:
+        return special
+    if value == 0:
+        return "-0" if str(value)[0] == '-' else "0"
+    for digits in range(9):
+        text = f"{value:.{digits}e}"
+        if _f32(float(text)) == value:
+            return _formatDecimal(text, 9)
+    return _formatDecimal(f"{value:.8e}", 9)
+
+
+def _formatDecimal(text, precision):
+    sign, digits, exponent = Decimal(text).normalize().as_tuple()
+    digits = "".join(map(str, digits))
+    return _formatDigits(digits, exponent + len(digits) - 1, sign == 1, precision)
+
+
+def _formatBool(value):
+    return "True" if value else "False"
+
+
+def _input():
+    sys.stdout.write("Input: ")
+    sys.stdout.flush()
+    return _readLine()
+
+
+# _input without the prompt, for runCode(code, prompt=False).
+def _readLine():
+    line = sys.stdin.readline()
+    if line.endswith('\n'):
+        line = line[:-1]
+    return line[:-1] if line.endswith('\r') else line
+
+
+# Reading a typed value from a line of input, the way int.Parse, float.Parse,
+# bool.Parse and char.Parse do in the invariant culture.
+_WHITESPACE = " \t\n\v\f\r"
+_intPattern = re.compile(r"[+-]?[0-9]+")
+_floatPattern = re.compile(r"[+-]?(?:[0-9][0-9,]*\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?")
+_FORMAT_ERROR = "The input string was not in a correct format."
+
+
+def _parseInt(text):
+    text = text.strip(_WHITESPACE)
+    if not _intPattern.fullmatch(text):
+        raise ValueError(_FORMAT_ERROR)
+    value = int(text)
+    if not -2**31 <= value < 2**31:
+        raise OverflowError("Value was either too large or too small for an Int32.")
+    return value
+
+
+def _parseFloat(text):
+    text = text.strip(_WHITESPACE)
+    if text.lower().lstrip("+-") in ("infinity", "nan"):
+        value = float(text)
+    elif _floatPattern.fullmatch(text):
+        value = float(text.replace(",", ""))
+    else:
+        raise ValueError(_FORMAT_ERROR)
+    try:
+        return _f32(value)
+    except OverflowError:
+        return float("inf") if value > 0 else float("-inf")
+
+
+def _parseBool(text):
+    text = text.strip(_WHITESPACE + "\0").lower()
+    if text not in ("true", "false"):
+        raise ValueError("String was not recognized as a valid Boolean.")
+    return text == "true"
+
+
+def _parseChar(text):
+    if len(text) != 1:
+        raise ValueError("String must be exactly one character long.")
+    return text
+
+
+HELPERS = ("_f32", "_idiv", "_checkIndex", "_fdiv", "_formatDouble",
+           "_formatFloat", "_formatBool", "_input", "_parseInt", "_parseFloat",
+           "_parseBool", "_parseChar")
+
+
+def compileModule(module, filename="<pseudocode>"):
+    return compile(module, filename, 'exec')
+
+
+# Compiles and runs a module built by PythonGenerator in this process.
+def run(module, filename="<pseudocode>", prompt=True):
+    runCode(compileModule(module, filename), prompt)
+
+
+def runCode(code, prompt=True):
+    namespace = {name: globals()[name] for name in HELPERS}
+    if not prompt:
+        namespace["_input"] = _readLine
+    namespace["__name__"] = "__pseudocode__"
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 100000))
+    try:
+        exec(code, namespace)
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+# python pyruntime.py program.pyc runs code saved with marshal in a process of
+# its own, without prompting for input (see judge.py).
+if __name__ == "__main__":
+    with open(sys.argv[1], 'rb') as codeFile:
+        runCode(marshal.load(codeFile), prompt=False)
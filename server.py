@@ -0,0 +1,140 @@
+from compiler import compileSource
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+# The compile server keeps the compiler loaded and answers requests on a Unix
+# domain socket, so callers don't pay for starting Python and importing it on
+# every compile. Each request and response is one line of JSON:
+#
+#   {"source": "...", "backend": "cs", "optimize": false, "prompt": true}
+#   {"ok": true, "code": "...", "elapsed": 412}
+#   {"ok": false, "error": {"kind": "Parse Error", "message": "...", "line": 3}, "elapsed": 95}
+#
+# line is null when the error isn't tied to a line. elapsed is the time the
+# compile took in microseconds. A connection can send any number of requests,
+# and each connection is served on its own thread.
+#
+# At most -j compiles run at once, and a request that isn't answered
+# within --timeout seconds gets a "Timeout" error instead. A thread can't be
+# stopped from outside, so a compile that never finishes keeps its worker:
+# once every worker is taken, each request times out.
+
+DEFAULT_TIMEOUT = 10.0
+
+
+def defaultSocket():
+    return os.environ.get("PSEUDO_SOCKET") or os.path.join(
+        tempfile.gettempdir(), f"pseudocompyler-{os.getuid()}.sock")
+
+
+def handleRequest(request):
+    start = time.perf_counter()
+    try:
+        result = compileSource(request["source"], request.get("backend", "cs"),
+                               request.get("optimize", False), request.get("prompt", True))
+        if result.ok:
+            response = {"ok": True, "code": result.code}
+        else:
+            response = {"ok": False, "error": result.diagnostics[0].toDict()}
+    except Exception as error:
+        response = {"ok": False, "error": {"kind": "Internal Error",
+                                           "message": f"{type(error).__name__}: {error}"}}
+    response["elapsed"] = round((time.perf_counter() - start) * 1e6)
+    return response
+
+
+class CompileHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.compile(json.loads(line))
+            except (ValueError, KeyError, TypeError) as error:
+                response = {"ok": False, "error": {"kind": "Bad Request", "message": str(error)}}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class CompileServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, workers, timeout):
+        super().__init__(path, CompileHandler)
+        self.workers = threading.BoundedSemaphore(workers)
+        self.timeout = timeout
+
+    # Runs handleRequest on a thread of its own, waiting at most timeout
+    # seconds for a worker and for it to finish.
+    def compile(self, request):
+        start = time.perf_counter()
+        if not self.workers.acquire(timeout=self.timeout):
+            return self.timedOut(start)
+        response = {}
+
+        def work():
+            try:
+                response.update(handleRequest(request))
+            finally:
+                self.workers.release()
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        worker.join(max(0, self.timeout - (time.perf_counter() - start)))
+        return response if not worker.is_alive() else self.timedOut(start)
+
+    def timedOut(self, start):
+        return {"ok": False, "error": {"kind": "Timeout", "line": None,
+                                       "message": f"Compiling took longer than {self.timeout:g}s"},
+                "elapsed": round((time.perf_counter() - start) * 1e6)}
+
+
+# Whether a server is answering on path. A socket nothing is listening on
+# refuses the connection.
+def isServing(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(path)
+        except ConnectionRefusedError:
+            return False
+    return True
+
+
+def serve(path, workers=None, timeout=DEFAULT_TIMEOUT):
+    if os.path.exists(path):
+        if isServing(path):
+            sys.exit("{color}Error\nA compile server is already listening on {path}{end}".format(
+                color="\033[91m", end="\033[0m", path=path))
+        # A socket left behind by a server that didn't shut down cleanly.
+        os.unlink(path)
+    with CompileServer(path, workers or os.cpu_count() or 1, timeout) as server:
+        print("{color}Listening on {path}{end}".format(
+            color="\033[94m", end="\033[0m", path=path))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def main():
+    argParser = argparse.ArgumentParser(
+        description="Serve compile requests over a Unix domain socket")
+    argParser.add_argument("--socket", default=defaultSocket(),
+                           help="path of the socket (default $PSEUDO_SOCKET or a per-user path in the temp directory)")
+    argParser.add_argument("-j", "--jobs", type=int, default=None,
+                           help="most compiles at once (default: one per CPU)")
+    argParser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                           help=f"seconds before a request is answered with a Timeout error (default {DEFAULT_TIMEOUT:g})")
+    args = argParser.parse_args()
+    serve(args.socket, args.jobs, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+import sys
+import time
+import tracemalloc
+
+# Stats records how long each phase of a compile takes and, with memory=True,
+# the most memory it allocated on top of what was in use when it started. The
+# memory is traced with tracemalloc, which slows everything down, so the times
+# are only comparable with other runs that traced memory too. tracemalloc only
+# sees this process, so phases that run another program (csc, cc or the
+# compiled program) have no memory figure.
+
+
+class Stats:
+    def __init__(self, memory=False):
+        self.phases = []    # (name, seconds, peak bytes or None)
+        self.counts = {}
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Runs function, records it as the phase name and returns its result.
+    def time(self, name, function, *args):
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - before if self.memory else None
+            self.phases.append((name, elapsed, peak))
+
+    # Like time, for a function that runs another program and waits for it.
+    def timeProcess(self, name, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.phases.append((name, time.perf_counter() - start, None))
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def seconds(self, *names):
+        return sum(elapsed for name, elapsed, _ in self.phases if name in names)
+
+    # Things per second of the first of the phases that took any time.
+    def rate(self, count, *names):
+        for name in names:
+            seconds = self.seconds(name)
+            if seconds > 0:
+                return count / seconds
+        return None
+
+    def report(self):
+        report = {
+            "phases": [{"name": name, "seconds": elapsed, "peakBytes": peak}
+                       for name, elapsed, peak in self.phases],
+            "total": self.seconds(*(name for name, _, _ in self.phases)),
+        }
+        report.update(self.counts)
+        if "tokens" in self.counts:
+            report["tokensPerSecond"] = self.rate(self.counts["tokens"], "lex", "parse", "parse+emit")
+        if "statements" in self.counts:
+            report["statementsPerSecond"] = self.rate(self.counts["statements"], "parse", "parse+emit")
+        return report
+
+    # One line, as watch mode prints after every rebuild.
+    def __str__(self):
+        parts = [f"{name} {elapsed * 1000:.1f}ms" for name, elapsed, _ in self.phases]
+        total = sum(elapsed for _, elapsed, _ in self.phases)
+        text = f"{', '.join(parts)} (total {total * 1000:.1f}ms)"
+        if "fragmentHits" in self.counts:
+            text += (f", {self.counts['fragmentHits']} of "
+                     f"{self.counts['fragmentHits'] + self.counts['fragmentMisses']} routines reused")
+        return text
+
+    def table(self):
+        lines = [f"{'Phase':<12}{'Time (ms)':>12}{'Peak memory':>16}"]
+        for name, elapsed, peak in self.phases:
+            if peak is not None:
+                memory = formatBytes(peak)
+            else:
+                memory = "n/a" if self.memory else ""
+            lines.append(f"{name:<12}{elapsed * 1000:>12.2f}{memory:>16}")
+        report = self.report()
+        lines.append(f"{'total':<12}{report['total'] * 1000:>12.2f}")
+        for name in ("tokens", "statements"):
+            if name in report:
+                rate = report[f"{name}PerSecond"]
+                rate = f" ({rate:,.0f}/sec)" if rate is not None else ""
+                lines.append(f"{name}: {report[name]:,}{rate}")
+        if "outputBytes" in report:
+            lines.append(f"output: {formatBytes(report['outputBytes'])}")
+        if "fragmentHits" in report:
+            lines.append(f"routines reused: {report['fragmentHits']:,} of "
+                         f"{report['fragmentHits'] + report['fragmentMisses']:,}")
+        return "\n".join(lines)
+
+    # Writes the report to standard error, as a table or as JSON on one line.
+    def write(self, format="text", file=None):
+        file = file or sys.stderr
+        if format == "json":
+            file.write(json.dumps(self.report()) + "\n")
+        else:
+            file.write("\n" + self.table() + "\n")
+
+
+def formatBytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
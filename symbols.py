@@ -0,0 +1,61 @@
+import sys
+
+# SymbolTable keeps what the parsers know about each name: what kind of thing
+# it is and its declared type. Names live in a stack of scopes, the global one
+# (the main program) and one for the PROCEDURE or FUNCTION being parsed, and a
+# lookup checks the innermost scope first. Names are interned when declared.
+
+
+class Symbol:
+    __slots__ = ("name", "kind", "dataType")
+
+    def __init__(self, name, kind, dataType=None):
+        self.name = name
+        self.kind = kind            # "variable", "constant", "parameter", "procedure" or "function"
+        self.dataType = dataType    # pseudocode type name, ArrayType, or None if unknown
+
+    def __repr__(self):
+        return f"Symbol({self.name!r}, {self.kind!r}, {self.dataType!r})"
+
+
+class SymbolTable:
+    def __init__(self):
+        self.scopes = [{}]
+
+    def enter(self):
+        self.scopes.append({})
+
+    def leave(self):
+        self.scopes.pop()
+
+    def isGlobal(self):
+        return len(self.scopes) == 1
+
+    def declare(self, name, kind, dataType=None, scope=-1):
+        name = sys.intern(name)
+        symbol = Symbol(name, kind, dataType)
+        self.scopes[scope][name] = symbol
+        return symbol
+
+    # Takes back a name declared in the innermost scope.
+    def forget(self, name):
+        del self.scopes[-1][name]
+
+    # Declares a routine, which is always global.
+    def declareGlobal(self, name, kind, dataType=None):
+        return self.declare(name, kind, dataType, 0)
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        return None
+
+    # True if name is declared in the innermost scope, where declaring it
+    # again would clash.
+    def declaredHere(self, name):
+        return name in self.scopes[-1]
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
@@ -0,0 +1,159 @@
+from lex import *
+from emit import *
+from parse import *
+from optimize import *
+from pyemit import PythonGenerator
+from cemit import CGenerator
+from batch import expandFiles
+from stats import Stats
+from cache import FragmentCache
+import pyruntime
+import hashlib
+import os
+import subprocess
+import sys
+import time
+
+# Watch mode keeps the compiler loaded and polls the source files for changes.
+# When one changes it is recompiled on its own and run again, and the time each
+# phase took is printed. Polling the modification time is cheap enough at a few
+# files and needs nothing outside the standard library.
+
+
+class WatchedFile:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.digest = None
+
+    # True if the file was saved with different contents since the last check.
+    def changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+
+        with open(self.path, 'rb') as inputFile:
+            digest = hashlib.sha256(inputFile.read()).digest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        return True
+
+
+def buildPython(phases, input, path, optimized, prompt, cacheDir, noCache):
+    stream = phases.time("lex", TokenStream, input)
+    program = phases.time("parse", IRParser(stream).program)
+    if optimized:
+        program = phases.time("optimize", optimize, program)
+    module = phases.time("emit", PythonGenerator().program, program)
+    code = phases.time("compile", pyruntime.compileModule, module, path)
+    return lambda: pyruntime.runCode(code, prompt)
+
+
+def buildCSharp(phases, input, path, optimized, prompt, cacheDir, noCache):
+    filename = os.path.splitext(path)[0]
+    stream = phases.time("lex", TokenStream, input)
+    emitter = Emitter(f"{filename}.cs", prompt=prompt)
+    if optimized:
+        program = phases.time("parse", IRParser(stream).program)
+        program = phases.time("optimize", optimize, program)
+        phases.time("emit", CSharpGenerator(emitter).program, program)
+    elif noCache:
+        phases.time("parse+emit", Parser(stream, emitter).program)
+    else:
+        # The direct parser emits as it goes. Routines that are the same as
+        # when they were last compiled are taken from the fragment cache.
+        fragments = FragmentCache(cacheDir)
+        phases.time("parse+emit", RoutineParser(stream, emitter, fragments).program)
+        phases.count("fragmentHits", fragments.hits)
+        phases.count("fragmentMisses", fragments.misses)
+    phases.time("write", emitter.writeFile)
+
+    build = phases.time("csc", subprocess.run,
+                        ["csc", f"-out:{filename}.exe", f"{filename}.cs"])
+    if build.returncode != 0:
+        return None
+    return lambda: subprocess.run([os.path.abspath(f"{filename}.exe")])
+
+
+def buildC(phases, input, path, optimized, prompt, cacheDir, noCache):
+    filename = os.path.splitext(path)[0]
+    stream = phases.time("lex", TokenStream, input)
+    program = phases.time("parse", IRParser(stream).program)
+    if optimized:
+        program = phases.time("optimize", optimize, program)
+    source = phases.time("emit", CGenerator(prompt).program, program)
+    with open(f"{filename}.c", 'w') as outputFile:
+        phases.time("write", outputFile.write, source)
+
+    build = phases.time("cc", subprocess.run,
+                        [os.environ.get("CC", "cc"), "-O2", "-o", filename, f"{filename}.c", "-lm"])
+    if build.returncode != 0:
+        return None
+    return lambda: subprocess.run([os.path.abspath(filename)])
+
+
+BUILDERS = {"py": buildPython, "cs": buildCSharp, "c": buildC}
+
+
+def printPhases(phases):
+    print("{color}{phases}{end}".format(
+        color="\033[90m", end="\033[0m", phases=phases))
+
+
+def rebuild(path, backend, optimized, prompt=True, cacheDir=None, noCache=False):
+    print("{color}Compiling {path}...{end}".format(
+        color="\033[94m", end="\033[0m", path=path))
+    phases = Stats()
+    try:
+        with open(path, 'r') as inputFile:
+            input = phases.time("read", inputFile.read)
+        build = BUILDERS[backend]
+        program = build(phases, input, path, optimized, prompt, cacheDir, noCache)
+    except CompileError as error:
+        print("{color}{error}{end}".format(
+            color="\033[91m", end="\033[0m", error=error))
+        printPhases(phases)
+        return
+    except RecursionError:
+        print("{color}Parse Error\nBlocks are nested too deep to compile{end}".format(
+            color="\033[91m", end="\033[0m"))
+        printPhases(phases)
+        return
+
+    if program is None:
+        printPhases(phases)
+        return
+    print("{color}Running...\n{end}".format(
+        color="\033[93m", end="\033[0m"))
+    try:
+        phases.time("run", program)
+    except Exception as error:
+        print("{color}{kind}: {error}{end}".format(
+            color="\033[91m", end="\033[0m", kind=type(error).__name__, error=error))
+    print()
+    printPhases(phases)
+
+
+def watch(patterns, backend="cs", optimized=False, interval=0.25, prompt=True,
+          cacheDir=None, noCache=False):
+    files = [WatchedFile(path) for path in expandFiles(patterns)]
+    for watched in files:
+        if not os.path.exists(watched.path):
+            sys.exit("{color}FileNotFoundError: No such file or directory: '{path}'{end}".format(
+                color="\033[91m", end="\033[0m", path=watched.path))
+    print("{color}Watching {count} file(s), Ctrl+C to stop{end}".format(
+        color="\033[94m", end="\033[0m", count=len(files)))
+    try:
+        while True:
+            for watched in files:
+                if watched.changed():
+                    rebuild(watched.path, backend, optimized, prompt, cacheDir, noCache)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+        sys.exit(0)